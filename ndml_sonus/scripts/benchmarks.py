@@ -0,0 +1,759 @@
+#!/bin/env python
+"""
+Micro benchmarks for the getter and parser hot paths.
+
+    $ python -m ndml_sonus.scripts.benchmarks read-until
+    $ python -m ndml_sonus.scripts.benchmarks split
+    $ python -m ndml_sonus.scripts.benchmarks mmap-parse
+    $ python -m ndml_sonus.scripts.benchmarks line-classify
+    $ python -m ndml_sonus.scripts.benchmarks record
+    $ python -m ndml_sonus.scripts.benchmarks second-step
+    $ python -m ndml_sonus.scripts.benchmarks composite
+    $ python -m ndml_sonus.scripts.benchmarks fixed-columns
+    $ python -m ndml_sonus.scripts.benchmarks prefilter
+    $ python -m ndml_sonus.scripts.benchmarks whitespace-table
+"""
+
+import argparse
+import logging
+import mmap
+import multiprocessing
+import os
+import re
+import resource
+import tempfile
+import time
+import tracemalloc
+
+from ndml_sonus.scripts.channel_reader import PromptReader
+from ndml_sonus.scripts.line_classifier import LineClassifier
+from ndml_sonus.scripts.separators import RegexSeparator
+
+
+def legacy_read_until(chunks, match):
+    """
+    The previous SshGetter.read_until loop: str concatenation and a regex
+    search over the whole output after every chunk.
+    """
+    out = ''
+    reg = re.compile(r'%s\s+?$' % match)
+    for chunk in chunks:
+        out += chunk.decode('utf-8', 'ignore')
+        if reg.search(out):
+            return out
+    return out
+
+
+def prompt_reader_read_until(chunks, match):
+    reader = PromptReader(match)
+    for chunk in chunks:
+        if reader.feed(chunk):
+            return reader.text()
+    return reader.text()
+
+
+def make_chunks(size, recv_size, prompt):
+    line = b'Trunk_Group_Id: TG0001  Status: ACTIVE  Circuits: 31  \xc3\xa9t\xc3\xa9\n'
+    data = line * (size // len(line)) + prompt.encode('utf-8') + b' '
+    return [data[i:i + recv_size] for i in range(0, len(data), recv_size)]
+
+
+def bench_read_until(args):
+    prompt = 'inst1>'
+    print('%8s %18s %18s' % ('MB', 'legacy s/MB', 'PromptReader s/MB'))
+    for mb in args.sizes:
+        chunks = make_chunks(int(mb * 1024 * 1024), args.recv_size, prompt)
+        timings = []
+        for read_until in (legacy_read_until, prompt_reader_read_until):
+            started = time.perf_counter()
+            output = read_until(chunks, prompt)
+            timings.append((time.perf_counter() - started) / mb)
+            assert output.endswith(prompt + ' ')
+        print('%8.1f %18.4f %18.4f' % (mb, timings[0], timings[1]))
+
+
+def make_gsx_raw(path, size):
+    """
+    Writes a raw file of about size bytes made of GSX command blocks.
+    """
+    block = (
+        '\nNode: GSX%(i)d  Date: 2023/07/03 10:11:12 GMT\nZone: ZONE%(i)d\n\n'
+        + ''.join('Trunk Group %%(i)d.%d : ACTIVE        Circuits : 31\n' % j for j in range(40))
+        + '\n%%\n\nResult: Ok\n'
+    )
+    with open(path, 'w') as fd:
+        written = i = 0
+        while written < size:
+            text = block % {'i': i}
+            fd.write(text)
+            written += len(text)
+            i += 1
+
+
+def bench_split(args):
+    from ndml_sonus.scripts.common import CommandFullTextParser
+    separator = CommandFullTextParser.separator
+
+    def whole_file(fd):
+        return len(list(separator.separate(fd.read())))
+
+    def streaming(fd):
+        return sum(1 for _ in separator.separate_stream(fd))
+
+    print('%8s %12s %12s %16s %16s' % ('MB', 'whole s', 'stream s', 'whole peak MB', 'stream peak MB'))
+    for mb in args.sizes:
+        handle, path = tempfile.mkstemp(suffix='.raw')
+        os.close(handle)
+        try:
+            make_gsx_raw(path, int(mb * 1024 * 1024))
+            results = []
+            for split in (whole_file, streaming):
+                with open(path) as fd:
+                    started = time.perf_counter()
+                    blocks = split(fd)
+                    elapsed = time.perf_counter() - started
+                with open(path) as fd:
+                    tracemalloc.start()
+                    split(fd)
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                results.append((blocks, elapsed, peak / 1024.0 / 1024.0))
+            assert results[0][0] == results[1][0]
+            print('%8.1f %12.3f %12.3f %16.1f %16.1f' % (
+                mb, results[0][1], results[1][1], results[0][2], results[1][2]
+            ))
+        finally:
+            os.unlink(path)
+
+
+TRUNK_GROUP_REGEX = r'Trunk Group (?P<Trunk_Group>\S+) : (?P<State>\S+)\s+Circuits : (?P<Circuits>\d+)\n'
+
+
+def parse_raw(path, mode):
+    """
+    Splits the raw file in blocks and runs the trunk group regex over every
+    command output, the way the regex parsers do, with the text read at once
+    (text), block by block (stream) or a bytes regex over a map (mmap).
+    Returns the number of rows, the seconds and the max RSS in MB.
+    """
+    from ndml_sonus.scripts.common import CommandFullTextParser
+    from ndml_sonus.scripts.separators import decoded_groupdict
+    separator = CommandFullTextParser.separator
+
+    started = time.perf_counter()
+    rows = 0
+    if mode == 'mmap':
+        regex = re.compile(TRUNK_GROUP_REGEX.encode('utf-8'))
+        with open(path, 'rb') as fd, mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            for block in separator.separate_buffer(buf, text_group='CommandOutput'):
+                start, end = block['CommandOutput']
+                for match in regex.finditer(buf, start, end):
+                    decoded_groupdict(match)
+                    rows += 1
+            match = None
+    else:
+        regex = re.compile(TRUNK_GROUP_REGEX)
+        with open(path) as fd:
+            blocks = separator.separate_stream(fd) if mode == 'stream' else separator.separate(fd.read())
+            for block in blocks:
+                for match in regex.finditer(block['CommandOutput']):
+                    match.groupdict()
+                    rows += 1
+    elapsed = time.perf_counter() - started
+    return rows, elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def bench_mmap_parse(args):
+    """
+    Every mode runs in a fresh interpreter, so the max RSS is its own. The
+    RSS of the mmap mode counts the pages of the map, which are page cache
+    the kernel can drop, not heap.
+    """
+    pool = multiprocessing.get_context('spawn').Pool(1, maxtasksperchild=1)
+    modes = ('text', 'stream', 'mmap')
+    print('%8s %8s %10s %10s %14s' % ('MB', 'mode', 'MB/s', 'rows', 'max RSS MB'))
+    try:
+        for mb in args.sizes:
+            handle, path = tempfile.mkstemp(suffix='.raw')
+            os.close(handle)
+            try:
+                make_gsx_raw(path, int(mb * 1024 * 1024))
+                counts = set()
+                for mode in modes:
+                    rows, elapsed, rss = pool.apply(parse_raw, (path, mode))
+                    counts.add(rows)
+                    print('%8.1f %8s %10.1f %10d %14.1f' % (mb, mode, mb / elapsed, rows, rss))
+                assert len(counts) == 1
+            finally:
+                os.unlink(path)
+    finally:
+        pool.close()
+        pool.join()
+
+
+NODE_REGEX = r'Node:\s*(?P<Node>\w+)\s*Date:\s*(?P<Date>\d+/\d+/\d+\s*\d+:\d+:\d+)\s*\w+'
+RESULT_REGEX = r'Result:\s*(?P<Result>.*?)$'
+
+
+def legacy_classify(line, commands, record_separator, node_separator, result_separator):
+    """
+    The previous dispatch of SeparatedRecordsParserWithMultipleFieldSeparators.parse_line:
+    the record regex, NodeAndResultParser.matches then NodeAndResultParser.parse_line,
+    stripping and upper casing the line for every command.
+    """
+    def command_in_line():
+        for command in commands:
+            if command in line.strip().upper():
+                return True
+        return False
+
+    def ignored():
+        return len(line.strip()) == 0 or line.strip() == '%' or command_in_line()
+
+    if record_separator.matches(line):
+        return LineClassifier.RECORD
+    if node_separator.matches(line) or result_separator.matches(line) or ignored():
+        if ignored():
+            return LineClassifier.IGNORE
+        if node_separator.matches(line):
+            return LineClassifier.NODE
+        return LineClassifier.RESULT
+    return LineClassifier.OTHER
+
+
+def make_line_report(records):
+    """
+    Lines of a TrunkGroupAdminParser like report.
+    """
+    lines = []
+    for i in range(records):
+        if i % 20 == 0:
+            lines += ['Node: GSX1  Date: 2023/07/03 10:11:12 GMT', 'admin> show trunk group all admin', '']
+        lines.append('Local Trunk Name: TG%d' % i)
+        lines += ['  Field %-30d : value          Other Field %d : value' % (j, j) for j in range(12)]
+        lines.append('')
+        if i % 20 == 19:
+            lines += ['%', '', 'Result: Ok']
+    return [line + '\n' for line in lines]
+
+
+def bench_line_classify(args):
+    commands = ['SHOW TRUNK GROUP ALL ADMIN', 'SHOW TRUNK GROUP ALL STATUS', 'SHOW SS7 NODE ALL ADMIN']
+    record_separator = RegexSeparator(r'Local Trunk Name: (?P<Local_Trunk_Name>\S+)')
+    node_separator = RegexSeparator(NODE_REGEX)
+    result_separator = RegexSeparator(RESULT_REGEX)
+    classifier = LineClassifier(commands, node_separator, result_separator, record_separator)
+
+    lines = make_line_report(args.records)
+    print('%10s %16s %20s' % ('lines', 'legacy lines/s', 'classifier lines/s'))
+    started = time.perf_counter()
+    legacy = [legacy_classify(line, commands, record_separator, node_separator, result_separator) for line in lines]
+    legacy_elapsed = time.perf_counter() - started
+    started = time.perf_counter()
+    classified = [classifier.classify(line)[0] for line in lines]
+    elapsed = time.perf_counter() - started
+    assert legacy == classified
+    print('%10d %16.0f %20.0f' % (len(lines), len(lines) / legacy_elapsed, len(lines) / elapsed))
+
+
+def make_blocks(blocks, rows, fields):
+    """
+    Node fields and command output rows of a GSX like report.
+    """
+    return [
+        (
+            {'Node': 'GSX%d' % (block % 4), 'Date': '2023/07/03 10:11:12', 'Zone': 'ZONE%d' % block},
+            [
+                dict({'Field %d' % field: 'value %d.%d' % (row, field) for field in range(fields)}, Point_Code='1-2-%d' % row)
+                for row in range(rows)
+            ]
+        )
+        for block in range(blocks)
+    ]
+
+
+def bench_record(args):
+    import logging
+    from types import SimpleNamespace
+    from ndml_sonus.scripts import sonus_logging
+    from ndml_sonus.scripts.common import AutoFieldsAdder, CsvLineEmitter
+    from ndml_sonus.scripts.second_step import SecondStepParser
+
+    log = logging.getLogger('benchmarks')
+    sonus_logging.log = log
+    fields_list = ['Node', 'Date', 'Zone', 'Report Host', 'Point_Code'] + ['Field %d' % field for field in range(args.fields)]
+    report = SimpleNamespace(
+        name='benchmark', fields_list=fields_list, optional_fields=[], known_unused_fields=[],
+        auto_add_date=False, auto_add_report_host=True, second_step_parsers=['Triple8PointCodeParser']
+    )
+    auto_fields_adder = AutoFieldsAdder(report, 'host', log)
+    csv_line_emitter = CsvLineEmitter(report, log, auto_fields_adder)
+    second_step_parser = SecondStepParser.create_from_report(report)
+    record_schema = csv_line_emitter.record_schema
+
+    def dict_rows(blocks):
+        for node, rows in blocks:
+            for csv_line in rows:
+                result_dict = node.copy()
+                result_dict.update(csv_line)
+                auto_fields_adder.add_auto_fields(result_dict)
+                second_step_parser.parse_dict(report, result_dict)
+                yield csv_line_emitter.emit_line_from_dict(result_dict)
+
+    def record_rows(blocks):
+        for node, rows in blocks:
+            node_record = record_schema.record(node)
+            auto_record = None
+            for csv_line in rows:
+                if csv_line.keys().isdisjoint(auto_fields_adder.auto_fields.keys()):
+                    if auto_record is None:
+                        auto_record = record_schema.record(parent=node_record)
+                        auto_fields_adder.add_auto_fields(auto_record)
+                    result_dict = record_schema.record(csv_line, auto_record)
+                else:
+                    result_dict = record_schema.record(csv_line, node_record)
+                    auto_fields_adder.add_auto_fields(result_dict)
+                second_step_parser.parse_dict(report, result_dict)
+                yield csv_line_emitter.emit_line_from_dict(result_dict)
+
+    blocks = make_blocks(args.blocks, args.rows, args.fields)
+    rows = args.blocks * args.rows
+    assert list(dict_rows(blocks[:2])) == list(record_rows(blocks[:2]))
+    print('%8s %8s %14s %18s' % ('rows', 'fields', 'dict us/row', 'record us/row'))
+    timings = {dict_rows: [], record_rows: []}
+    for _ in range(args.repeat):
+        for emit_rows in (dict_rows, record_rows):
+            started = time.perf_counter()
+            for _ in emit_rows(blocks):
+                pass
+            timings[emit_rows].append((time.perf_counter() - started) / rows * 1e6)
+    print('%8d %8d %14.2f %18.2f' % (rows, len(fields_list), min(timings[dict_rows]), min(timings[record_rows])))
+
+
+def legacy_parse_dict(field_parsers, report, d):
+    """
+    The previous SecondStepParser.parse_dict: should_parse for every field
+    parser and every key of every row.
+    """
+    for field_parser in field_parsers:
+        for key in d:
+            if field_parser.should_parse(report, key):
+                d[key] = field_parser.parse(report, d[key])
+
+
+def make_ip_signaling_profile_rows(rows, distinct=300):
+    """
+    Rows shaped like the psx_ip_signaling_profile report: 8 hexadecimal
+    attribute fields and a timestamp among about 60 fields, the converted
+    fields taking distinct different values.
+    """
+    attributes = [
+        'Ip_Sig_Attributes1', 'Ip_Sig_Attributes2', 'Ip_Sig_Attributes3', 'Ip_Sig_Attributes4',
+        'Ip_Sig_Attributes5', 'Ip_Sig_Attributes6', 'Ip_Sig_Attributes7', 'Ip_Sig_Attributes8',
+    ]
+    return [
+        dict(
+            {'Field_%d' % field: 'value %d' % field for field in range(50)},
+            Ip_Signaling_Profile_Id='PROFILE%d' % row, Sequence_Number=str(row),
+            Point_Code='1-2-%d' % (row % distinct),
+            TIMESTAMP='10/18/26 01:%02d:%02d PM UTC' % divmod(row % distinct % 3600, 60),
+            **{attribute: '0x%x' % ((row + position) % distinct) for position, attribute in enumerate(attributes)}
+        )
+        for row in range(rows)
+    ]
+
+
+def bench_second_step(args):
+    from types import SimpleNamespace
+    from ndml_sonus.scripts.record import RecordSchema
+    from ndml_sonus.scripts.second_step import SecondStepParser
+
+    report = SimpleNamespace(
+        name='psx_ip_signaling_profile',
+        second_step_parsers=['HexadecimalParser', 'LeftPointCodeParser', 'Triple8PointCodeParser', 'DateParser'],
+    )
+    rows = make_ip_signaling_profile_rows(args.rows, args.distinct)
+
+    def timed(parse_dict):
+        parsed_rows = [dict(row) for row in rows]
+        started = time.perf_counter()
+        for row in parsed_rows:
+            parse_dict(report, row)
+        return parsed_rows, (time.perf_counter() - started) / len(rows) * 1e6
+
+    second_step_parser = SecondStepParser.create_from_report(report)
+    legacy_rows, legacy_elapsed = timed(
+        lambda report, row: legacy_parse_dict(second_step_parser.field_parsers, report, row)
+    )
+    new_rows, elapsed = timed(second_step_parser.parse_dict)
+    memo_parser = SecondStepParser.create_from_report(report, args.memo_size)
+    memo_rows, memo_elapsed = timed(memo_parser.parse_dict)
+
+    # Batches of records, as parse_blocks hands them to the second step
+    schema = RecordSchema(rows[0])
+    records = [schema.record(row) for row in rows]
+    batch_parser = SecondStepParser.create_from_report(report, args.memo_size)
+    started = time.perf_counter()
+    for start in range(0, len(records), args.batch_size):
+        batch_parser.parse_batch(report, records[start:start + args.batch_size])
+    batch_elapsed = (time.perf_counter() - started) / len(rows) * 1e6
+    assert legacy_rows == new_rows == memo_rows == [record.to_dict() for record in records]
+
+    print('%8s %8s %16s %18s %16s %16s' % (
+        'rows', 'fields', 'legacy us/row', 'dispatch us/row', 'memo us/row', 'batch us/row'
+    ))
+    print('%8d %8d %16.2f %18.2f %16.2f %16.2f' % (
+        len(rows), len(rows[0]), legacy_elapsed, elapsed, memo_elapsed, batch_elapsed
+    ))
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    memo_parser.log_statistics(logging.getLogger('benchmarks'), 'memo')
+
+
+def legacy_composite_separate(composite, text):
+    """
+    The previous CompositeSeparator.separate: lists of the parent and child
+    dicts, the parent dict copied for every child.
+    """
+    global_fields_list = list(composite.parent_separator.separate(text))
+    for global_fields in global_fields_list:
+        text_to_pass = global_fields.pop(composite.field_to_pass)
+        child_fields_list = list(composite.child_separator.separate(text_to_pass))
+        for child_fields in child_fields_list:
+            global_fields_copy = global_fields.copy()
+            global_fields_copy.update(child_fields)
+            yield global_fields_copy
+
+
+def make_sgx_rset_output(routesets, routes):
+    """
+    Command output of a SGX route set command (SgxRsetParser).
+    """
+    return ''.join(
+        'Name                                 DPC        State   Status  Load sharing\n\n'
+        'RS%d 1-%d-%d Avail a yes\n\n\n        --- ROUTES ---\n' % (routeset, routeset // 255, routeset % 255)
+        + ''.join('  ROUTE%d a\n' % route for route in range(routes))
+        + '\n\n\n'
+        for routeset in range(routesets)
+    )
+
+
+def bench_composite(args):
+    from ndml_sonus.scripts.sgx_parsers import SgxRsetParser
+
+    composite = SgxRsetParser.command_separator
+    text = make_sgx_rset_output(args.routesets, args.routes)
+    assert list(legacy_composite_separate(composite, text)) == list(composite.separate(text))
+
+    print('%10s %10s %12s %12s %16s %16s' % (
+        'routesets', 'routes', 'legacy s', 'stream s', 'legacy peak MB', 'stream peak MB'
+    ))
+    results = []
+    for separate in (lambda: legacy_composite_separate(composite, text), lambda: composite.separate(text)):
+        # The rows are consumed one by one, as parse_blocks does
+        started = time.perf_counter()
+        for _ in separate():
+            pass
+        elapsed = time.perf_counter() - started
+        tracemalloc.start()
+        for _ in separate():
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results.append((elapsed, peak / 1024.0 / 1024.0))
+    print('%10d %10d %12.3f %12.3f %16.2f %16.2f' % (
+        args.routesets, args.routes, results[0][0], results[1][0], results[0][1], results[1][1]
+    ))
+
+
+def legacy_fixed_column_separator(klass, columns):
+    """
+    The separator of klass with a single-column separator per column, as
+    before the ColumnExtractor.
+    """
+    separator = klass(columns)
+    separator.extractor = None
+    separator.separators = [separator.klass() for _ in columns]
+    return separator
+
+
+def make_two_column_lines(lines):
+    """
+    Lines of a two column admin report with nested sections, the layout of
+    RegexTwoColumnParser.
+    """
+    result = []
+    for index in range(lines):
+        if index % 10 == 0:
+            result.append(' Section %d:' % index)
+        elif index % 10 < 5:
+            first = '    Nested Field %d : %d' % (index % 10, index)
+            result.append(first.ljust(41) + 'Field %d : value %d' % (index % 10, index))
+        else:
+            first = ' Field %d : %d' % (index % 10 + 10, index)
+            result.append(first.ljust(41) + 'Other Field %d : %d' % (index % 10, index))
+    return result
+
+
+def bench_fixed_columns(args):
+    from ndml_sonus.scripts.separators import FixedColumnSeparator, SimpleFixedColumnSeparator
+
+    lines = make_two_column_lines(args.lines)
+    print('%28s %10s %14s %14s' % ('separator', 'lines', 'legacy us/line', 'new us/line'))
+    for klass in (FixedColumnSeparator, SimpleFixedColumnSeparator):
+        results = []
+        for make in (legacy_fixed_column_separator, lambda k, c: k(c)):
+            best = None
+            for _ in range(args.repeat):
+                separator = make(klass, [(1, 41), (41, 100)])
+                started = time.perf_counter()
+                for line in lines:
+                    separator.try_separate(line)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            results.append(best)
+        legacy, new = legacy_fixed_column_separator(klass, [(1, 41), (41, 100)]), klass([(1, 41), (41, 100)])
+        assert [legacy.try_separate(line) for line in lines] == [new.try_separate(line) for line in lines]
+        print('%28s %10d %14.3f %14.3f' % (
+            klass.__name__, len(lines), results[0] * 1e6 / len(lines), results[1] * 1e6 / len(lines)
+        ))
+
+
+def make_admin_output(blocks, lines):
+    """
+    Command output of blocks of two column fields, each block starting with
+    an 'ISUP Signaling Group :' line.
+    """
+    return ''.join(
+        '  ISUP Signaling Group : GROUP%d          Version ID : %d\n' % (block, block)
+        + ''.join(
+            '  Field %d                    : value %d     Other Field : x\n' % (line, line) for line in range(lines)
+        )
+        for block in range(blocks)
+    )
+
+
+def fill_regex(regex, value):
+    """
+    Text matched by a regex made of literal text, \\n, \\s+ / \\s* and \\d+ / \\S+
+    named groups, the groups filled with value.
+    """
+    text = re.sub(r'\(\?P<\w+>\\d\+\)', str(value), regex)
+    text = re.sub(r'\(\?P<(\w+)>\\S\+\)', lambda match: '%s_%d' % (match.group(1).lower(), value), text)
+    return text.replace('\\s+', '  ').replace('\\s*', '').replace('\\n', '\n')
+
+
+def make_e1_profile_output(blocks):
+    """
+    Output of the GSX E1 profiles, one profile per block.
+    """
+    from ndml_sonus.scripts.gsx_parsers import E1ProfileParser
+
+    return ''.join(fill_regex(E1ProfileParser.regex, block) + '\n\n' for block in range(blocks))
+
+
+def make_peer_group_output(blocks):
+    """
+    Output of the PSX IP signaling peer group data, one block of fields per group.
+    """
+    return ''.join(
+        '  Ip_Signaling_Peer_Group_Id : PEERGROUP%d\n  Sequence_Number : %d\n  Service_Status : 1\n'
+        '  Ip_Address : 10.0.%d.1\n  Port_Number : 5060\n  Server_FQDN : peer%d.example.net\n'
+        '  Server_FQDN_Port_Number : 0\n  Attributes : 3\n' % (block, block, block % 256, block)
+        for block in range(blocks)
+    )
+
+
+def make_lset_output(blocks, links):
+    """
+    Output of the SGX link sets, each with its signaling links.
+    """
+    return ''.join(
+        '--- LINK SET ---\n\n'
+        'Name                              Nbr      ADPC      Status  Active Links  PC count  Err Correction  '
+        'LinkType   MTP Restart  Lset Type\n\n'
+        'LSET%d                             %d        1-2-%d     A       %d             1         basic           '
+        'ANSI       yes          normal\n\n\n'
+        '        --- SIGNALING LINKS ---\n%s\n\n\n' % (
+            block, block, block, links,
+            '\n'.join('LINK%d_%d  %d  %d  A' % (block, link, link, link) for link in range(links))
+        )
+        for block in range(blocks)
+    )
+
+
+def bench_prefilter(args):
+    from ndml_sonus.scripts.gsx_parsers import E1ProfileParser, IsupSignalingGroupParser
+    from ndml_sonus.scripts.literal_prefilter import prefiltered
+    from ndml_sonus.scripts.psx_parsers import PsxIpSignalingPeerGroupDataParser
+    from ndml_sonus.scripts.sgx_parsers import SgxLsetSeparator
+
+    lset_separator = SgxLsetSeparator().parent_separator
+    regexes = [
+        ('E1ProfileParser', E1ProfileParser.regex, E1ProfileParser.regex_mode),
+        ('IsupSignalingGroupParser', IsupSignalingGroupParser.regex, 0),
+        (
+            'PsxIpSignalingPeerGroupData', PsxIpSignalingPeerGroupDataParser.regex,
+            PsxIpSignalingPeerGroupDataParser.regex_mode
+        ),
+        ('SgxLsetSeparator', lset_separator.regex_str, lset_separator.mode),
+    ]
+    # The outputs of the four reports one after the other, every regex has
+    # matches in its part and skips the others
+    text = (
+        make_admin_output(args.blocks, args.lines) + make_e1_profile_output(args.blocks // 10)
+        + make_peer_group_output(args.blocks) + make_lset_output(args.blocks // 10, args.lines)
+    )
+    print('%28s %8s %12s %14s' % ('regex', 'matches', 'finditer ms', 'prefilter ms'))
+    for name, regex, mode in regexes:
+        compiled = re.compile(regex, mode)
+        results = []
+        for finditer in (compiled.finditer, prefiltered(compiled).finditer):
+            best = None
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                matches = [match.span() for match in finditer(text)]
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            results.append((best, matches))
+        assert results[0][1] and results[0][1] == results[1][1]
+        print('%28s %8d %12.2f %14.2f' % (name, len(results[0][1]), results[0][0] * 1e3, results[1][0] * 1e3))
+
+    # RegexSeparator: a line parser record separator, run on every line
+    lines = text.split('\n')
+    separator = RegexSeparator(IsupSignalingGroupParser.regex)
+
+    def legacy_try_separate(line):
+        match = separator.separator_regex.match(line)
+        return match.groupdict() if match is not None else None
+
+    results = []
+    for try_separate in (legacy_try_separate, separator.try_separate):
+        best = None
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            for line in lines:
+                try_separate(line)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        results.append(best)
+    print('%28s %8d %12.2f %14.2f' % ('RegexSeparator per line', len(lines), results[0] * 1e3, results[1] * 1e3))
+
+
+def make_table_output(columns, rows, trailing=''):
+    """
+    Command output of a table: a header line, a dashes line and rows of
+    numbers, which are \\S+ and \\d+ columns, ended by trailing.
+    """
+    return (
+        '\n' + '  '.join('Column %d' % column for column in range(columns)) + '\n'
+        + '  '.join('-' * 10 for _ in range(columns)) + '\n'
+        + ''.join(
+            '  '.join('%d' % (row * columns + column) for column in range(columns)) + trailing + '\n'
+            for row in range(rows)
+        )
+        + '\n'
+    )
+
+
+def bench_whitespace_table(args):
+    from ndml_sonus.scripts import gsx_parsers, sgx_parsers
+
+    parsers = [
+        klass for module in (gsx_parsers, sgx_parsers) for klass in vars(module).values()
+        if isinstance(klass, type) and klass.__module__ == module.__name__ and getattr(klass, 'matching_regex', None)
+        and (klass.matching_regex != klass.regex or klass.__name__ in args.parsers)
+    ]
+    print('%32s %8s %12s %12s' % ('parser', 'rows', 'regex ms', 'table ms'))
+    for klass in parsers:
+        compiled = re.compile(klass.regex, klass.regex_mode)
+        columns = len(compiled.groupindex)
+        # rows of one line, with or without trailing spaces
+        for trailing in ('', '  '):
+            if len(compiled.findall(make_table_output(columns, 3, trailing))) == 3:
+                break
+        else:
+            print('%32s %8s' % (klass.__name__, 'skipped'))
+            continue
+
+        outputs = [make_table_output(columns, args.rows, trailing) for _ in range(args.blocks)]
+        results = []
+        for regex in (klass.regex, klass.matching_regex):
+            compiled = re.compile(regex, klass.regex_mode)
+            best = None
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                rows = [match.groupdict() for output in outputs for match in compiled.finditer(output)]
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            results.append((best, rows))
+        assert results[0][1] == results[1][1]
+        print('%32s %8d %12.2f %12.2f' % (klass.__name__, len(results[0][1]), results[0][0] * 1e3, results[1][0] * 1e3))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    read_until = subparsers.add_parser('read-until', help='cost per MB of reading a command output')
+    read_until.add_argument('--sizes', type=float, nargs='+', default=[1, 2, 4, 8, 16], help='output sizes in MB')
+    read_until.add_argument('--recv-size', type=int, default=32768, help='bytes per recv() call')
+    read_until.set_defaults(func=bench_read_until)
+
+    split = subparsers.add_parser('split', help='time and peak memory of the GSX block splitter')
+    split.add_argument('--sizes', type=float, nargs='+', default=[8, 32, 128], help='raw file sizes in MB')
+    split.set_defaults(func=bench_split)
+
+    mmap_parse = subparsers.add_parser('mmap-parse', help='throughput and RSS of the text, stream and mmap parsing')
+    mmap_parse.add_argument('--sizes', type=float, nargs='+', default=[32, 128], help='raw file sizes in MB')
+    mmap_parse.set_defaults(func=bench_mmap_parse)
+
+    line_classify = subparsers.add_parser('line-classify', help='dispatch cost per line of the line parsers')
+    line_classify.add_argument('--records', type=int, default=50000, help='records of the report')
+    line_classify.set_defaults(func=bench_line_classify)
+
+    record = subparsers.add_parser('record', help='cost per row of the pipeline with dicts and with records')
+    record.add_argument('--blocks', type=int, default=2000, help='command blocks of the report')
+    record.add_argument('--rows', type=int, default=50, help='rows per block')
+    record.add_argument('--fields', type=int, default=20, help='fields per row')
+    record.add_argument('--repeat', type=int, default=3, help='runs of each pipeline, the best is kept')
+    record.set_defaults(func=bench_record)
+
+    second_step = subparsers.add_parser('second-step', help='cost per row of the second step field parsers')
+    second_step.add_argument('--rows', type=int, default=20000, help='rows of the report')
+    second_step.add_argument('--distinct', type=int, default=300, help='distinct values of the converted fields')
+    second_step.add_argument('--memo-size', type=int, default=4096, help='values memoized per field parser')
+    second_step.add_argument('--batch-size', type=int, default=10000, help='rows of the batches of parse_batch')
+    second_step.set_defaults(func=bench_second_step)
+
+    composite = subparsers.add_parser('composite', help='time and peak memory of the SGX route set hierarchy')
+    composite.add_argument('--routesets', type=int, default=20000, help='route sets of the command output')
+    composite.add_argument('--routes', type=int, default=10, help='routes per route set')
+    composite.set_defaults(func=bench_composite)
+
+    fixed_columns = subparsers.add_parser('fixed-columns', help='cost per line of the fixed column separators')
+    fixed_columns.add_argument('--lines', type=int, default=100000, help='lines of the report')
+    fixed_columns.add_argument('--repeat', type=int, default=3, help='runs of each separator, the best is kept')
+    fixed_columns.set_defaults(func=bench_fixed_columns)
+
+    prefilter = subparsers.add_parser('prefilter', help='report regexes with and without the literal prefilter')
+    prefilter.add_argument('--blocks', type=int, default=2000, help='blocks of the command output')
+    prefilter.add_argument('--lines', type=int, default=40, help='field lines per block')
+    prefilter.add_argument('--repeat', type=int, default=3, help='runs of each regex, the best is kept')
+    prefilter.set_defaults(func=bench_prefilter)
+
+    whitespace_table = subparsers.add_parser('whitespace-table', help='report regexes before and after the table regex')
+    whitespace_table.add_argument('--blocks', type=int, default=1000, help='command outputs of the report')
+    whitespace_table.add_argument('--rows', type=int, default=20, help='rows per command output')
+    whitespace_table.add_argument(
+        '--parsers', nargs='*', default=['StMtaStatus', 'SgxSlkParser', 'SgxCcClientParser'],
+        help='parsers also measured when their regex is unchanged'
+    )
+    whitespace_table.add_argument('--repeat', type=int, default=3, help='runs of each regex, the best is kept')
+    whitespace_table.set_defaults(func=bench_whitespace_table)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
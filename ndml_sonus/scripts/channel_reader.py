@@ -0,0 +1,85 @@
+#!/bin/env python
+"""
+Incremental reader for the output of interactive ssh channels
+"""
+
+import codecs
+import re
+
+
+class PromptReader:
+    """
+    Accumulates the bytes received from a channel until the prompt shows up
+    at the end of the output.
+
+    Chunks are decoded with an incremental UTF-8 decoder, so multibyte
+    characters split between two recv() calls are kept, and stored in a list
+    that is joined only once. The prompt regex is only run against the last
+    tail_size characters, so the cost of every chunk does not depend on how
+    much output was already received. tail_size must be longer than the prompt
+    and the whitespace following it.
+
+    listener, if given, is called with every decoded chunk as it arrives.
+    """
+
+    def __init__(self, match, tail_size=4096, listener=None):
+        self.regex = re.compile(r'%s\s+?$' % match)
+        self.tail_size = tail_size
+        self.listener = listener
+        self.decoder = codecs.getincrementaldecoder('utf-8')('ignore')
+        self.chunks = []
+        self.tail = ''
+        self.size = 0
+
+    def feed(self, data):
+        """
+        Adds received bytes, returns True when the output ends with the prompt.
+        """
+        text = self.decoder.decode(data)
+        if text:
+            self.chunks.append(text)
+            self.size += len(text)
+            self.tail = (self.tail + text)[-self.tail_size:]
+            if self.listener is not None:
+                self.listener(text)
+        return self.regex.search(self.tail) is not None
+
+    def text(self):
+        if len(self.chunks) > 1:
+            self.chunks = [''.join(self.chunks)]
+        return self.chunks[0] if self.chunks else ''
+
+
+class IncrementalMatcher:
+    """
+    Runs a compiled regex over text received in chunks and calls on_match for
+    every match as soon as it ends at least holdback characters before the end
+    of the text received so far, where the text still to come cannot change it.
+
+    The text before the last reported match is dropped, so patterns must not
+    use ^ or look-behind, and no match may be longer than holdback. Matches are
+    meant for early dispatching: callers still check the complete output.
+    """
+
+    def __init__(self, regex, on_match, holdback=1024):
+        self.regex = regex
+        self.on_match = on_match
+        self.holdback = holdback
+        self.buffer = ''
+
+    def feed(self, text):
+        self.buffer += text
+        limit = len(self.buffer) - self.holdback
+        consumed = 0
+        found = False
+        for match in self.regex.finditer(self.buffer):
+            found = True
+            if match.end() > limit:
+                break
+            self.on_match(match)
+            consumed = match.end()
+
+        if consumed:
+            self.buffer = self.buffer[consumed:]
+        elif not found and limit > 0:
+            self.buffer = self.buffer[limit:]
@@ -0,0 +1,201 @@
+#!/bin/env python
+"""
+Worker pool used by the getter to collect several hosts at the same time
+"""
+
+import logging
+import threading
+import time
+
+from collections import OrderedDict, deque
+
+
+class CollectionTask:
+    """
+    One unit of work for the CollectionEngine: run func for a (report, host) pair.
+    """
+
+    def __init__(self, host_key, label, func):
+        self.host_key = host_key
+        self.label = label
+        self.func = func
+        self.status = 'pending'
+        self.error = None
+        self.started = None
+        self.elapsed = 0.0
+
+    def __repr__(self):
+        return '<CollectionTask %s %s>' % (self.label, self.status)
+
+
+class TaskLogAdapter(logging.LoggerAdapter):
+    """
+    Prefixes every message with the worker and the task it is running, so the
+    lines of concurrent getters can be told apart in the shared log file.
+    """
+
+    def process(self, msg, kwargs):
+        return '[%s %s] %s' % (threading.current_thread().name, self.extra['label'], msg), kwargs
+
+
+class TaskConfig:
+    """
+    Per task view of the getter config: everything is delegated to the shared
+    config object except for the log, which is wrapped in a TaskLogAdapter.
+    """
+
+    def __init__(self, conf, label):
+        self.__dict__['_conf'] = conf
+        self.__dict__['log'] = TaskLogAdapter(conf.log, {'label': label})
+
+    def __getattr__(self, attr):
+        return getattr(self._conf, attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._conf, attr, value)
+
+
+class CollectionEngine:
+    """
+    Runs CollectionTasks with a global worker limit and a per host worker limit.
+    There is one queue per host: a worker always picks the next task of a host
+    that is not yet running max_workers_per_host tasks, so switches are
+    collected in parallel but never hammered by more sessions than allowed.
+
+    Exceptions listed in recoverable are logged and the run continues (or they
+    are re-raised at the end of the run in devmode). Any other exception stops
+    the scheduling of new tasks and is re-raised once the running ones finish.
+    """
+
+    def __init__(self, log, max_workers=1, max_workers_per_host=1, connect_delay=0, recoverable=(), devmode=False):
+        self.log = log
+        self.max_workers = max(1, int(max_workers))
+        self.max_workers_per_host = max(1, int(max_workers_per_host))
+        self.connect_delay = float(connect_delay)
+        self.recoverable = tuple(recoverable)
+        self.devmode = devmode
+
+        self.tasks = []
+        self.queues = OrderedDict()
+        self.running = {}
+        self.last_used = {}
+        self.fatal = None
+        self.lock = threading.Condition()
+
+    def add(self, host_key, label, func):
+        task = CollectionTask(host_key, label, func)
+        self.tasks.append(task)
+        self.queues.setdefault(host_key, deque()).append(task)
+        self.running.setdefault(host_key, 0)
+        return task
+
+    def run(self):
+        """
+        Runs all the queued tasks, logs the run summary and re-raises the
+        exception that stopped the run, if any.
+        """
+        started = time.time()
+        workers = min(self.max_workers, len(self.tasks))
+
+        if workers <= 1:
+            self._work()
+        else:
+            threads = [
+                threading.Thread(target=self._work, name='getter-%d' % (i + 1)) for i in range(workers)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.log_summary(time.time() - started)
+
+        if self.fatal is not None:
+            raise self.fatal
+
+    def _next_task(self):
+        """
+        Returns the next task that can be started, None if all the hosts with
+        pending tasks are busy. Must be called with the lock held.
+        """
+        for host_key, queue in self.queues.items():
+            if queue and self.running[host_key] < self.max_workers_per_host:
+                # Move the host to the end so hosts are served round robin
+                self.queues.move_to_end(host_key)
+                return queue.popleft()
+        return None
+
+    def _pending(self):
+        return any(self.queues.values())
+
+    def _work(self):
+        while True:
+            with self.lock:
+                while True:
+                    if self.fatal is not None or not self._pending():
+                        return
+                    task = self._next_task()
+                    if task is not None:
+                        break
+                    self.lock.wait()
+
+                self.running[task.host_key] += 1
+                delay = 0
+                if task.host_key in self.last_used:
+                    delay = self.last_used[task.host_key] + self.connect_delay - time.time()
+                self.last_used[task.host_key] = time.time() + max(delay, 0)
+
+            try:
+                if delay > 0:
+                    self.log.info('%s: waiting %.1fs before creating new connection...' % (task.label, delay))
+                    time.sleep(delay)
+                self._run_task(task)
+            finally:
+                with self.lock:
+                    self.running[task.host_key] -= 1
+                    self.last_used[task.host_key] = time.time()
+                    self.lock.notify_all()
+
+    def _run_task(self, task):
+        task.started = time.time()
+        task.status = 'running'
+        try:
+            task.func()
+            task.status = 'ok'
+        except self.recoverable as e:
+            task.status = 'failed'
+            task.error = e
+            if self.devmode:
+                self._stop(e)
+            else:
+                self.log.exception('%s: GetException! Logging and continuing!' % task.label)
+        except Exception as e:
+            task.status = 'error'
+            task.error = e
+            self.log.exception('%s: Getter exception that is not GetException! Exiting!' % task.label)
+            self._stop(e)
+        finally:
+            task.elapsed = time.time() - task.started
+
+    def _stop(self, e):
+        with self.lock:
+            if self.fatal is None:
+                self.fatal = e
+            self.lock.notify_all()
+
+    def log_summary(self, wall_time):
+        counts = {}
+        for task in self.tasks:
+            counts[task.status] = counts.get(task.status, 0) + 1
+
+        self.log.info(
+            'Run summary: %d tasks in %.1fs wall time (%s)' % (
+                len(self.tasks), wall_time, ', '.join('%s=%d' % item for item in sorted(counts.items()))
+            )
+        )
+        for task in sorted(self.tasks, key=lambda t: t.elapsed, reverse=True):
+            if task.status == 'pending':
+                continue
+            self.log.info(
+                '  %-40s %-8s %8.1fs%s' % (task.label, task.status, task.elapsed, ' %s' % task.error if task.error else '')
+            )
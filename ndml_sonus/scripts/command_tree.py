@@ -0,0 +1,203 @@
+#!/bin/env python
+"""
+Parallel expansion of the find/show command tree of the getter
+"""
+
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
+
+from ndml_sonus.scripts.channel_reader import IncrementalMatcher
+
+
+class CommandTreeExpander:
+    """
+    Executes the find/show command tree of a MultipleCommandsSshGetter on a
+    bounded pool of channels of the same transport.
+
+    The ids are matched while the output of a find command is still being
+    received and the child commands are queued at once, so the channels start
+    on the next level before the find is finished. Identical commands are only
+    executed once. When a command completes its children are computed again
+    from the complete output, which is the authoritative list: children missed
+    by the incremental matcher are queued then, extra ones are left out of the
+    raw file. Outputs are spooled to a temporary file and written to sink in
+    the order of the serial getter (breadth first).
+    """
+
+    def __init__(self, getter, channels, holdback=1024):
+        self.getter = getter
+        self.conf = getter.conf
+        self.context = getter.context
+        self.channels = channels
+        self.holdback = holdback
+        self.levels = getter.commands_and_regexps
+        self.regexps = [re.compile(regexp, re.MULTILINE | re.DOTALL) for _, regexp in self.levels[:-1]]
+
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.level_of = {}
+        self.children = {}
+        self.offsets = {}
+        self.spool = None
+        self.pending = 0
+        self.errors = []
+        # level -> [commands, first queued, last completed]
+        self.level_stats = {}
+
+    def run(self, sink):
+        """
+        Executes the whole tree, writes the outputs to sink and returns the
+        number of chars written.
+        """
+        started = time.time()
+        root = self.levels[0][0]
+        workers = [self.getter]
+        self.spool = tempfile.TemporaryFile()
+        try:
+            for _ in range(self.channels - 1):
+                workers.append(self.getter._clone_on_new_channel())
+
+            self.queue_command(root, 0)
+            threads = [
+                threading.Thread(target=self._work, args=(worker,), name='%s-%d' % (threading.current_thread().name, i))
+                for i, worker in enumerate(workers)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            if self.errors:
+                raise self.errors[0]
+
+            received = self._write(sink, root)
+            self._log_stats(started)
+            return received
+        finally:
+            self.spool.close()
+            for worker in workers:
+                worker.output_listener = None
+            for worker in workers[1:]:
+                self.getter.command_stats.extend(worker.command_stats)
+                self.getter.slept += worker.slept
+                worker.chan.close()
+
+    def queue_command(self, command, level):
+        """
+        Queues command unless it was already queued. Returns True if queued.
+        """
+        with self.lock:
+            if command in self.level_of:
+                return False
+            self.level_of[command] = level
+            self.pending += 1
+            stats = self.level_stats.setdefault(level, [0, time.time(), None])
+            stats[0] += 1
+        self.queue.put(command)
+        return True
+
+    def _work(self, worker):
+        worker.current_level = -1
+        while True:
+            command = self.queue.get()
+            if command is None:
+                return
+            try:
+                # After an error the queue is only drained
+                if not self.errors:
+                    self._execute(worker, command)
+            except Exception as e:
+                self.errors.append(e)
+            finally:
+                self._done(command)
+
+    def _done(self, command):
+        with self.lock:
+            self.pending -= 1
+            self.level_stats[self.level_of[command]][2] = time.time()
+            finished = self.pending == 0
+        if finished:
+            for _ in range(self.channels):
+                self.queue.put(None)
+
+    def _execute(self, worker, command):
+        level = self.level_of[command]
+        self.conf.log.debug('%s: executing commmand "%s" (level %d)' % (self.context, command, level))
+
+        if level < len(self.regexps):
+            template = self.levels[level + 1][0]
+            streamed = []
+
+            def on_match(match):
+                child = template % match.groupdict()
+                streamed.append(child)
+                self.queue_command(child, level + 1)
+
+            worker.output_listener = IncrementalMatcher(self.regexps[level], on_match, self.holdback).feed
+            try:
+                output = worker._run_command(command)
+            finally:
+                worker.output_listener = None
+
+            children = [template % match.groupdict() for match in self.regexps[level].finditer(output)]
+            for child in children:
+                self.queue_command(child, level + 1)
+            extra = set(streamed) - set(children)
+            if extra:
+                self.conf.log.warning(
+                    '%s: %d commands matched in the partial output of "%s" are not in its complete output' % (
+                        self.context, len(extra), command
+                    )
+                )
+            self.children[command] = children
+        else:
+            output = worker._cached_output(command)
+            if output is None:
+                output = worker._run_command(command)
+                if self.getter.incremental_state is not None:
+                    self.getter.incremental_state.record(worker._state_key(command), output)
+
+        data = output.replace('\r', '').encode('utf-8')
+        with self.lock:
+            self.spool.seek(0, os.SEEK_END)
+            self.offsets[command] = (self.spool.tell(), len(data))
+            self.spool.write(data)
+
+    def _write(self, sink, root):
+        """
+        Writes the outputs in breadth first order, every command once.
+        """
+        received = 0
+        order = [root]
+        written = set(order)
+        for command in order:
+            offset, size = self.offsets[command]
+            self.spool.seek(offset)
+            output = self.spool.read(size).decode('utf-8')
+            sink.write(output)
+            received += len(output)
+            for child in self.children.get(command, ()):
+                if child not in written:
+                    written.add(child)
+                    order.append(child)
+        return received
+
+    def _log_stats(self, started):
+        total = sum(stats[0] for stats in self.level_stats.values())
+        listed = [child for children in self.children.values() for child in children]
+        self.conf.log.info(
+            '%s: command tree of %d commands, depth %d, %d duplicates skipped, %.1fs on %d channels' % (
+                self.context, total, len(self.level_stats), len(listed) - len(set(listed)), time.time() - started,
+                self.channels
+            )
+        )
+        for level, (count, first, last) in sorted(self.level_stats.items()):
+            self.conf.log.info(
+                '%s:   level %d: %d commands, first queued at %.1fs, last done at %.1fs' % (
+                    self.context, level, count, first - started, last - started
+                )
+            )
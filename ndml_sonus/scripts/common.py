@@ -1,20 +1,32 @@
+import logging
+import mmap
 import os
 import time
+from collections import Counter
 from datetime import datetime
+from operator import itemgetter
 import csv
+from itertools import islice
 
 from ndml_sonus.scripts.common_exceptions import *
 from ndml_sonus.scripts.separators import *
 from ndml_sonus.scripts.second_step import SecondStepParser
 from ndml_sonus.scripts.field_merger import FieldMerger
+from ndml_sonus.scripts.line_classifier import LineClassifier
+from ndml_sonus.scripts.literal_prefilter import prefiltered
+from ndml_sonus.scripts.regex_guard import BlockTimeGuard, RegexTimeLimitExceeded
+from ndml_sonus.scripts.whitespace_table import table_regex
+from ndml_sonus.scripts.record import RecordSchema, Record, MISSING
 
 
-class SonusParser:
 class SonusParser:
     """
     Contains some common used functions
     """
 
+    csv_line_emitter = None
+    second_step_parser = None
+
     def __init__(self, conf, host, report):
         self.conf = conf
         self.switch = host
@@ -29,6 +41,8 @@ class SonusParser:
         self.tmp_output_filename = conf.tmp_file_name(host, report)
 
         self.row_header = report.fields_list
+        # Rows written (and second step converted, see parse_blocks) at once
+        self.batch_size = max(int(getattr(conf, 'batch_size', 10000)), 1)
 
         self.report_fd = self._openReport()
         self._get_fileinfo()
@@ -71,14 +85,19 @@ class SonusParser:
             # First output line is the list of row headers
             w.writerow(self.row_header)
 
-            # Process all rows from the report and export them directly
+            # Process all rows from the report and export them by batches
             exp_line_count = 1
-            for record in self.parse():
-                exp_line_count += 1
-                w.writerow(record)
+            records = iter(self.parse())
+            while True:
+                batch = list(islice(records, self.batch_size))
+                if not batch:
+                    break
+                exp_line_count += len(batch)
+                w.writerows(batch)
 
             out_file.close()
             self.conf.log.info('%s: exported %d lines' % (self.context, exp_line_count))
+            self.log_statistics()
 
         except IOError as e:
             # Cleanup
@@ -99,6 +118,12 @@ class SonusParser:
     def parse(self):
         raise NotImplementedError()
 
+    def log_statistics(self):
+        if self.csv_line_emitter is not None:
+            self.csv_line_emitter.log_statistics(self.context)
+        if self.second_step_parser is not None:
+            self.second_step_parser.log_statistics(self.conf.log, self.context)
+
 
 class NoMatchException(ParseException):
     pass
@@ -138,14 +163,16 @@ class AutoFieldsAdder:
         self.field_merger = FieldMerger()
         self.auto_remove = ['Empty']
 
-    def add_auto_fields(self, result_dict):
+        # The auto fields do not change during the parsing of a report
+        self.auto_fields = {}
         if self.report.auto_add_date:
-            self.field_merger.merge({'Date': self.system_datetime}, result_dict)
-
+            self.auto_fields['Date'] = self.system_datetime
         if self.report.auto_add_report_host:
-            self.field_merger.merge({'Report Host': self.host_name}, result_dict)
+            self.auto_fields['Report Host'] = self.host_name
+        self.auto_fields['Empty'] = ''
 
-        self.field_merger.merge({'Empty': ''}, result_dict)
+    def add_auto_fields(self, result_dict):
+        self.field_merger.merge(self.auto_fields, result_dict)
 
     def remove_auto_fields(self, result_dict):
         for item_to_remove in self.auto_remove:
@@ -157,6 +184,13 @@ class NonOptionalParameterNotFoundException(ParseException):
 
 
 class CsvLineEmitter:
+    """
+    The plan of the rows of a report is compiled once: a row with all its
+    fields is taken with a single itemgetter call, the field lists are sets,
+    and the missing optional and unused fields are counted per report and
+    logged once by log_statistics.
+    """
+
     def __init__(self, report, log, auto_field_adder):
         self.report = report
         self.fields_to_emit = report.fields_list
@@ -165,19 +199,47 @@ class CsvLineEmitter:
         self.log = log
         self.auto_field_adder = auto_field_adder
 
+        self.record_schema = RecordSchema(self.fields_to_emit)
+        self.fields_to_emit_set = frozenset(self.fields_to_emit)
+        self.optional_fields_set = frozenset(self.optional_fields)
+        self.known_unused_fields_set = frozenset(self.known_unused_fields)
+        if len(self.fields_to_emit) > 1:
+            self.get_fields = itemgetter(*self.fields_to_emit)
+        else:
+            self.get_fields = lambda params_dict: tuple(params_dict[param] for param in self.fields_to_emit)
+
+        self.rows = 0
+        self.missing_optional_fields = Counter()
+        self.unused_fields = Counter()
+
     def warn_about_unused_fields(self, params_dict):
         self.auto_field_adder.remove_auto_fields(params_dict)
-        for key in params_dict:
-            if key not in self.fields_to_emit:
-                pass
-                # self.log.info(
-                #    'Field "%s" with value "%s" was unused, probably a new field in the report' % (
-                #        key, params_dict[key]
-                #    )
-                #)
+        if isinstance(params_dict, Record) and params_dict.schema is self.record_schema:
+            unused_fields = params_dict.extras.keys()
+        else:
+            unused_fields = [field for field in params_dict.keys() if field not in self.fields_to_emit_set]
+        if unused_fields:
+            self.unused_fields.update(unused_fields)
 
     def emit_line_from_dict(self, params_dict):
+        """
+        params_dict is a dict or a Record, of the record_schema for the fast path.
+        """
+        if isinstance(params_dict, Record) and params_dict.schema is self.record_schema:
+            csv_line = params_dict.values[:]
+            if MISSING in csv_line:
+                csv_line = self.emit_line_with_missing_fields(params_dict)
+        else:
+            try:
+                csv_line = list(self.get_fields(params_dict))
+            except KeyError:
+                csv_line = self.emit_line_with_missing_fields(params_dict)
 
+        self.rows += 1
+        self.warn_about_unused_fields(params_dict)
+        return csv_line
+
+    def emit_line_with_missing_fields(self, params_dict):
         csv_line = []
         non_optional_params_not_found = []
 
@@ -186,11 +248,13 @@ class CsvLineEmitter:
                 param_value = params_dict[param]
             else:
                 param_value = ''
-                if param in self.optional_fields:
-                    self.log.debug(
-                        'Param %s not found in params_dict %s. '
-                        'Generating empty field in CSV because it is an optional param.' % (param, params_dict)
-                    )
+                if param in self.optional_fields_set:
+                    self.missing_optional_fields[param] += 1
+                    if self.log.isEnabledFor(logging.DEBUG):
+                        self.log.debug(
+                            'Param %s not found in params_dict %s. '
+                            'Generating empty field in CSV because it is an optional param.' % (param, params_dict)
+                        )
                 else:
                     non_optional_params_not_found.append(param)
 
@@ -200,9 +264,33 @@ class CsvLineEmitter:
             raise NonOptionalParameterNotFoundException(
                 'Report %s : Non-optional params %s not found' % (self.report.name, non_optional_params_not_found)
             )
-        else:
-            self.warn_about_unused_fields(params_dict)
-            return csv_line
+        return csv_line
+
+    @staticmethod
+    def _format_counts(counts):
+        return ', '.join('%s (%d)' % (field, count) for field, count in sorted(counts.items()))
+
+    def log_statistics(self, context):
+        """
+        Logs the field statistics of the rows emitted so far, the fields that
+        are neither emitted nor known as unused are probably new fields.
+        """
+        if self.missing_optional_fields:
+            self.log.debug('%s: %d rows, optional fields missing: %s' % (
+                context, self.rows, self._format_counts(self.missing_optional_fields)
+            ))
+
+        new_fields = Counter({
+            field: count for field, count in self.unused_fields.items() if field not in self.known_unused_fields_set
+        })
+        if new_fields:
+            self.log.info('%s: %d rows, fields not emitted, probably new in the report: %s' % (
+                context, self.rows, self._format_counts(new_fields)
+            ))
+        if len(new_fields) < len(self.unused_fields):
+            self.log.debug('%s: known unused fields: %s' % (
+                context, self._format_counts(self.unused_fields - new_fields)
+            ))
 
 
 # Move this regex to a GSXCommandFullTextParser class
@@ -215,17 +303,88 @@ Node:\s*(?P<Node>\S+)\s*Date:\s*(?P<Date>\d+/\d+/\d+\s\d+:\d+:\d+)\s*\w+\s*
 %
 
 Result:\s*(?P<Result>\S+)
-'''
+''',
+        block_terminator=r'\n%\n\nResult:\s*\S+\n'
         )
+    # Raw files parse_mapped leaves to the text path: \r, non-ASCII characters
+    # and \x1c-\x1f, which \s matches in text and not in bytes
+    text_only_bytes = re.compile(rb'[\r\x1c-\x1f\x80-\xff]')
+    # Key of the offset of a block in the raw file in the dicts of the separator
+    block_offset_key = 'Block Offset'
 
     def __init__(self, conf, host, report):
         SonusFullTextParser.__init__(self, conf, host, report)
         self.auto_fields_adder = AutoFieldsAdder(self.report, self.host.name, self.conf.log)
         self.csv_line_emitter = CsvLineEmitter(report, conf.log, self.auto_fields_adder)
-        self.second_step_parser = SecondStepParser.create_from_report(self.report)
+        self.second_step_parser = SecondStepParser.create_from_report(
+            self.report, int(getattr(conf, 'second_step_memo_size', 4096))
+        )
+
+        # Read the raw file block by block instead of all at once, see separate_stream
+        self.streaming_parse = bool(int(getattr(conf, 'streaming_parse', 0)))
+        # Run bytes regexes over a memory map of the raw file, see parse_mapped
+        self.mmap_parse = bool(int(getattr(conf, 'mmap_parse', 0)))
+        # Seconds the report regexes may spend on a block, 0 for no limit (see parse_blocks)
+        self.block_guard = BlockTimeGuard(float(getattr(conf, 'regex_time_limit', 0)))
+        self.offset_key = self.block_offset_key if self.block_guard.enabled else None
+        self.quarantined_blocks = []
+
+    def parse(self):
+        if self.mmap_parse:
+            return self.parse_mapped()
+        if self.streaming_parse and self.separator.block_terminator is not None:
+            return self.parse_blocks(self.separator.separate_stream(self.report_fd, offset_key=self.offset_key))
+        return self.parse_text(self.report_fd.read())
 
     def parse_text(self, text):
-        nodes_results_and_commands_outputs = list(self.separator.separate(text))
+        return self.parse_blocks(self.separator.separate(text, self.offset_key))
+
+    def parse_mapped(self):
+        """
+        Runs the separator over a read-only memory map of the raw file: the
+        file is neither read nor decoded as a whole, the command outputs are
+        passed as spans of the map to parse_command_output_mapped.
+        Empty files, files with \\r line ends (translated by the text mode) and
+        files with non-ASCII characters or \\x1c-\\x1f (where \\s, \\d and \\w of
+        the bytes patterns would not match like the text ones) are parsed from
+        the text.
+        """
+        fileno = self.report_fd.fileno()
+        if os.fstat(fileno).st_size == 0:
+            for result in self.parse_text(self.report_fd.read()):
+                yield result
+            return
+
+        buf = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+        try:
+            if self.text_only_bytes.search(buf) is not None:
+                self.conf.log.debug(
+                    '%s: \\r, \\x1c-\\x1f or non-ASCII characters, parsing the decoded text' % self.context
+                )
+                blocks = self.parse_text(self.report_fd.read())
+            else:
+                blocks = self.parse_blocks(
+                    self.separator.separate_buffer(buf, text_group='CommandOutput', offset_key=self.offset_key), buf
+                )
+            for result in blocks:
+                yield result
+        finally:
+            try:
+                buf.close()
+            except BufferError:
+                # Still exported to the matches of a traceback, unmapped when they are collected
+                pass
+
+    def parse_blocks(self, nodes_results_and_commands_outputs, buf=None):
+        """
+        When buf is given the CommandOutput of the blocks is a span of buf.
+        The rows go through the second step by batches of batch_size rows.
+        With a regex_time_limit the command output of a block is parsed at
+        once under the time limit, and a block going over it is skipped (see
+        quarantine_block) instead of stalling the run.
+        """
+        record_schema = self.csv_line_emitter.record_schema
+        batch = []
         for node_result_and_command_output in nodes_results_and_commands_outputs:
             if self.report.check_result:
                 try:
@@ -235,21 +394,82 @@ Result:\s*(?P<Result>\S+)
                 except KeyError:
                     raise StatusNotOKException()
 
-            command_output_fields = self.parse_command_output(node_result_and_command_output.pop('CommandOutput'))
+            command_output = node_result_and_command_output.pop('CommandOutput')
+            if self.block_guard.enabled:
+                offset = node_result_and_command_output.pop(self.offset_key)
+                try:
+                    command_output_fields = self.block_guard.run(self.parse_block_rows, command_output, buf)
+                except RegexTimeLimitExceeded:
+                    self.quarantine_block(offset, node_result_and_command_output)
+                    continue
+            elif buf is not None:
+                command_output_fields = self.parse_command_output_mapped(buf, *command_output)
+            else:
+                command_output_fields = self.parse_command_output(command_output)
+            # The node fields are shared by the rows of the block, and so are
+            # the auto fields unless a row has one of them
+            node_record = record_schema.record(node_result_and_command_output)
+            auto_record = None
             for csv_line in command_output_fields:
-                result_dict = node_result_and_command_output.copy()
-                result_dict.update(csv_line)
+                if csv_line.keys().isdisjoint(self.auto_fields_adder.auto_fields.keys()):
+                    if auto_record is None:
+                        auto_record = record_schema.record(parent=node_record)
+                        self.auto_fields_adder.add_auto_fields(auto_record)
+                    result_dict = record_schema.record(csv_line, auto_record)
+                else:
+                    result_dict = record_schema.record(csv_line, node_record)
+                    self.auto_fields_adder.add_auto_fields(result_dict)
+
+                batch.append(result_dict)
+                if len(batch) >= self.batch_size:
+                    for result_element in self.emit_batch(batch):
+                        yield result_element
+                    batch = []
 
-                self.auto_fields_adder.add_auto_fields(result_dict)
-                self.second_step_parser.parse_dict(self.report, result_dict)
+        for result_element in self.emit_batch(batch):
+            yield result_element
 
-                result_element = self.csv_line_emitter.emit_line_from_dict(result_dict)
+    def parse_block_rows(self, command_output, buf=None):
+        """
+        List of the rows of a command output: all the matching is done by the call.
+        """
+        if buf is not None:
+            return list(self.parse_command_output_mapped(buf, *command_output))
+        return list(self.parse_command_output(command_output))
 
-                yield result_element
+    def quarantine_block(self, offset, node_fields):
+        """
+        Skips a block that went over regex_time_limit. The raw file is left
+        as it is, the offset of the block (in bytes when parsed from the
+        memory map, in characters otherwise) locates it.
+        """
+        self.quarantined_blocks.append(offset)
+        self.conf.log.warning('%s: block at offset %d (%s) took more than %gs in the report regexes, skipped' % (
+            self.context, offset, ', '.join('%s=%s' % item for item in sorted(node_fields.items())),
+            self.block_guard.time_limit
+        ))
+
+    def log_statistics(self):
+        SonusFullTextParser.log_statistics(self)
+        if self.quarantined_blocks:
+            self.conf.log.warning('%s: %d blocks skipped by regex_time_limit, at offsets %s' % (
+                self.context, len(self.quarantined_blocks), ' '.join(str(offset) for offset in self.quarantined_blocks)
+            ))
+
+    def emit_batch(self, batch):
+        self.second_step_parser.parse_batch(self.report, batch)
+        return [self.csv_line_emitter.emit_line_from_dict(result_dict) for result_dict in batch]
 
     def parse_command_output(self, text):
         raise NotImplementedError()
 
+    def parse_command_output_mapped(self, buf, start, end):
+        """
+        Parses the command output buf[start:end]. Parsers running a regex
+        over the output override it to run a bytes regex over buf directly.
+        """
+        return self.parse_command_output(buf[start:end].decode('utf-8'))
+
 
 class NodeAndResultParser(SonusLineParser):
     def __init__(self, conf, host, report):
@@ -260,21 +480,25 @@ class NodeAndResultParser(SonusLineParser):
         self.record_to_emit = False
         self.fields_to_emit = report.fields_list
         self.commands = [line.strip().upper() for line in report.commands]
+        self.line_classifier = LineClassifier(self.commands, self.node_separator, self.result_separator)
 
-        self.fields = {}
         self.auto_fields_adder = AutoFieldsAdder(report, self.host.name, conf.log)
         self.csv_line_emitter = CsvLineEmitter(report, conf.log, self.auto_fields_adder)
+        self.record_schema = self.csv_line_emitter.record_schema
+        self.fields = self.record_schema.record()
         self.field_merger = FieldMerger()
-        self.second_step_parser = SecondStepParser.create_from_report(self.report)
+        self.second_step_parser = SecondStepParser.create_from_report(
+            self.report, int(getattr(conf, 'second_step_memo_size', 4096))
+        )
 
     def update_fields(self, d):
         self.field_merger.merge(d, self.fields)
 
     def clear_fields_except_node_and_date(self):
-        self.fields = dict(
+        self.fields = self.record_schema.record(dict(
             Node=self.fields['Node'],
             Date=self.fields['Date'],
-        )
+        ))
 
     def get_csv_line(self):
         self.auto_fields_adder.add_auto_fields(self.fields)
@@ -290,11 +514,11 @@ class NodeAndResultParser(SonusLineParser):
 
         return result
 
-    def found_node_separator(self, line):
-        self.update_fields(self.node_separator.separate(line))
+    def found_node_separator(self, line, fields=None):
+        self.update_fields(fields if fields is not None else self.node_separator.separate(line))
 
-    def found_result_separator(self, line):
-        result = self.result_separator.separate(line)['Result']
+    def found_result_separator(self, line, fields=None):
+        result = (fields if fields is not None else self.result_separator.separate(line))['Result']
         results = {'OK': True}
         result_is_ok = results.get(result.upper(), False)
 
@@ -307,14 +531,19 @@ class NodeAndResultParser(SonusLineParser):
         return result
 
     def parse_line(self, line):
+        kind, fields = self.line_classifier.classify(line)
+        return self.parse_classified_line(line, kind, fields)
+
+    def parse_classified_line(self, line, kind, fields):
+        """
+        kind and fields as returned by LineClassifier.classify
+        """
         results = []
 
-        if len(line.strip()) == 0 or line.strip() == '%' or self.command_in_line(line):
-            results = []
-        elif self.node_separator.matches(line):
-            self.found_node_separator(line)
-        elif self.result_separator.matches(line):
-            results = self.found_result_separator(line)
+        if kind == LineClassifier.NODE:
+            self.found_node_separator(line, fields)
+        elif kind == LineClassifier.RESULT:
+            results = self.found_result_separator(line, fields)
 
         return results
 
@@ -337,28 +566,32 @@ class SeparatedRecordsParserWithMultipleFieldSeparators(NodeAndResultParser):
         NodeAndResultParser.__init__(self, conf, host, report)
         self.record_separator = record_separator
         self.field_separators = field_separators
+        self.line_classifier = LineClassifier(
+            self.commands, self.node_separator, self.result_separator, record_separator
+        )
 
-    def found_record_separator(self, line):
+    def found_record_separator(self, line, fields=None):
         result = self.get_csv_line()
 
-        self.update_fields(self.record_separator.separate(line))
+        self.update_fields(fields if fields is not None else self.record_separator.separate(line))
         self.record_to_emit = True
 
         return result
 
-    def found_field(self, line, field_separator):
-        self.update_fields(field_separator.separate(line))
+    def found_field(self, line, field_separator, fields=None):
+        self.update_fields(fields if fields is not None else field_separator.separate(line))
         return []
 
-    def parse_line(self, line):
-        if self.record_separator.matches(line):
-            results = self.found_record_separator(line)
-        elif NodeAndResultParser.matches(self, line):
-            results = NodeAndResultParser.parse_line(self, line)
+    def parse_classified_line(self, line, kind, fields):
+        if kind == LineClassifier.RECORD:
+            results = self.found_record_separator(line, fields)
+        elif kind != LineClassifier.OTHER:
+            results = NodeAndResultParser.parse_classified_line(self, line, kind, fields)
         else:
             for field_separator in self.field_separators:
-                if field_separator.matches(line):
-                    results = self.found_field(line, field_separator)
+                fields = field_separator.try_separate(line)
+                if fields is not None:
+                    results = self.found_field(line, field_separator, fields)
                     break
             else:
                 results = []
@@ -392,10 +625,18 @@ class RegexParserWithMultipleFieldsSeparator(SeparatedRecordsParserWithMultipleF
 class RegexFullTextParser(CommandFullTextParser):
     regex = r''
     regex_mode = 0
+    # regex of the class as compiled, see whitespace_table
+    matching_regex = r''
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.matching_regex = table_regex(cls.regex, cls.regex_mode)
 
     def __init__(self, *args, **kwargs):
         CommandFullTextParser.__init__(self, *args, **kwargs)
-        self.compiled_regex = re.compile(self.regex, self.regex_mode)
+        self.compiled_regex = prefiltered(re.compile(self.matching_regex, self.regex_mode))
+        if self.mmap_parse:
+            self.compiled_bytes_regex = prefiltered(re.compile(self.matching_regex.encode('utf-8'), self.regex_mode))
 
     def parse_command_output(self, text):
         matches = self.compiled_regex.finditer(text)
@@ -403,6 +644,10 @@ class RegexFullTextParser(CommandFullTextParser):
         for match in matches:
             yield match.groupdict()
 
+    def parse_command_output_mapped(self, buf, start, end):
+        for match in self.compiled_bytes_regex.finditer(buf, start, end):
+            yield decoded_groupdict(match)
+
 
 class RegexOneColumnParser(RegexSeparatedRecordsParser):
     def __init__(self, conf, host, report):
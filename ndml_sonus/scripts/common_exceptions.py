@@ -1,4 +1,3 @@
-class ParseException(Exception):
 class ParseException(Exception):
     pass
 
@@ -13,7 +13,7 @@ class FieldMerger:
     @staticmethod
     def merge(source, dest):
         log = sonus_logging.log
-        possible_clashes = set(source.keys()).intersection(dest.keys())
+        possible_clashes = [key for key in source if key in dest]
         real_clash = False
 
         if len(possible_clashes) != 0:
@@ -3,19 +3,32 @@
 Module to retrieve data for the SONUS
 """
 
+import copy
 import fnmatch
+import json
 import os
+import select
 import socket
 import re
+import shutil
+import tempfile
+import threading
 import time
 import zipfile
 
 from datetime import datetime
+from io import StringIO
 from optparse import OptionParser
 
 import paramiko
 
 from ndml_sonus.lib.ndml_utils_tgw import Config
+from ndml_sonus.scripts.channel_reader import PromptReader
+from ndml_sonus.scripts.collection import CollectionEngine, TaskConfig
+from ndml_sonus.scripts.command_tree import CommandTreeExpander
+from ndml_sonus.scripts.incremental_state import IncrementalState
+from ndml_sonus.scripts.session_broker import BrokerChannel, BrokerException, SessionBroker, get_broker_stats
+from ndml_sonus.scripts.sftp_download import DownloadException, SftpDownloader
 
 
 class GetException(Exception):
@@ -23,10 +36,64 @@ class GetException(Exception):
 
 
 class TransportPool(dict):
-    pass
+    """
+    Open (transport, channel) pairs keyed by (ip, port), shared by all the
+    getters of the process. An entry is removed while a getter uses it, so
+    concurrent getters never share a channel.
+    """
+
+    def __init__(self):
+        dict.__init__(self)
+        self.lock = threading.Lock()
+
+    def take(self, key):
+        with self.lock:
+            entries = self.get(key)
+            if entries:
+                return entries.pop()
+            return None
+
+    def put(self, key, tn_and_chan):
+        with self.lock:
+            self.setdefault(key, []).append(tn_and_chan)
+
+    def iter_entries(self):
+        with self.lock:
+            for entries in self.values():
+                for tn_and_chan in entries:
+                    yield tn_and_chan
+
+
+class HostSettings:
+    """
+    Settings of the command and file getters, per host (self.host) or global
+    (self.conf).
+    """
+
+    def _setting(self, name, default):
+        """
+        Returns a numeric setting from the host definition, the config file or the default.
+        """
+        return float(getattr(self.host, name, getattr(self.conf, name, default)))
+
+    def _flag(self, name, default):
+        """
+        Returns a boolean setting from the host definition, the config file or the default.
+        Accepts 1/0, yes/no, true/false and on/off.
+        """
+        value = getattr(self.host, name, getattr(self.conf, name, default))
+        if isinstance(value, str):
+            if value.strip().lower() in ('yes', 'true', 'on'):
+                return True
+            if value.strip().lower() in ('no', 'false', 'off', ''):
+                return False
+        try:
+            return bool(float(value))
+        except ValueError:
+            raise ValueError('%s: boolean expected, got %r' % (name, value))
 
 
-class GenericCommandGetter:
+class GenericCommandGetter(HostSettings):
     """
     Run CLI commands via transport protocol and save output
     """
@@ -47,21 +114,47 @@ class GenericCommandGetter:
         # Context info to include in all logging messages
         self.context = '%s/%s' % (self.host.name, self.report.name)
 
+        # Completion of a command is detected when its prompt comes back. These
+        # optional politeness delays (seconds, per host or global) are slept
+        # before reading the output and after each command.
+        self.read_delay = self._setting('read_delay', 0)
+        self.command_delay = self._setting('command_delay', 0)
+        self.command_timeout = self._setting('command_timeout', 30000)
+
+        # (command, seconds waiting on the switch, seconds sleeping, chars received)
+        self.command_stats = []
+        self.slept = 0.0
+
+        # Directory where the received outputs are recorded for the simulator
+        self.record_sessions = getattr(self.conf, 'record_sessions', None)
+
+    def _sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+            self.slept += seconds
+
     def get(self):
         """
         Retrieves the report data and save to raw file
         """
         self.conf.log.debug('%s: getting data via %s' % (self.context, type(self)))
 
-        # Open output file
+        # Open output file. The output of every command is written to the tmp
+        # file as it arrives, the raw file only appears once it is complete.
         raw_file = self.conf.raw_file_name(self.host, self.report)
         tmp_file = os.path.join(self.conf.tmp_dir, os.path.basename(raw_file))
         fn = open(tmp_file, 'w')
 
-        self._open_transport()
-        self._authenticate()
-        fn.write(self._exec_commands())
-        self._close_transport()
+        try:
+            self._open_transport()
+            self._authenticate()
+            self._exec_commands(fn)
+            self._close_transport()
+        except Exception:
+            fn.close()
+            os.unlink(tmp_file)
+            raise
+        self._log_command_stats()
 
         fn.close()
         if os.path.exists(raw_file):
@@ -97,38 +190,90 @@ class GenericCommandGetter:
     def _exec_command(self, cmd):
         raise NotImplementedError()
 
+    def _run_command(self, cmd):
+        """
+        Executes one command and records how long was spent waiting on the
+        switch and how long was spent sleeping.
+        """
+        started = time.time()
+        slept = self.slept
+        cmd_output = self._exec_command(cmd)
+        sleeping = self.slept - slept
+        self.command_stats.append((cmd, time.time() - started - sleeping, sleeping, len(cmd_output)))
+        if self.record_sessions:
+            self._record(cmd, cmd_output)
+        return cmd_output
+
+    record_lock = threading.Lock()
+
+    def _record(self, cmd, cmd_output):
+        """
+        Appends the raw output of cmd to the recording of the host and report,
+        replayed by sonus_simulator.py --replay.
+        """
+        record = {'instance': getattr(self, 'current_instance', None), 'command': cmd, 'output': cmd_output}
+        path = os.path.join(self.record_sessions, '%s_%s.jsonl' % (self.host.name, self.report.name))
+        with self.record_lock:
+            with open(path, 'a') as fd:
+                fd.write(json.dumps(record) + '\n')
+
+    def _cached_output(self, cmd):
+        """
+        Returns the output of cmd kept from a previous run, None if it has to be executed.
+        """
+        return None
+
+    def _log_command_stats(self):
+        if not self.command_stats:
+            return
+
+        waiting = sum(stat[1] for stat in self.command_stats)
+        slowest = max(self.command_stats, key=lambda stat: stat[1])
+        self.conf.log.info(
+            '%s: %d commands, %.1fs waiting on the switch, %.1fs sleeping, slowest "%s" (%.1fs)' % (
+                self.context, len(self.command_stats), waiting, self.slept, slowest[0], slowest[1]
+            )
+        )
+
     def get_commands(self):
         for command in self.report.commands:
             yield command
 
-    def _exec_commands_do(self):
+    def _exec_commands_do(self, sink):
         """
         Executes list of commands for the report.
-        Returns produced output.
+        Writes the output of every command to sink as soon as it is received.
+        Returns the number of chars written.
         """
 
         self.conf.log.info('********************START _EXEC_COMMANDS_DO*************')
-        output = ''
+        received = 0
         try:
             commands = self.get_commands()
             for cmd in commands:
-                self.conf.log.debug('%s: executing commmand "%s"' % (self.context, cmd))
-                cmd_output = self._exec_command(cmd)
-                # output += cmd_output.replace('\r\n', '\n')
-                output += cmd_output.replace('\r', '')
-                self.conf.log.debug('%s: received %d chars' % (self.context, len(output)))
-                self.conf.log.debug("Waiting before running new command...")
-                time.sleep(3)
-
-            return output
+                cmd_output = self._cached_output(cmd)
+                executed = cmd_output is None
+                if executed:
+                    self.conf.log.debug('%s: executing commmand "%s"' % (self.context, cmd))
+                    cmd_output = self._run_command(cmd)
+                # cmd_output = cmd_output.replace('\r\n', '\n')
+                cmd_output = cmd_output.replace('\r', '')
+                sink.write(cmd_output)
+                received += len(cmd_output)
+                self.conf.log.debug('%s: received %d chars' % (self.context, received))
+                if executed and self.command_delay > 0:
+                    self.conf.log.debug("Waiting before running new command...")
+                    self._sleep(self.command_delay)
+
+            return received
 
         except EOFError:
             if cmd == 'logout':
-                return output
+                return received
             else:
                 self.conf.log.critical(
                     '%s: transport protocol connection closed unexpectedly, received %d chars' % (
-                        self.context, len(output)
+                        self.context, received
                     )
                 )
                 raise GetException()
@@ -138,15 +283,20 @@ class GenericCommandGetter:
             self._close_transport()
             raise GetException()
 
-    def _exec_commands(self):
-        result = ''
+    def _exec_commands(self, sink=None):
+        """
+        Executes the report commands in every instance. The output is written
+        to sink, or returned as a string when no sink is given.
+        """
+        buffer = StringIO() if sink is None else None
         for instance in self.report.instances:
             self.conf.log.debug('%s: executing yeeey in instance %s' % (self.context, instance))
             self._change_to_instance(instance)
-            result += self._exec_commands_do()
+            self._exec_commands_do(buffer if sink is None else sink)
             self.conf.log.debug('%s: report finished in instance %s.' % (self.context, instance))
 
-        return result
+        if buffer is not None:
+            return buffer.getvalue()
 
     def _change_to_instance(self, instance):
         raise NotImplementedError()
@@ -155,17 +305,37 @@ class GenericCommandGetter:
 class SshGetter(GenericCommandGetter):
     prompt = r'\$'
     pool = TransportPool()
+    supports_instance_channels = True
 
     def __init__(self, *args, **kwargs):
         super(SshGetter, self).__init__(*args, **kwargs)
+        # Bytes asked to the channel per recv() and number of trailing
+        # characters of the output searched for the prompt
+        self.recv_size = int(self._setting('recv_size', 32768))
+        self.prompt_window = int(self._setting('prompt_window', 4096))
+
+        # Unix socket of the session broker shared by the getter processes, if any
+        self.broker_socket = getattr(self.conf, 'session_broker', None)
+        self.leased = False
+
+        # Number of channels opened on the transport to run the instances of
+        # the report concurrently, and the instance selected on self.chan
+        self.instance_channels = int(self._setting('instance_channels', 1))
+        self.is_clone = False
+        self.selected_instance = None
+
+        # Called with the command output as it is received, see CommandTreeExpander
+        self.output_listener = None
 
     def _get_transport_instance(self):
         """
         Open SSH connection to host
         """
+        if self.broker_socket:
+            return self._lease_from_broker()
 
         self.conf.log.info('creating connection %s:%s' % (self.host.ip, self.host.port))
-        tn_and_chan = self.pool.get((self.host.ip, self.host.port))
+        tn_and_chan = self.pool.take((self.host.ip, self.host.port))
         if tn_and_chan and tn_and_chan[0].active:
             self.tn = tn_and_chan[0]
             self.chan = tn_and_chan[1]
@@ -194,29 +364,75 @@ class SshGetter(GenericCommandGetter):
 
         return self.tn
 
+    def _lease_from_broker(self):
+        """
+        Lease an authenticated session from the session broker
+        """
+        self.conf.log.info('leasing session for %s from broker %s' % (self.host.name, self.broker_socket))
+        try:
+            self.chan = BrokerChannel(self.broker_socket, {'host': self.host.name, 'report': self.report.name})
+        except (socket.error, BrokerException) as e:
+            msg = 'Session broker error for %s: %s' % (self.host.name, e)
+            self.conf.log.critical(msg)
+            raise GetException(msg)
+
+        self.conf.log.info(
+            'Got %s session from broker (login %.1fs)' % ('reused' if self.chan.reused else 'new', self.chan.login_time)
+        )
+        self.tn = self.chan
+        self.leased = True
+        # The broker already went through the login
+        self.instance_from_pool = True
+        return self.tn
+
     def _close_transport_instance(self, tn):
+        if self.is_clone:
+            # Extra channels are closed, only the main channel goes back to the pool
+            self.chan.close()
+            return
+
+        if self.leased:
+            self.conf.log.debug('Giving back session to the broker')
+            self.chan.close()
+            return
+
         self.conf.log.debug('Putting back instance %s into the pool' % type(tn))
-        self.pool[(self.host.ip, self.host.port)] = (self.tn, self.chan)
+        self.pool.put((self.host.ip, self.host.port), (self.tn, self.chan))
         # tn.chan.close()
         # tn.t.close()
 
-    def read_until(self, match):
+    def _wait_for_data(self, deadline):
+        """
+        Polls the channel until data is ready to be received.
+        Raises socket.timeout when the deadline is reached.
+        """
+        while not self.chan.recv_ready():
+            if self.chan.closed or self.chan.eof_received:
+                return
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise socket.timeout()
+            select.select([self.chan], [], [], min(remaining, 1.0))
+
+    def read_until(self, match, listener=None):
         """
         Receives from channel until match is found as terminating string
-        of the received text.
+        of the received text. listener is called with every decoded chunk.
         """
-        out = ''
-        reg = re.compile(r'%s\s+?$' % match)
+        reader = PromptReader(match, self.prompt_window, listener)
+        deadline = time.time() + self.command_timeout
         try:
             while True:
-                resp = self.chan.recv(32768).decode('utf-8', 'ignore')
-                out += resp
-                if reg.search(out):
-                    return out
+                self._wait_for_data(deadline)
+                resp = self.chan.recv(self.recv_size)
+                if not resp:
+                    raise EOFError()
+                if reader.feed(resp):
+                    return reader.text()
         except socket.timeout:
             msg = 'Timeout waiting for "%s"!' % match
             self.conf.log.critical(msg)
-            self.conf.log.debug('received until now: [%s]' % out)
+            self.conf.log.debug('received until now: [%s]' % reader.text())
             raise Exception(msg)
 
     def _exec_command(self, command):
@@ -227,8 +443,8 @@ class SshGetter(GenericCommandGetter):
         full_command = 'swmml -n %s -e %s' % (self.current_instance, command)
         self.conf.log.info('sending "%s"' % full_command)
         self.chan.send(full_command + '\n')
-        self.conf.log.info('Command sent. Waiting before reading output...')
-        time.sleep(2)
+        self.conf.log.info('Command sent. Waiting for output...')
+        self._sleep(self.read_delay)
         output = self.read_until(self.prompt)
         self.conf.log.info('received %d lines' % len(output.splitlines()))
         self.conf.log.debug('output: [%s]' % output)
@@ -242,31 +458,107 @@ class SshGetter(GenericCommandGetter):
         if not self.instance_from_pool:
             self.conf.log.debug('connect...')
             self.tn.connect(username=self.host.ssh_usr, password=self.host.ssh_pwd)
+            self._open_channel()
 
-            self.conf.log.debug('new channel')
-            self.chan = self.tn.open_session()
-            self.chan.get_pty()
-            self.chan.invoke_shell()
-            self.chan.settimeout(30000)
+    def _open_channel(self):
+        """
+        Opens a new interactive channel on the authenticated transport and
+        waits for its prompt. The channel becomes self.chan.
+        """
+        self.conf.log.debug('new channel')
+        self.chan = self.tn.open_session()
+        self.chan.get_pty()
+        self.chan.invoke_shell()
+        self.chan.settimeout(30000)
+        self.selected_instance = None
+
+        # self.log.debug('receiving header...')
+        # response = self.chan.recv(5000)
+        # self.log.debug('header: [%s]' % response)
+
+        self.conf.log.debug('receiving prompt...')
+        response = self.chan.recv(1000)
+        self.conf.log.debug('response: [%s]' % response)
+        self.conf.log.info('connected to %s' % self.host.name)
+        self.read_until(self.prompt)
+        self.conf.log.info('got prompt %s' % self.host.name)
 
-            # self.log.debug('receiving header...')
-            # response = self.chan.recv(5000)
-            # self.log.debug('header: [%s]' % response)
+    def _exec_commands(self, sink=None):
+        channels = min(self.instance_channels, len(self.report.instances))
+        if channels > 1 and self.supports_instance_channels and not self.leased and sink is not None:
+            self._exec_commands_on_channels(sink, channels)
+        else:
+            return super(SshGetter, self)._exec_commands(sink)
 
-            self.conf.log.debug('receiving prompt...')
-            response = self.chan.recv(1000)
-            self.conf.log.debug('response: [%s]' % response)
-            self.conf.log.info('connected to %s' % self.host.name)
-            self.read_until(self.prompt)
-            self.conf.log.info('got prompt %s' % self.host.name)
+    def _clone_on_new_channel(self):
+        """
+        Returns a copy of the getter working on a new channel of the same transport.
+        """
+        clone = copy.copy(self)
+        clone.is_clone = True
+        clone.command_stats = []
+        clone.slept = 0.0
+        clone._open_channel()
+        return clone
+
+    def _exec_commands_on_channels(self, sink, channels):
+        """
+        Executes the report commands of the instances concurrently on several
+        channels of the same transport. Instances are assigned round robin to
+        the channels, the output of every instance is spooled on its own and
+        written to sink in the original instance order.
+        """
+        instances = list(self.report.instances)
+        self.conf.log.info('%s: running %d instances on %d channels' % (self.context, len(instances), channels))
+
+        outputs = [tempfile.SpooledTemporaryFile(max_size=1024 * 1024, mode='w+') for _ in instances]
+        workers = [self]
+        errors = []
+        try:
+            for _ in range(channels - 1):
+                workers.append(self._clone_on_new_channel())
+
+            def run(worker, indexes):
+                try:
+                    for index in indexes:
+                        worker._change_to_instance(instances[index])
+                        worker._exec_commands_do(outputs[index])
+                        self.conf.log.debug('%s: report finished in instance %s.' % (self.context, instances[index]))
+                except Exception as e:
+                    errors.append(e)
+
+            threads = [
+                threading.Thread(target=run, args=(worker, range(i, len(instances), channels)))
+                for i, worker in enumerate(workers)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            if errors:
+                raise errors[0]
+
+            for output in outputs:
+                output.seek(0)
+                shutil.copyfileobj(output, sink)
+        finally:
+            for output in outputs:
+                output.close()
+            for worker in workers[1:]:
+                self.command_stats.extend(worker.command_stats)
+                self.slept += worker.slept
+                worker.chan.close()
 
     @staticmethod
     def clear_pool():
-        for tn_and_chan in SshGetter.pool.values():
+        for tn_and_chan in SshGetter.pool.iter_entries():
             tn_and_chan[0].close()
 
 
 class SshSonusGetter(SshGetter):
+    # Prompt once past the port 8122 hop, _exec_command adds the instance to it
+    prompt = '>'
 
     def __init__(self, *args, **kwargs):
         super(SshSonusGetter, self).__init__(*args, **kwargs)
@@ -279,16 +571,18 @@ class SshSonusGetter(SshGetter):
         Issue a command and return its output
         """
         self.conf.log.info('*****************_STARTING_ SSHSONUS_GETTER_ EXEC_COMMAND')
-        self.conf.log.info('switching instance %s' % self.current_instance)
-        self.chan.send('select target instance %s\n' % self.current_instance)
         self.prompt = '%s>' % self.current_instance
-        self.read_until(self.prompt)
+        if self.selected_instance != self.current_instance:
+            self.conf.log.info('switching instance %s' % self.current_instance)
+            self.chan.send('select target instance %s\n' % self.current_instance)
+            self.read_until(self.prompt)
+            self.selected_instance = self.current_instance
 
         self.conf.log.info('sending "%s"' % command)
         self.chan.send(command + '\n')
-        self.conf.log.info('Command sent. Waiting before reading output...')
-        time.sleep(2)
-        output = self.read_until(self.prompt)
+        self.conf.log.info('Command sent. Waiting for output...')
+        self._sleep(self.read_delay)
+        output = self.read_until(self.prompt, self.output_listener)
         self.conf.log.info('received %d lines' % len(output.splitlines()))
         self.conf.log.debug('output: [%s]' % output)
         self.got_command_output(command, output)
@@ -301,31 +595,34 @@ class SshSonusGetter(SshGetter):
         if not self.instance_from_pool:
             self.conf.log.debug('connect to %s@%s:%s...' % (self.host.ssh_usr, self.host.ip, self.host.port))
             self.tn.connect(username=self.host.ssh_usr, password=self.host.ssh_pwd)
-
-            self.conf.log.debug('new channel')
-            self.chan = self.tn.open_session()
-            self.chan.get_pty()
-            self.chan.invoke_shell()
-            self.chan.settimeout(30000)
-
-            self.conf.log.debug('receiving prompt...')
-            response = self.chan.recv(1000)
-            self.conf.log.debug('response: [%s]' % response)
-            self.conf.log.info('connected to %s' % self.host.name)
-            r = self.read_until(self.conf.read_until)
-            self.conf.log.debug('prompt: %s' % r)
-            self.conf.log.info('got prompt %s' % self.host.name)
-
-            self.chan.send('ssh ndml@localhost -p 8122\n')
-            self.read_until('assword:')
-            send_pass = self.conf.send_pass + "\n"
-            self.chan.send(send_pass)
-            self.read_until('>')
-
-            self.conf.log.info('switching env (port 8122)')
-
-
-class GenericFileGetter:
+            self._open_channel()
+
+    def _open_channel(self):
+        self.conf.log.debug('new channel')
+        self.chan = self.tn.open_session()
+        self.chan.get_pty()
+        self.chan.invoke_shell()
+        self.chan.settimeout(30000)
+        self.selected_instance = None
+
+        self.conf.log.debug('receiving prompt...')
+        response = self.chan.recv(1000)
+        self.conf.log.debug('response: [%s]' % response)
+        self.conf.log.info('connected to %s' % self.host.name)
+        r = self.read_until(self.conf.read_until)
+        self.conf.log.debug('prompt: %s' % r)
+        self.conf.log.info('got prompt %s' % self.host.name)
+
+        self.chan.send('ssh ndml@localhost -p 8122\n')
+        self.read_until('assword:')
+        send_pass = self.conf.send_pass + "\n"
+        self.chan.send(send_pass)
+        self.read_until('>')
+
+        self.conf.log.info('switching env (port 8122)')
+
+
+class GenericFileGetter(HostSettings):
     def get(self):
         raise NotImplementedError()
 
@@ -344,6 +641,13 @@ class SftpFileGetter(GenericFileGetter):
         # Context info to include in all logging messages
         self.context = '%s/%s' % (self.host.name, self.report.name)
 
+        # Bytes read per call and number of read requests in flight
+        self.downloader = SftpDownloader(
+            self.conf.log, self.context, self.conf.tmp_dir,
+            block_size=int(self._setting('sftp_block_size', 1024 * 1024)),
+            max_requests=int(self._setting('sftp_max_requests', 64))
+        )
+
     def _choose_file_to_download(self, files_available):
         dates = []
         files_available = fnmatch.filter(files_available, 'TrunkGroup-*-*-*-*-*.csv')
@@ -406,6 +710,7 @@ class SftpFileGetter(GenericFileGetter):
             return None
 
     def get(self):
+        t = None
         try:
             t = paramiko.Transport((self.host.ip, int(self.host.port)))
             t.connect(username=self.host.ssh_usr, password=self.host.ssh_pwd)
@@ -415,56 +720,97 @@ class SftpFileGetter(GenericFileGetter):
 
             if file_to_download and file_to_download.split(".")[-1] == "zip":
                 remote_abspath = self.report.path + file_to_download
-                self.conf.log.info('File chosen to download stat = %s' % sftp.stat(remote_abspath))
-
-                zip_file = self.conf.zip_file_name(file_to_download)
-
-                self.conf.log.info('Downloading file %s to %s' % (remote_abspath, zip_file))
-
-                sftp.get(remote_abspath, self.conf.zip_file_name(file_to_download))
-                self.conf.log.info('File %s downloaded - Local size = %d' % (remote_abspath, os.path.getsize(zip_file)))
-
+                local_path = self.conf.zip_file_name(file_to_download)
             elif file_to_download and file_to_download.split(".")[-1] == "raw":
                 remote_abspath = self.report.path + '/' + file_to_download
-                self.conf.log.info('File chosen to download stat = %s' % sftp.stat(remote_abspath))
-
-                self.conf.log.info(
-                    'Downloading file %s to %s' % (
-                        remote_abspath, self.conf.raw_file_name(self.host, self.report)
-                    )
-                )
-
-                sftp.get(remote_abspath, self.conf.raw_file_name(self.host, self.report))
-                self.conf.log.info(
-                    'File %s downloaded - Local size = %d' % (
-                        remote_abspath, os.path.getsize(self.conf.raw_file_name(self.host, self.report))
-                    )
-                )
+                local_path = self.conf.raw_file_name(self.host, self.report)
             else:
                 self.conf.log.info('No file to download')
+                return
 
-            t.close()
+            self.conf.log.info('File chosen to download stat = %s' % sftp.stat(remote_abspath))
+            self.conf.log.info('Downloading file %s to %s' % (remote_abspath, local_path))
+            self.downloader.download(sftp, remote_abspath, local_path)
+            self.conf.log.info('File %s downloaded - Local size = %d' % (remote_abspath, os.path.getsize(local_path)))
 
         except paramiko.SSHException as e:
             msg = '%s: ssh error: %s' % (self.context, e)
             self.conf.log.error(msg)
             raise GetException(msg)
         except socket.error as e:
-            msg = '%s: socket error: %s' % (self.context, e[1])
+            msg = '%s: socket error: %s' % (self.context, e)
             self.conf.log.error(msg)
             raise GetException(msg)
         except IOError as e:
             msg = '%s: IOError: %s' % (self.context, e)
             self.conf.log.error(msg)
             raise GetException(msg)
+        except DownloadException as e:
+            msg = str(e)
+            self.conf.log.error(msg)
+            raise GetException(msg)
+        finally:
+            if t is not None:
+                t.close()
 
 
 class MultipleCommandsSshGetter(SshSonusGetter):
+    # The list of expanded commands is shared by all the instances
+    supports_instance_channels = False
+
     def __init__(self, conf, host, report):
         SshSonusGetter.__init__(self, conf, host, report)
         self.commands_and_levels = [(self.commands_and_regexps[0][0], 0)]
+        self.known_commands = set([self.commands_and_regexps[0][0]])
         self.current_level = -1
 
+        # Number of channels executing the command tree, see CommandTreeExpander
+        self.expansion_channels = int(self._setting('expansion_channels', 1))
+
+        # Incremental mode: the outputs of the last level (show) commands are
+        # stored and only the new objects and a rotating sample are shown again
+        self.incremental_state = None
+        if self._flag('incremental', False):
+            state_dir = getattr(self.conf, 'incremental_state_dir', self.conf.tmp_dir)
+            self.incremental_state = IncrementalState(
+                os.path.join(state_dir, '%s_%s.state.json' % (self.host.name, self.report.name)),
+                self._setting('incremental_sample', 0.1)
+            )
+
+    def get(self):
+        SshSonusGetter.get(self)
+        if self.incremental_state is not None:
+            state = self.incremental_state
+            self.conf.log.info(
+                '%s: incremental: %d new, %d shown again (%d changed), %d from cache, %d removed' % (
+                    self.context, state.stats['new'], state.stats['reshown'], state.stats['changed'],
+                    state.stats['cached'], state.removed()
+                )
+            )
+            state.save()
+
+    def _state_key(self, command):
+        return IncrementalState.key(self.current_instance, command)
+
+    def _cached_output(self, cmd):
+        if self.incremental_state is None:
+            return None
+        return self.incremental_state.cached_output(self._state_key(cmd))
+
+    def _exec_commands_do(self, sink):
+        if self.expansion_channels <= 1 or self.leased:
+            return SshSonusGetter._exec_commands_do(self, sink)
+
+        try:
+            return CommandTreeExpander(self, self.expansion_channels).run(sink)
+        except EOFError:
+            self.conf.log.critical('%s: transport protocol connection closed unexpectedly' % self.context)
+            raise GetException()
+        except Exception as e:
+            self.conf.log.critical('%s: error in getting command output: %s' % (self.context, str(e)))
+            self._close_transport()
+            raise GetException()
+
     def get_commands(self):
         self.conf.log.info('!!!!!!!!!!!!!!!!!!STARTING GET_COMMANDS........')
         for command, level in self.commands_and_levels:
@@ -484,12 +830,18 @@ class MultipleCommandsSshGetter(SshSonusGetter):
         self.conf.log.info('************************* STARTING got_command_output*********************************')
         commandlenght = len(self.commands_and_regexps)
         self.conf.log.info('commandlenght is %d' % commandlenght)
+        if self.incremental_state is not None and self.current_level == commandlenght-1:
+            self.incremental_state.record(self._state_key(cmd), output)
         if 0 <= self.current_level < commandlenght-1:
             matches = list(re.finditer(self.commands_and_regexps[self.current_level][1], output, re.MULTILINE | re.DOTALL))
             self.conf.log.info('commandlenght is %d' % commandlenght)
             #  self.conf.log.info('matches is [s%]' % matches)
             for match in matches:
                 new_command = self.commands_and_regexps[self.current_level+1][0] % match.groupdict()
+                if new_command in self.known_commands:
+                    self.conf.log.debug('skipping duplicate command %s' % new_command)
+                    continue
+                self.known_commands.add(new_command)
                 self.conf.log.info('new_command is %s' % new_command)
                 self.commands_and_levels.append((new_command, self.current_level+1))
 
@@ -562,6 +914,11 @@ class Arguments:
         self.p.add_option('-c', '--config', action='store',  help='config file for the script', type='string', dest='conf_file')
         self.p.add_option('-o', '--host',   action='append', help='host from which to extract the reports, option can be repeated for multiple hosts. If not specified: all hosts for the specified report(s).', type='string', default=[])
         self.p.add_option('-r', '--report', action='append', help='reports to extract from the host(s), can be repeated. If not specified, extracts all reports in the active_reports config file variable.', type='string', default=[])
+        self.p.add_option('-w', '--workers', action='store', help='number of getters running in parallel (default: 1, one host after the other)', type='int', default=1)
+        self.p.add_option('--host-workers', action='store', help='maximum number of getters running in parallel on the same host (default: 1)', type='int', default=1)
+        self.p.add_option('--connect-delay', action='store', help='seconds to wait between two connections to the same host (default: 5)', type='float', default=5)
+        self.p.add_option('--serve-broker', action='store_true', help='run the session broker on the session_broker socket of the config file instead of getting reports', dest='serve_broker', default=False)
+        self.p.add_option('--broker-stats', action='store_true', help='print the statistics of the session broker running on the session_broker socket of the config file', dest='broker_stats', default=False)
 
     def get_arguments(self):
         (self.opt, self.args) = self.p.parse_args()
@@ -580,12 +937,83 @@ def cleanup():
     SshGetter.clear_pool()
 
 
+class BrokerLogin:
+    """
+    Opens the sessions held by the SessionBroker, using the login code of the
+    getter configured for the requested report.
+    """
+
+    def __init__(self, conf):
+        self.conf = conf
+
+    def _getter(self, request):
+        for report in self.conf.iter_reports([request['report']]):
+            for host in report.iter_hosts([request['host']]):
+                getter = new(report.getter, self.conf, host, report)
+                getter.broker_socket = None
+                return getter
+
+        raise GetException('no host %s for report %s' % (request['host'], request['report']))
+
+    def resolve(self, request):
+        """
+        Returns the session key, the prompt and the login function of the
+        request, with one getter.
+        """
+        getter = self._getter(request)
+
+        def login():
+            getter._open_transport()
+            getter._authenticate()
+            return getter.tn, getter.chan
+
+        key = '%s:%s/%s' % (getter.host.ip, getter.host.port, type(getter)._authenticate.__qualname__)
+        return key, getter.prompt, login
+
+
+def serve_broker(conf):
+    broker = SessionBroker(
+        conf.log,
+        conf.session_broker,
+        BrokerLogin(conf),
+        idle_timeout=float(getattr(conf, 'broker_idle_timeout', 600)),
+        health_interval=float(getattr(conf, 'broker_health_interval', 60)),
+        drain_timeout=float(getattr(conf, 'broker_drain_timeout', 10))
+    )
+    broker.serve_forever()
+
+
+def make_get_task(conf, host, report, label, parallel):
+    """
+    Returns the function the CollectionEngine runs for a (report, host) pair.
+    When getters run in parallel each one logs through its own TaskConfig.
+    """
+    def get():
+        task_conf = TaskConfig(conf, label) if parallel else conf
+        getter = new(report.getter, task_conf, host, report)
+        getter.get()
+
+    return get
+
+
 def main():
     args = Arguments()
     args.get_arguments()
 
     conf = Config(args.conf_file, 'getter')
 
+    if args.serve_broker:
+        conf.makePid(label='broker')
+        try:
+            serve_broker(conf)
+        finally:
+            conf.delPid()
+        return
+
+    if args.broker_stats:
+        print(json.dumps(get_broker_stats(conf.session_broker), indent=2, sort_keys=True))
+        return
+
     # If only one report specified, create pid file specific to this report
     # so other instances of the same script are allowed to run in parallel
     # for other reports.
@@ -596,24 +1024,22 @@ def main():
 
     conf.log.info('Get report starting')
 
+    engine = CollectionEngine(
+        conf.log,
+        max_workers=args.workers,
+        max_workers_per_host=args.host_workers,
+        connect_delay=args.connect_delay,
+        recoverable=(GetException,),
+        devmode=conf.devmode
+    )
+
     try:
         for report in conf.iter_reports(args.report):
             for host in report.iter_hosts(args.host):
+                label = '%s/%s' % (host.name, report.name)
+                engine.add((host.ip, host.port), label, make_get_task(conf, host, report, label, args.workers > 1))
 
-                try:
-                    getter = new(report.getter, conf, host, report)
-                    conf.log.info("Waiting before creating new connection...")
-                    time.sleep(5)
-                    getter.get()
-
-                except GetException as e:
-                    if conf.devmode:
-                        raise e
-                    else:
-                        conf.log.exception('GetException! Logging and continuing!')
-                except Exception as e:
-                    conf.log.exception('Getter exception that is not GetException! Exiting!')
-                    raise e
+        engine.run()
 
     finally:
         conf.delPid()
@@ -0,0 +1,107 @@
+#!/bin/env python
+"""
+State store of the incremental PSX collection.
+
+The outputs of the show commands of the previous run are kept in a JSON file
+per host and report. A run only executes the show commands of the new ids and
+of a rotating sample of the known ones, the other outputs are taken from the
+store, so the raw file is still complete.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+
+def fingerprint(output):
+    return hashlib.md5(output.encode('utf-8')).hexdigest()
+
+
+class IncrementalState:
+    """
+    * path: JSON file of the store
+    * sample: fraction of the known objects shown again at every run. The
+      sample rotates over the sorted objects, so every object is refreshed at
+      least every 1 / sample runs.
+    """
+
+    version = 1
+
+    def __init__(self, path, sample=0.1):
+        self.path = path
+        self.sample = min(max(float(sample), 0.0), 1.0)
+        self.lock = threading.Lock()
+
+        self.objects = {}
+        self.offset = 0
+        if os.path.exists(path):
+            with open(path) as fd:
+                state = json.load(fd)
+            if state.get('version') == self.version:
+                self.objects = state['objects']
+                self.offset = state['offset']
+
+        keys = sorted(self.objects)
+        count = int(round(len(keys) * self.sample)) if keys else 0
+        if keys and self.sample > 0:
+            count = max(count, 1)
+        self.offset = self.offset % len(keys) if keys else 0
+        self.resample = set((keys + keys)[self.offset:self.offset + count])
+        self.next_offset = self.offset + count
+
+        self.current = {}
+        self.stats = {'new': 0, 'reshown': 0, 'changed': 0, 'cached': 0}
+
+    @staticmethod
+    def key(instance, command):
+        return '%s:%s' % (instance, command)
+
+    def cached_output(self, key):
+        """
+        Returns the stored output of key, None if the command has to be executed.
+        """
+        with self.lock:
+            cached = self.objects.get(key)
+            if cached is None or key in self.resample:
+                return None
+            self.current[key] = cached
+            self.stats['cached'] += 1
+            return cached['output']
+
+    def record(self, key, output):
+        """
+        Stores the output of an executed command.
+        """
+        new = {'fingerprint': fingerprint(output), 'output': output}
+        with self.lock:
+            previous = self.objects.get(key)
+            if previous is None:
+                self.stats['new'] += 1
+            else:
+                self.stats['reshown'] += 1
+                if previous['fingerprint'] != new['fingerprint']:
+                    self.stats['changed'] += 1
+            self.current[key] = new
+
+    def removed(self):
+        return len(set(self.objects) - set(self.current))
+
+    def save(self):
+        """
+        Replaces the store with the objects seen in this run. The file is
+        written next to the store and renamed, so a failed run never leaves
+        a truncated store behind.
+        """
+        with self.lock:
+            state = {'version': self.version, 'offset': self.next_offset, 'objects': self.current}
+            directory = os.path.dirname(self.path) or '.'
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.state-')
+            try:
+                with os.fdopen(fd, 'w') as tmp:
+                    json.dump(state, tmp)
+                os.replace(tmp_path, self.path)
+            except Exception:
+                os.unlink(tmp_path)
+                raise
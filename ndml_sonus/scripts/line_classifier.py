@@ -0,0 +1,57 @@
+#!/bin/env python
+"""
+Dispatch stage of the line parsers (NodeAndResultParser and subclasses)
+"""
+
+import re
+
+
+class LineClassifier:
+    """
+    Tells what a line of a report is with a single strip() and upper() of the
+    line, in the order the line parsers check it:
+
+    * RECORD: the record separator matches
+    * IGNORE: blank line, % line or line containing one of the commands
+    * NODE / RESULT: the node / result separator matches
+    * OTHER: anything else, left to the field separators
+
+    The commands are searched with one alternation of the upper case
+    commands. The separators are run with try_separate, so the fields of the
+    separator that matched are returned with the kind instead of being
+    separated again by the caller.
+    """
+
+    RECORD, IGNORE, NODE, RESULT, OTHER = range(5)
+
+    def __init__(self, commands, node_separator, result_separator, record_separator=None):
+        commands = sorted(set(command.strip().upper() for command in commands), key=len, reverse=True)
+        self.command_regex = re.compile('|'.join(re.escape(command) for command in commands)) if commands else None
+        self.node_fields = node_separator.try_separate
+        self.result_fields = result_separator.try_separate
+        self.record_fields = record_separator.try_separate if record_separator is not None else None
+
+    def classify(self, line):
+        """
+        Returns (kind, fields), fields being None for IGNORE and OTHER.
+        """
+        if self.record_fields is not None:
+            fields = self.record_fields(line)
+            if fields is not None:
+                return self.RECORD, fields
+
+        stripped = line.strip()
+        if not stripped or stripped == '%' or (
+            self.command_regex is not None and self.command_regex.search(stripped.upper()) is not None
+        ):
+            return self.IGNORE, None
+
+        fields = self.node_fields(line)
+        if fields is not None:
+            return self.NODE, fields
+
+        fields = self.result_fields(line)
+        if fields is not None:
+            return self.RESULT, fields
+
+        return self.OTHER, None
@@ -0,0 +1,207 @@
+#!/bin/env python
+import re
+
+# Most report regexes start with a fixed text, like 'E1 Profile:' or
+# '--- LINK SET ---', maybe after some whitespace. finditer tries the regex at
+# every offset of the command output, the prefilter jumps between the
+# occurrences of that text with find and only tries the regex where a match
+# can start: at the occurrence or in the whitespace right before it.
+
+
+# Escapes of a regex that are a single character
+ESCAPED_CHARACTERS = {'n': '\n', 't': '\t', 'r': '\r', 'f': '\f', 'v': '\v'}
+
+SPECIAL_CHARACTERS = '.^$*+?{}[]()|\\'
+
+ASCII_WHITESPACE = ' \t\n\r\f\v'
+
+
+def has_top_level_alternation(pattern):
+    depth = 0
+    in_class = False
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == '\\':
+            i += 1
+        elif in_class:
+            if c == ']':
+                in_class = False
+        elif c == '[':
+            in_class = True
+            # a ] right after [ or [^ is a character of the class
+            if pattern[i + 1:i + 2] == '^':
+                i += 1
+            if pattern[i + 1:i + 2] == ']':
+                i += 1
+        elif c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+        elif c == '|' and depth == 0:
+            return True
+        i += 1
+    return False
+
+
+def literal_anchor(pattern, is_space=str.isspace):
+    """
+    Returns (leading, literal) of a pattern made of some whitespace (leading,
+    the list of its atoms) followed by a literal that does not start with
+    whitespace, None if the pattern does not start like that.
+    The atoms are whitespace characters and \\s, maybe repeated.
+    """
+    if has_top_level_alternation(pattern):
+        return None
+
+    leading = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('\\s', i):
+            atom, i = '\\s', i + 2
+        elif pattern[i] == '\\' and ESCAPED_CHARACTERS.get(pattern[i + 1:i + 2]) is not None:
+            atom, i = ESCAPED_CHARACTERS[pattern[i + 1]], i + 2
+        elif pattern.startswith('\\ ', i):
+            atom, i = ' ', i + 2
+        elif is_space(pattern[i]):
+            atom, i = pattern[i], i + 1
+        else:
+            break
+        if pattern[i:i + 1] in ('*', '+', '?'):
+            atom += pattern[i]
+            i += 1
+            if pattern[i:i + 1] in ('?', '+'):
+                atom += pattern[i]
+                i += 1
+        elif pattern[i:i + 1] == '{':
+            return None
+        leading.append(atom)
+
+    literal = []
+    while i < len(pattern):
+        c = pattern[i]
+        if c == '\\':
+            escaped = pattern[i + 1:i + 2]
+            if escaped in ESCAPED_CHARACTERS:
+                c = ESCAPED_CHARACTERS[escaped]
+            elif escaped and not escaped.isalnum():
+                c = escaped
+            else:
+                break
+            i += 2
+        elif c in SPECIAL_CHARACTERS:
+            break
+        else:
+            i += 1
+        literal.append(c)
+    if pattern[i:i + 1] and pattern[i] in '*+?{' and literal:
+        # the last character is repeated
+        literal.pop()
+
+    if not literal:
+        return None
+    return leading, ''.join(literal)
+
+
+class LiteralPrefilter:
+    """
+    The compiled regex with finditer, search and match first looking for its
+    literal with find. Gives the same match objects as the regex.
+
+    A match of a regex made of the leading whitespace and the literal can
+    only start at an occurrence of the literal, or in the run of whitespace
+    before it when there is leading whitespace: the occurrences are found
+    with find and the regex is only tried at these starts. When the leading
+    whitespace is a single \\s* or \\s+ it does not matter where the match
+    starts in the run, it is tried once at the beginning of the run.
+    """
+
+    def __init__(self, regex, leading, literal):
+        self.regex = regex
+        self.literal = literal
+        self.leading = leading
+        self.single_start = not leading or leading in (['\\s*'], ['\\s+'])
+
+    def __getattr__(self, name):
+        return getattr(self.regex, name)
+
+    def run_start(self, text, pos, end):
+        """
+        Start of the run of whitespace ending at end, not before pos.
+        """
+        while end > pos:
+            start = max(pos, end - 64)
+            stripped = len(text[start:end].rstrip())
+            if stripped:
+                return start + stripped
+            end = start
+        return end
+
+    def finditer(self, text, pos=0, endpos=None):
+        if endpos is None:
+            endpos = len(text)
+        find = text.find
+        match = self.regex.match
+        literal = self.literal
+        while True:
+            index = find(literal, pos, endpos)
+            if index < 0:
+                return
+            first_start = self.run_start(text, pos, index) if self.leading else index
+            starts = (first_start,) if self.single_start else range(first_start, index + 1)
+            for start in starts:
+                found = match(text, start, endpos)
+                if found is not None:
+                    break
+            if found is None:
+                pos = index + 1
+                continue
+            yield found
+            pos = found.end()
+
+    def search(self, text, pos=0, endpos=None):
+        for found in self.finditer(text, pos, endpos):
+            return found
+        return None
+
+    def match(self, text, pos=0, endpos=None):
+        if endpos is None:
+            endpos = len(text)
+        if text.find(self.literal, pos, endpos) < 0:
+            return None
+        return self.regex.match(text, pos, endpos)
+
+
+def prefiltered(regex):
+    """
+    LiteralPrefilter of the compiled regex, the regex itself when it does not
+    start with a literal or has flags changing what the literal matches.
+    """
+    if regex.flags & (re.IGNORECASE | re.VERBOSE | re.LOCALE):
+        return regex
+    is_bytes = isinstance(regex.pattern, bytes)
+    if is_bytes:
+        anchor = literal_anchor(regex.pattern.decode('latin-1'), ASCII_WHITESPACE.__contains__)
+    elif regex.flags & re.ASCII:
+        return regex
+    else:
+        anchor = literal_anchor(regex.pattern)
+    if anchor is None:
+        return regex
+
+    leading, literal = anchor
+    if all(len(atom) == 1 for atom in leading):
+        # whitespace characters, part of the literal
+        literal = ''.join(leading) + literal
+        leading = []
+    if is_bytes:
+        literal = literal.encode('latin-1')
+    return LiteralPrefilter(regex, leading, literal)
+
+
+def required_literal(regex):
+    """
+    Text in every match of the compiled regex, '' if it is not known.
+    """
+    prefilter = prefiltered(regex)
+    return prefilter.literal if prefilter is not regex else type(regex.pattern)()
@@ -4,11 +4,13 @@ Module to parse different reports from Sonus
 """
 import os
 import sys
+import time
 import traceback
 
 from optparse import OptionParser
 
 from ndml_sonus.scripts import sonus_logging
+from ndml_sonus.scripts.report_pool import run_parallel, run_serial
 
 # Imports needed for the dynamic instantiation done by new function
 from ndml_sonus.scripts.second_step import *
@@ -55,6 +57,7 @@ class Arguments:
         self.p.add_option('-c', '--config', action='store',  help='config file for the script', type='string', dest='conf_file')
         self.p.add_option('-o', '--host',   action='append', help='host from which to extract the reports, option can be repeated for multiple hosts. If not specified: all hosts for the specified report(s).', type='string', default=[])
         self.p.add_option('-r', '--report', action='append', help='reports to extract from the host(s), can be repeated. If not specified, extracts all reports in the active_reports config file variable.', type='string', default=[])
+        self.p.add_option('-j', '--jobs', action='store', help='number of parser processes (default: 1, one report after the other)', type='int', default=1)
 
     def get_arguments(self):
         (self.opt, self.args) = self.p.parse_args()
@@ -94,6 +97,22 @@ def process_report(report, host, conf):
         conf.log.critical(traceback.format_exception(*sys.exc_info()))
 
 
+def _raw_size(conf, report, host):
+    try:
+        return os.path.getsize(conf.raw_file_name(host, report))
+    except OSError:
+        return 0
+
+
+def log_timings(conf, tasks, timings, wall_time):
+    conf.log.info('Parsed %d reports in %.1fs wall time, %.1fs of parsing' % (
+        len(timings), wall_time, sum(elapsed for _, elapsed in timings)
+    ))
+    for index, elapsed in sorted(timings, key=lambda timing: timing[1], reverse=True):
+        report, host = tasks[index]
+        conf.log.info('  %-40s %8.1fs' % ('%s/%s' % (host.name, report.name), elapsed))
+
+
 def main():
     args = Arguments()
     args.get_arguments()
@@ -113,9 +132,16 @@ def main():
     sonus_logging.log = conf.log
 
     try:
-        for report in conf.iter_reports(args.report):
-            for host in report.iter_hosts(args.host):
-                process_report(report, host, conf)
+        tasks = [(report, host) for report in conf.iter_reports(args.report) for host in report.iter_hosts(args.host)]
+
+        started = time.time()
+        if args.jobs > 1 and len(tasks) > 1:
+            # Largest raw files first, so the run does not end on a long straggler
+            tasks.sort(key=lambda task: _raw_size(conf, *task), reverse=True)
+            timings = run_parallel(process_report, conf, tasks, min(args.jobs, len(tasks)))
+        else:
+            timings = run_serial(process_report, conf, tasks)
+        log_timings(conf, tasks, timings, time.time() - started)
     finally:
         conf.delPid()
         conf.log.info('All done')
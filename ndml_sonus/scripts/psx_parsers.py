@@ -16,7 +16,7 @@ class PsxListallCommandFullTextParser(CommandFullTextParser):
 (?P<CommandOutput>.*?)
 
 Result:\s*(?P<Result>\S+)
-PSX:\S+?:(?P<Node>\S+?)>'''[1:])
+PSX:\S+?:(?P<Node>\S+?)>'''[1:], block_terminator=r'\n\nResult:\s*\S+\nPSX:\S+?:\S+?>')
 
 
 class PsxCsvParser(PsxListallCommandFullTextParser):
@@ -33,7 +33,7 @@ PSX:\S+?:(?P<Node>\S+?)> .*?
 
 (?P<CommandOutput>.*?)
 
-Result:\s*(?P<Result>\S+)'''[1:])
+Result:\s*(?P<Result>\S+)'''[1:], block_terminator=r'\n\nResult:\s*\S+\n')
 
 
 class PsxFindCommandSeparatorParser(PsxFindCommandFullTextParser):
@@ -50,8 +50,9 @@ class PsxFindCommandSingleColumnSeparatorParser(PsxFindCommandSeparatorParser):
     def parse_command_output(self, text):
         result = {}
         for line in text.splitlines():
-            if self.command_output_separator.matches(line):
-                result.update(self.command_output_separator.separate(line))
+            fields = self.command_output_separator.try_separate(line)
+            if fields is not None:
+                result.update(fields)
         return [result]
 
 
@@ -63,6 +64,9 @@ class PsxRegexFullTextParser(PsxFindCommandSeparatorParser):
         PsxFindCommandFullTextParser.__init__(self, *args, **kwargs)
         self.command_output_separator = FullTextRegexSeparator(self.regex, self.regex_mode)
 
+    def parse_command_output_mapped(self, buf, start, end):
+        return self.command_output_separator.separate_buffer(buf, start, end)
+
 
 class PsxIpSignalingPeerGroupDataParser(PsxRegexFullTextParser):
     regex = r'''
@@ -0,0 +1,133 @@
+#!/bin/env python
+"""
+Schema-bound records of the parse pipeline.
+
+A RecordSchema is built once per report from its fields list. A Record keeps
+the values of the schema fields in a list indexed by field position, which is
+the csv line once the record is complete, and the other fields (not emitted
+by the report) in a small dict.
+
+The rows of a block are created from the record of the node fields: the list
+of a row is built in one pass over the schema, taking the values of the row
+and, for the other fields, the values of the node record, so the node fields
+are shared by the rows instead of being copied into a dict for every row.
+
+Records support the part of the dict API used by the pipeline stages
+(FieldMerger, AutoFieldsAdder, SecondStepParser and CsvLineEmitter).
+"""
+
+# Value of a schema field not set in the record
+MISSING = object()
+
+
+class RecordSchema:
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self.fields_set = frozenset(self.fields)
+        self.index = {field: position for position, field in enumerate(self.fields)}
+        self.empty = [MISSING] * len(self.fields)
+
+    def record(self, fields=None, parent=None):
+        """
+        A record with the given fields (a dict or a Record) over the ones of parent.
+        """
+        values = parent.values if parent is not None else self.empty
+        extras = dict(parent.extras) if parent is not None and parent.extras else {}
+        if fields:
+            # One C level pass over the schema, the fields not given keep the parent value
+            values = list(map(fields.get, self.fields, values))
+            if not self.fields_set.issuperset(fields):
+                # keys() of a Record is a list
+                for key in fields.keys():
+                    if key not in self.fields_set:
+                        extras[key] = fields[key]
+        else:
+            values = values[:]
+        return Record(self, values, extras)
+
+
+class Record:
+    __slots__ = ('schema', 'values', 'extras')
+
+    def __init__(self, schema, values, extras):
+        self.schema = schema
+        self.values = values
+        self.extras = extras
+
+    def __getitem__(self, key):
+        position = self.schema.index.get(key)
+        if position is None:
+            return self.extras[key]
+        value = self.values[position]
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        position = self.schema.index.get(key)
+        if position is None:
+            self.extras[key] = value
+        else:
+            self.values[position] = value
+
+    def __contains__(self, key):
+        position = self.schema.index.get(key)
+        if position is None:
+            return key in self.extras
+        return self.values[position] is not MISSING
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def pop(self, key, *default):
+        position = self.schema.index.get(key)
+        if position is None:
+            return self.extras.pop(key, *default)
+
+        value = self.values[position]
+        if value is MISSING:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        self.values[position] = MISSING
+        return value
+
+    def update(self, fields):
+        if len(fields) * 4 < len(self.values):
+            for key, value in fields.items():
+                self[key] = value
+            return
+
+        schema = self.schema
+        self.values = list(map(fields.get, schema.fields, self.values))
+        if not schema.fields_set.issuperset(fields):
+            for key in fields.keys():
+                if key not in schema.fields_set:
+                    self.extras[key] = fields[key]
+
+    def clear(self):
+        self.values = self.schema.empty[:]
+        self.extras = {}
+
+    def keys(self):
+        keys = [field for field, value in zip(self.schema.fields, self.values) if value is not MISSING]
+        keys.extend(self.extras)
+        return keys
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __repr__(self):
+        return repr(self.to_dict())
@@ -0,0 +1,594 @@
+#!/bin/env python
+"""
+Guards against the backtracking of the report regexes.
+
+Two repeats that can match the same characters, with nothing between them
+that must match (an optional group, or a \\n matched by both of them), like
+\\s*(?P<NIF_Group>\\S*)\\s*(?P<Traceroute>\\S*)\\s*\\n, give several ways to
+split the same text. On a well formed output the first split matches, on a
+truncated one every split of every such pair is tried before the regex
+gives up, and one report can stall a whole parse run.
+
+* analyze lists these ambiguous repeats in the regexes of the parser classes
+* fuzz times the regexes on mutated report text and prints the worst cases
+* BlockTimeGuard caps the time of a block at parse time (regex_time_limit)
+
+    $ regex_guard.py analyze
+    $ regex_guard.py analyze --modules gsx_parsers --all
+    $ regex_guard.py fuzz --mutations 200 --copies 20 --limit 1
+"""
+
+import argparse
+import ast
+import importlib
+import inspect
+import os
+import random
+import re
+import signal
+import threading
+import time
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    # Python before 3.11
+    import sre_parse
+
+from ndml_sonus.scripts.common_exceptions import ParseException
+
+PARSER_MODULES = ['gsx_parsers', 'sgx_parsers', 'psx_parsers']
+
+ASCII = frozenset(chr(code) for code in range(128))
+
+CATEGORY_TEXTS = {
+    sre_parse.CATEGORY_SPACE: r'\s',
+    sre_parse.CATEGORY_NOT_SPACE: r'\S',
+    sre_parse.CATEGORY_DIGIT: r'\d',
+    sre_parse.CATEGORY_NOT_DIGIT: r'\D',
+    sre_parse.CATEGORY_WORD: r'\w',
+    sre_parse.CATEGORY_NOT_WORD: r'\W',
+}
+
+CATEGORY_CHARACTERS = {
+    category: frozenset(c for c in ASCII if re.match(text, c)) for category, text in CATEGORY_TEXTS.items()
+}
+
+AT_TEXTS = {
+    sre_parse.AT_BEGINNING: '^',
+    sre_parse.AT_BEGINNING_STRING: r'\A',
+    sre_parse.AT_END: '$',
+    sre_parse.AT_END_STRING: r'\Z',
+    sre_parse.AT_BOUNDARY: r'\b',
+    sre_parse.AT_NON_BOUNDARY: r'\B',
+}
+
+CHARACTER_TEXTS = {'\n': r'\n', '\t': r'\t', '\r': r'\r', '\f': r'\f', '\v': r'\v'}
+
+# Characters of the sample texts, in order of preference
+SAMPLE_CHARACTERS = 'x1 aA_-.:/\n\t' + ''.join(sorted(ASCII))
+
+
+class RegexTimeLimitExceeded(ParseException):
+    pass
+
+
+class BlockTimeGuard:
+    """
+    Runs a function with a time limit in seconds, 0 for no limit.
+    The limit is a SIGALRM timer: sre checks for signals while it matches,
+    so the handler interrupts a match in progress by raising
+    RegexTimeLimitExceeded. Signals are only handled by the main thread,
+    elsewhere (and where there is no setitimer) the guard is disabled.
+    """
+
+    def __init__(self, time_limit):
+        self.time_limit = time_limit
+        self.enabled = (
+            time_limit > 0 and hasattr(signal, 'setitimer')
+            and threading.current_thread() is threading.main_thread()
+        )
+
+    def run(self, function, *args):
+        if not self.enabled:
+            return function(*args)
+        previous = signal.signal(signal.SIGALRM, self.expired)
+        result = pending = object()
+        try:
+            signal.setitimer(signal.ITIMER_REAL, self.time_limit)
+            try:
+                result = function(*args)
+            finally:
+                # An alarm going off after function returned, before the
+                # timer is disarmed, does not discard the result
+                while True:
+                    try:
+                        signal.setitimer(signal.ITIMER_REAL, 0)
+                        break
+                    except RegexTimeLimitExceeded:
+                        if result is pending:
+                            raise
+        finally:
+            signal.signal(signal.SIGALRM, previous if previous is not None else signal.SIG_DFL)
+        return result
+
+    def expired(self, signum, frame):
+        raise RegexTimeLimitExceeded('more than %gs' % self.time_limit)
+
+
+def character_set(op, av, flags=0):
+    """
+    ASCII characters matched by a one character item of a parsed regex,
+    None for the other items.
+    """
+    if op == sre_parse.LITERAL:
+        characters = {chr(av)} & ASCII
+    elif op == sre_parse.NOT_LITERAL:
+        characters = ASCII - {chr(av)}
+    elif op == sre_parse.ANY:
+        characters = ASCII if flags & re.DOTALL else ASCII - {'\n'}
+    elif op == sre_parse.IN:
+        characters = set()
+        negate = False
+        for item_op, item_av in av:
+            if item_op == sre_parse.NEGATE:
+                negate = True
+            elif item_op == sre_parse.LITERAL:
+                characters |= {chr(item_av)} & ASCII
+            elif item_op == sre_parse.RANGE:
+                characters |= {chr(code) for code in range(item_av[0], min(item_av[1], 127) + 1)}
+            elif item_op == sre_parse.CATEGORY:
+                characters |= CATEGORY_CHARACTERS.get(item_av, ASCII)
+        if negate:
+            characters = ASCII - characters
+    else:
+        return None
+    if flags & re.IGNORECASE:
+        characters = set(characters) | {c.swapcase() for c in characters}
+    return frozenset(characters)
+
+
+def character_text(code):
+    return CHARACTER_TEXTS.get(chr(code), re.escape(chr(code)))
+
+
+def item_text(op, av):
+    if op == sre_parse.LITERAL:
+        return character_text(av)
+    if op == sre_parse.NOT_LITERAL:
+        return '[^%s]' % character_text(av)
+    if op == sre_parse.ANY:
+        return '.'
+    if op == sre_parse.IN:
+        if len(av) == 1 and av[0][0] == sre_parse.CATEGORY:
+            return CATEGORY_TEXTS.get(av[0][1], '[...]')
+        parts = []
+        for item_op, item_av in av:
+            if item_op == sre_parse.NEGATE:
+                parts.append('^')
+            elif item_op == sre_parse.LITERAL:
+                parts.append(character_text(item_av))
+            elif item_op == sre_parse.RANGE:
+                parts.append('%s-%s' % (character_text(item_av[0]), character_text(item_av[1])))
+            elif item_op == sre_parse.CATEGORY:
+                parts.append(CATEGORY_TEXTS.get(item_av, ''))
+        return '[%s]' % ''.join(parts)
+    if op == sre_parse.AT:
+        return AT_TEXTS.get(av, '')
+    return '(...)'
+
+
+def quantifier_text(low, high, lazy=False):
+    if (low, high) == (0, sre_parse.MAXREPEAT):
+        text = '*'
+    elif (low, high) == (1, sre_parse.MAXREPEAT):
+        text = '+'
+    elif (low, high) == (0, 1):
+        text = '?'
+    elif low == high:
+        text = '{%d}' % low
+    elif high == sre_parse.MAXREPEAT:
+        text = '{%d,}' % low
+    else:
+        text = '{%d,%d}' % (low, high)
+    return text + '?' if lazy else text
+
+
+class Atom:
+    """
+    Item of a flattened regex: a character or a repeated character (with
+    its characters and the text of the character as base), or any other
+    item with its minimum and maximum width.
+    """
+
+    def __init__(self, text, characters=None, low=1, high=1, group=None, base=None):
+        self.text = text
+        self.base = base if base is not None else text
+        self.characters = characters
+        self.low = low
+        self.high = high
+        self.group = group
+
+    @property
+    def is_repeat(self):
+        return self.characters is not None and self.high > self.low
+
+    @property
+    def is_literal(self):
+        return self.group is None and self.characters is not None and len(self.characters) == 1 and self.high == 1
+
+    def __str__(self):
+        return self.text if self.group is None else '%s<%s>' % (self.text, self.group)
+
+
+def atoms_text(atoms):
+    """
+    Text of a sequence of atoms, with the runs of literal characters joined.
+    """
+    parts = []
+    for previous, atom in zip([None] + atoms, atoms):
+        if atom.is_literal and previous is not None and previous.is_literal:
+            parts[-1] += atom.text
+        else:
+            parts.append(str(atom))
+    return ' '.join(parts)
+
+
+def ambiguous_pairs(atoms):
+    """
+    Yields (i, j) for the repeats atoms[i] and atoms[j] matching a common
+    character where everything between them can be empty or only matches
+    characters of both. Only the first such j is given for an i.
+    """
+    for i, first in enumerate(atoms):
+        if not first.is_repeat:
+            continue
+        for j in range(i + 1, len(atoms)):
+            second = atoms[j]
+            if second.is_repeat:
+                common = first.characters & second.characters
+                if common and all(atom.low == 0 or atom.characters <= common for atom in atoms[i + 1:j]):
+                    yield i, j
+                    break
+                if second.low > 0:
+                    break
+            elif second.low > 0 and (second.characters is None or not second.characters <= first.characters):
+                break
+
+
+class RegexAnalyzer:
+    """
+    Flattens a parsed regex into sequences of atoms: the groups that are not
+    repeated are inlined, a group or a repeat around a single character is a
+    repeated character. The branches, lookarounds and repeated groups are
+    sequences of their own.
+    """
+
+    def __init__(self, pattern, flags=0):
+        self.parsed = sre_parse.parse(pattern, flags)
+        self.names = {gid: name for name, gid in self.parsed.state.groupdict.items()}
+        # (atoms, description of the sequence) and (atoms, repeated group text)
+        self.sequences = []
+        self.repeated = []
+        self.sequences.append(self.flatten(self.parsed, self.parsed.state.flags))
+
+    def width(self, op, av):
+        return sre_parse.SubPattern(self.parsed.state, [(op, av)]).getwidth()
+
+    def flatten(self, items, flags, group=None):
+        atoms = []
+        for op, av in items:
+            if op == sre_parse.SUBPATTERN:
+                gid, add_flags, del_flags, body = av
+                atoms.extend(self.flatten(body, (flags | add_flags) & ~del_flags, self.names.get(gid, group)))
+            elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+                atoms.append(self.repeat(op, av, flags, group))
+            elif op == sre_parse.BRANCH:
+                for branch in av[1]:
+                    self.sequences.append(self.flatten(branch, flags, group))
+                atoms.append(Atom('(...|...)', None, *self.width(op, av), group=group))
+            elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+                self.sequences.append(self.flatten(av[1], flags, group))
+                atoms.append(Atom('(?...)', None, 0, 0))
+            else:
+                characters = character_set(op, av, flags)
+                if characters is not None:
+                    atoms.append(Atom(item_text(op, av), characters, group=group))
+                else:
+                    atoms.append(Atom(item_text(op, av), None, *self.width(op, av), group=group))
+        return atoms
+
+    def repeat(self, op, av, flags, group):
+        low, high, body = av
+        lazy = op == sre_parse.MIN_REPEAT
+        atoms = self.flatten(body, flags, group)
+        if len(atoms) == 1 and atoms[0].characters is not None and not (atoms[0].is_repeat and high > 1):
+            atom = atoms[0]
+            if sre_parse.MAXREPEAT in (high, atom.high):
+                high = sre_parse.MAXREPEAT
+            else:
+                high *= atom.high
+            low *= atom.low
+            text = atom.base + quantifier_text(low, high, lazy)
+            return Atom(text, atom.characters, low, high, atom.group, atom.base)
+
+        self.sequences.append(atoms)
+        if high > 1:
+            self.repeated.append(atoms)
+        return Atom('(...)' + quantifier_text(low, high, lazy), None, *self.width(op, av), group=group)
+
+    def findings(self):
+        """
+        Descriptions of the ambiguous repeats of the regex.
+        """
+        for atoms in self.sequences:
+            for i, j in ambiguous_pairs(atoms):
+                yield 'ambiguous repeats %s' % atoms_text(atoms[i:j + 1])
+        for atoms in self.repeated:
+            # A repeat of the last iteration against one of the next iteration
+            for i, j in ambiguous_pairs(atoms + atoms):
+                if i < len(atoms) <= j:
+                    yield 'ambiguous repeats across the iterations of (%s)' % atoms_text(atoms)
+
+
+def regex_findings(pattern, flags=0):
+    try:
+        return list(RegexAnalyzer(pattern, flags).findings())
+    except re.error as e:
+        return ['does not compile: %s' % e]
+
+
+def string_value(node):
+    """
+    Value of a string constant, maybe sliced like r'''...'''[1:], None for
+    the other nodes.
+    """
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.Subscript) and isinstance(node.slice, ast.Slice):
+        value = string_value(node.value)
+        bounds = [node.slice.lower, node.slice.upper, node.slice.step]
+        if value is not None and all(bound is None or isinstance(bound, ast.Constant) for bound in bounds):
+            return value[slice(*[bound.value if bound is not None else None for bound in bounds])]
+    return None
+
+
+def flag_value(node):
+    """
+    Value of flags written like re.DOTALL | re.MULTILINE, 0 if unknown.
+    """
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == 're':
+        return int(getattr(re, node.attr, 0))
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitOr):
+        return flag_value(node.left) | flag_value(node.right)
+    if isinstance(node, ast.Constant) and isinstance(node.value, int):
+        return node.value
+    return 0
+
+
+def call_name(node):
+    if isinstance(node.func, ast.Attribute):
+        return node.func.attr
+    if isinstance(node.func, ast.Name):
+        return node.func.id
+    return ''
+
+
+def class_regexes(module):
+    """
+    Yields (line, class name, pattern, flags) for the regexes written in the
+    classes of the module: the regex class attributes (with the regex_mode
+    of the class) and the regexes given to re.compile and to the regex
+    separators, as a string or as a string variable of the class.
+    """
+    tree = ast.parse(inspect.getsource(module))
+    for class_node in tree.body:
+        if not isinstance(class_node, ast.ClassDef):
+            continue
+        klass = getattr(module, class_node.name, None)
+
+        strings = {}
+        for node in ast.walk(class_node):
+            if isinstance(node, ast.Assign) and string_value(node.value) is not None:
+                for target in node.targets:
+                    if isinstance(target, ast.Name):
+                        strings[target.id] = string_value(node.value)
+
+        for node in class_node.body:
+            if isinstance(node, ast.Assign) and [getattr(target, 'id', None) for target in node.targets] == ['regex']:
+                pattern = string_value(node.value)
+                if pattern:
+                    yield node.lineno, class_node.name, pattern, int(getattr(klass, 'regex_mode', 0))
+
+        for node in ast.walk(class_node):
+            if not isinstance(node, ast.Call) or not node.args:
+                continue
+            name = call_name(node)
+            if name != 'compile' and not name.endswith('RegexSeparator'):
+                continue
+            keywords = {keyword.arg: keyword.value for keyword in node.keywords}
+            pattern = string_value(node.args[0])
+            if pattern is None and isinstance(node.args[0], ast.Name):
+                pattern = strings.get(node.args[0].id)
+            if pattern:
+                mode = node.args[1] if len(node.args) > 1 else keywords.get('mode', keywords.get('flags'))
+                if mode is not None:
+                    flags = flag_value(mode)
+                else:
+                    flags = re.DOTALL if name == 'FullTextRegexSeparator' else 0
+                yield node.lineno, class_node.name, pattern, flags
+            terminator = string_value(keywords['block_terminator']) if 'block_terminator' in keywords else None
+            if terminator:
+                yield node.lineno, class_node.name, terminator, 0
+
+
+def parser_regexes(module_names):
+    """
+    Yields (label, pattern, flags) for the regexes of the parser modules.
+    """
+    for module_name in module_names:
+        module = importlib.import_module('ndml_sonus.scripts.%s' % module_name)
+        filename = os.path.basename(module.__file__)
+        for line, class_name, pattern, flags in class_regexes(module):
+            yield '%s:%d %s' % (filename, line, class_name), pattern, flags
+
+
+def analyze(args):
+    regexes = flagged = 0
+    for label, pattern, flags in parser_regexes(args.modules):
+        regexes += 1
+        findings = regex_findings(pattern, flags)
+        if findings:
+            flagged += 1
+        if findings or args.all:
+            print(label)
+            for finding in findings:
+                print('    %s' % finding)
+    print('%d regexes, %d with ambiguous repeats' % (regexes, flagged))
+
+
+def sample_text(pattern, flags=0):
+    """
+    A text matched by the regex, None if the synthesized text does not
+    match: every repeat is taken once or its minimum number of times, every
+    branch is its first alternative.
+    """
+    parsed = sre_parse.parse(pattern, flags)
+    groups = {}
+
+    def sample(items, flags):
+        parts = []
+        for op, av in items:
+            if op == sre_parse.SUBPATTERN:
+                gid, add_flags, del_flags, body = av
+                text = sample(body, (flags | add_flags) & ~del_flags)
+                if gid is not None:
+                    groups[gid] = text
+                parts.append(text)
+            elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+                low, high, body = av
+                parts.append(sample(body, flags) * max(low, min(high, 1)))
+            elif op == sre_parse.BRANCH:
+                parts.append(sample(av[1][0], flags))
+            elif op == sre_parse.GROUPREF:
+                parts.append(groups.get(av, ''))
+            else:
+                characters = character_set(op, av, flags)
+                if characters:
+                    parts.append(next(c for c in SAMPLE_CHARACTERS if c in characters))
+        return ''.join(parts)
+
+    text = sample(parsed, parsed.state.flags)
+    return text if re.search(pattern, text, flags) else None
+
+
+# Mutations of a report text, as a switch truncating or garbling an output
+MUTATIONS = ['truncate', 'drop-token', 'blank-lines', 'spaces', 'join-lines']
+
+TOKEN = re.compile(r'\S+')
+
+
+def mutated(text, rng, count):
+    """
+    The text with count random mutations, and their descriptions.
+    """
+    applied = []
+    for _ in range(count):
+        kind = rng.choice(MUTATIONS)
+        position = rng.randrange(len(text) + 1)
+        if kind == 'truncate':
+            text = text[:position]
+        elif kind == 'drop-token':
+            match = TOKEN.search(text, position)
+            if match is not None:
+                text = text[:match.start()] + text[match.end():]
+        elif kind == 'blank-lines':
+            text = text[:position] + '\n' * rng.randint(1, 50) + text[position:]
+        elif kind == 'spaces':
+            text = text[:position] + ' ' * rng.randint(1, 200) + text[position:]
+        elif kind == 'join-lines':
+            index = text.find('\n', position)
+            if index >= 0:
+                text = text[:index] + ' ' + text[index + 1:]
+        applied.append('%s@%d' % (kind, position))
+    return text, applied
+
+
+def consume(regex, text):
+    for _ in regex.finditer(text):
+        pass
+
+
+def match_time(guard, regex, text):
+    """
+    Seconds to run the regex over the text, None if it went over the limit.
+    """
+    started = time.perf_counter()
+    try:
+        guard.run(consume, regex, text)
+    except RegexTimeLimitExceeded:
+        return None
+    return time.perf_counter() - started
+
+
+def fuzz(args):
+    rng = random.Random(args.seed)
+    guard = BlockTimeGuard(args.limit)
+    results = []
+    skipped = 0
+    for label, pattern, flags in parser_regexes(args.modules):
+        sample = sample_text(pattern, flags)
+        if not sample:
+            skipped += 1
+            continue
+        regex = re.compile(pattern, flags)
+        text = '\n'.join([sample.strip('\n')] * args.copies) + '\n'
+        clean = match_time(guard, regex, text)
+
+        worst, worst_mutations = 0.0, []
+        for _ in range(args.mutations):
+            mutated_text, applied = mutated(text, rng, rng.randint(1, args.depth))
+            elapsed = match_time(guard, regex, mutated_text)
+            if elapsed is None or elapsed > worst:
+                worst, worst_mutations = elapsed, applied
+            if elapsed is None:
+                break
+        results.append((label, len(regex_findings(pattern, flags)), len(text), clean, worst, worst_mutations))
+
+    def milliseconds(elapsed):
+        return '>%.0f' % (args.limit * 1000) if elapsed is None else '%.3f' % (elapsed * 1000)
+
+    print('%-52s %8s %7s %10s %10s  %s' % ('regex', 'findings', 'chars', 'clean ms', 'worst ms', 'worst mutations'))
+    results.sort(key=lambda result: float('inf') if result[4] is None else result[4], reverse=True)
+    for label, findings, chars, clean, worst, worst_mutations in results[:args.top]:
+        print('%-52s %8d %7d %10s %10s  %s' % (
+            label, findings, chars, milliseconds(clean), milliseconds(worst), ' '.join(worst_mutations)
+        ))
+    print('%d regexes fuzzed, %d without a sample text' % (len(results), skipped))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    analyze_parser = subparsers.add_parser('analyze', help='ambiguous repeats of the regexes of the parser classes')
+    analyze_parser.add_argument('--modules', nargs='+', default=PARSER_MODULES, help='parser modules')
+    analyze_parser.add_argument('--all', action='store_true', help='also list the regexes without findings')
+    analyze_parser.set_defaults(func=analyze)
+
+    fuzz_parser = subparsers.add_parser('fuzz', help='worst time of the regexes on mutated report text')
+    fuzz_parser.add_argument('--modules', nargs='+', default=PARSER_MODULES, help='parser modules')
+    fuzz_parser.add_argument('--mutations', type=int, default=200, help='mutated texts per regex')
+    fuzz_parser.add_argument('--depth', type=int, default=3, help='maximum number of mutations of a text')
+    fuzz_parser.add_argument('--copies', type=int, default=20, help='matches of the regex in the clean text')
+    fuzz_parser.add_argument('--limit', type=float, default=1.0, help='seconds after which a match is stopped')
+    fuzz_parser.add_argument('--seed', type=int, default=0, help='seed of the mutations')
+    fuzz_parser.add_argument('--top', type=int, default=30, help='number of regexes listed, worst first')
+    fuzz_parser.set_defaults(func=fuzz)
+
+    options = parser.parse_args()
+    options.func(options)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/bin/env python
+"""
+Runs the parsing of the reports one after the other or in a pool of
+forked processes
+"""
+
+import logging
+import logging.handlers
+import multiprocessing
+import time
+
+
+# Set by the parent before the pool is created and inherited by the forked workers
+_process = None
+_conf = None
+_tasks = []
+
+
+def _effective_handlers(log):
+    """
+    Returns the handlers a record of log goes through, including the ones
+    of its parents.
+    """
+    handlers = []
+    while log is not None:
+        handlers.extend(log.handlers)
+        if not log.propagate:
+            break
+        log = log.parent
+    return handlers
+
+
+def _init_worker(log_queue):
+    """
+    The records of the workers are sent to the parent, which writes them
+    with its own handlers.
+    """
+    log = _conf.log
+    for handler in list(log.handlers):
+        log.removeHandler(handler)
+    log.addHandler(logging.handlers.QueueHandler(log_queue))
+    log.propagate = False
+
+
+def _run_task(index):
+    report, host = _tasks[index]
+    started = time.time()
+    _process(report, host, _conf)
+    return index, time.time() - started
+
+
+def run_serial(process, conf, tasks):
+    """
+    Runs process(report, host, conf) for every task, returns the list of
+    (task index, elapsed time).
+    """
+    timings = []
+    for index, (report, host) in enumerate(tasks):
+        started = time.time()
+        process(report, host, conf)
+        timings.append((index, time.time() - started))
+    return timings
+
+
+def run_parallel(process, conf, tasks, jobs):
+    """
+    Same as run_serial in a pool of jobs forked processes. An exception
+    propagated by process (ParseException in devmode) stops the pool and is
+    raised again here.
+    """
+    global _process, _conf, _tasks
+    _process = process
+    _conf = conf
+    _tasks = tasks
+
+    context = multiprocessing.get_context('fork')
+    log_queue = context.Queue()
+    listener = logging.handlers.QueueListener(log_queue, *_effective_handlers(conf.log), respect_handler_level=True)
+    listener.start()
+
+    timings = []
+    try:
+        with context.Pool(jobs, initializer=_init_worker, initargs=(log_queue,)) as pool:
+            for index, elapsed in pool.imap_unordered(_run_task, range(len(tasks))):
+                timings.append((index, elapsed))
+    finally:
+        listener.stop()
+    return timings
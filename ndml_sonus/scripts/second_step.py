@@ -1,31 +1,218 @@
 #!/bin/env python
 
 # Start second step parsers
+import functools
+import re
 import time
 
 from datetime import datetime
 
+from ndml_sonus.scripts.record import Record, MISSING
+
 
 class SecondStepParser:
-    def __init__(self, field_parsers):
+    """
+    The field parsers to apply to a field only depend on the report and the
+    field name: they are looked up the first time a field is seen and kept in
+    the converters table, so a row costs a set difference to find the new
+    fields and a lookup per field that has converters.
+
+    The converters are the parse functions of the field parsers bound to the
+    report, memoized in a bounded LRU cache of memo_size values (0 disables
+    it): the parse methods only depend on their arguments.
+
+    parse_batch converts a batch of records one column at a time, with the
+    column converters of the field parsers.
+    """
+
+    def __init__(self, field_parsers, memo_size=0):
         self.field_parsers = field_parsers
-        
+        self.memo_size = memo_size
+        self.report = None
+        # parse function of each field parser for the current report
+        self.parse_functions = []
+        # column function of each field parser for the current report
+        self.column_functions = []
+        # field name -> field parsers applying to it, in order
+        self.converters = {}
+        # field name -> column functions of these field parsers
+        self.column_converters = {}
+        # (field name, field parsers) of the fields with at least one field parser
+        self.active_converters = []
+        # (position, field parsers) of the schema fields with at least one field parser, per record schema
+        self.record_plans = {}
+        # (position, column functions) of the same fields, per record schema
+        self.column_plans = {}
+
+    def _converters_for(self, report, key):
+        indexes = [
+            index for index, field_parser in enumerate(self.field_parsers) if field_parser.should_parse(report, key)
+        ]
+        field_parsers = tuple(self.parse_functions[index] for index in indexes)
+        self.converters[key] = field_parsers
+        self.column_converters[key] = tuple(self.column_functions[index] for index in indexes)
+        if field_parsers:
+            self.active_converters.append((key, field_parsers))
+        return field_parsers
+
+    def _check_report(self, report):
+        if report is not self.report:
+            self.report = report
+            self.parse_functions = [
+                field_parser.converter(report, self.memo_size) for field_parser in self.field_parsers
+            ]
+            self.column_functions = [
+                field_parser.column_converter(report, parse)
+                for field_parser, parse in zip(self.field_parsers, self.parse_functions)
+            ]
+            self.converters = {}
+            self.column_converters = {}
+            self.active_converters = []
+            self.record_plans = {}
+            self.column_plans = {}
+
     def parse_dict(self, report, d):
-        for field_parser in self.field_parsers:
-            for key in d:
-                if field_parser.should_parse(report, key):
-                    d[key] = field_parser.parse(report, d[key])
+        if not self.field_parsers:
+            return
+        self._check_report(report)
+        if isinstance(d, Record):
+            return self.parse_record(report, d)
+
+        for key in d.keys() - self.converters.keys():
+            self._converters_for(report, key)
+        for key, field_parsers in self.active_converters:
+            if key in d:
+                value = d[key]
+                for parse in field_parsers:
+                    value = parse(value)
+                d[key] = value
+
+    def record_plan(self, report, schema):
+        plan = self.record_plans.get(schema)
+        if plan is None:
+            plan = []
+            for position, field in enumerate(schema.fields):
+                field_parsers = self.converters.get(field)
+                if field_parsers is None:
+                    field_parsers = self._converters_for(report, field)
+                if field_parsers:
+                    plan.append((position, field_parsers))
+            self.record_plans[schema] = plan
+        return plan
+
+    def parse_record(self, report, record):
+        """
+        Same as parse_dict, with the converters of the schema fields taken
+        by position.
+        """
+        values = record.values
+        for position, field_parsers in self.record_plan(report, record.schema):
+            value = values[position]
+            if value is not MISSING:
+                for parse in field_parsers:
+                    value = parse(value)
+                values[position] = value
+
+        if record.extras:
+            self.parse_extras(report, record.extras)
+
+    def parse_extras(self, report, extras):
+        for key in extras:
+            field_parsers = self.converters.get(key)
+            if field_parsers is None:
+                field_parsers = self._converters_for(report, key)
+            for parse in field_parsers:
+                extras[key] = parse(extras[key])
+
+    def column_plan(self, report, schema):
+        plan = self.column_plans.get(schema)
+        if plan is None:
+            plan = [
+                (position, self.column_converters[schema.fields[position]])
+                for position, _ in self.record_plan(report, schema)
+            ]
+            self.column_plans[schema] = plan
+        return plan
+
+    def parse_batch(self, report, rows):
+        """
+        Same as parse_dict on every row. When the rows are records of the
+        same schema, each converted field is taken out of the rows as a
+        column, converted at once and put back.
+        """
+        if not self.field_parsers or not rows:
+            return
+        self._check_report(report)
+        schema = getattr(rows[0], 'schema', None)
+        if schema is None or not all(isinstance(row, Record) and row.schema is schema for row in rows):
+            for row in rows:
+                self.parse_dict(report, row)
+            return
+
+        for position, column_converters in self.column_plan(report, schema):
+            rows_values = [row.values for row in rows if row.values[position] is not MISSING]
+            column = [values[position] for values in rows_values]
+            for convert in column_converters:
+                column = convert(column)
+            for values, value in zip(rows_values, column):
+                values[position] = value
+
+        for row in rows:
+            if row.extras:
+                self.parse_extras(report, row.extras)
+
+    def log_statistics(self, log, context):
+        """
+        Logs the hit rate of the memo of every field parser that was used.
+        """
+        for field_parser, parse in zip(self.field_parsers, self.parse_functions):
+            if not hasattr(parse, 'cache_info'):
+                continue
+            info = parse.cache_info()
+            calls = info.hits + info.misses
+            if calls:
+                log.info('%s: %s memo: %d values, %d hits / %d calls (%.1f%%)' % (
+                    context, field_parser.__class__.__name__, info.currsize, info.hits, calls,
+                    100.0 * info.hits / calls
+                ))
     
     @staticmethod
-    def create_from_report(report):
+    def create_from_report(report, memo_size=0):
         instances = [globals()[klass]() for klass in report.second_step_parsers]
-        return SecondStepParser(instances)        
+        parser = SecondStepParser(instances, memo_size)
+        parser._check_report(report)
+        return parser
 
 
 class FieldParser:
     def parse(self, report, field_value):
         raise NotImplementedError()
-    
+
+    def converter(self, report, memo_size=0):
+        """
+        parse bound to report, memoized in a LRU cache of memo_size values.
+        """
+        parse = functools.partial(self.parse, report)
+        if memo_size:
+            parse = functools.lru_cache(maxsize=memo_size, typed=True)(parse)
+        return parse
+
+    def column_converter(self, report, parse):
+        """
+        Converts a list of values with the converter parse, once per distinct
+        value when the values are str (1 and 1.0 are the same key).
+        """
+        def convert(values):
+            if set(map(type, values)) != {str}:
+                return list(map(parse, values))
+            distinct = dict.fromkeys(values)
+            if len(distinct) * 2 > len(values):
+                return list(map(parse, values))
+            converted = {value: parse(value) for value in distinct}
+            return list(map(converted.__getitem__, values))
+
+        return convert
+
     def should_parse(self, report, field_name):
         raise NotImplementedError()
 
@@ -147,6 +334,31 @@ class RemovePercentParser(FieldParser):
 
 
 class DateParser(FieldParser):
+    # Fast path of the usual format, 10/18/26 01:02:03 PM UTC
+    date_regex = re.compile(r'(\d\d)/(\d\d)/(\d\d) (\d\d):(\d\d):(\d\d) ([AP])M (?:UTC|GMT)\Z')
+
+    def parse_fixed_format(self, s):
+        """
+        Returns the Oracle date of s, None if s is not in the usual format or
+        is not a valid date, in which case strptime decides.
+        """
+        match = self.date_regex.match(s)
+        if match is None:
+            return None
+        month, day, year, hour, minute, second, meridian = match.groups()
+        year = int(year)
+        # same pivot as strptime %y
+        year += 1900 if year >= 69 else 2000
+        hour = int(hour)
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if meridian == 'P' else 0)
+        try:
+            datetime(year, int(month), int(day), hour, int(minute), int(second))
+        except ValueError:
+            return None
+        return '%04d/%s/%s %02d:%s:%s' % (year, month, day, hour, minute, second)
+
     def parse_date(self, s):
         try: 
             return datetime.strptime(s, '%m/%d/%y %I:%M:%S %p %Z')
@@ -155,6 +367,9 @@ class DateParser(FieldParser):
             return datetime(ts.tm_year, ts.tm_mon, ts.tm_mday, ts.tm_hour, ts.tm_min)
     
     def parse(self, report, field_value):
+        date = self.parse_fixed_format(field_value)
+        if date is not None:
+            return date
         date_object = self.parse_date(field_value)
         ORACLE_DATE_FORMAT = '%Y/%m/%d %H:%M:%S'
         return date_object.strftime(ORACLE_DATE_FORMAT)
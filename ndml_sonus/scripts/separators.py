@@ -2,6 +2,7 @@
 import re
 
 from ndml_sonus.scripts.field_merger import FieldMerger
+from ndml_sonus.scripts.literal_prefilter import prefiltered, required_literal
 
 # Separators are simple objects that are used to separate one or more lines 
 # from a report into a dict with one entry:  {'name: 'value'}.
@@ -15,6 +16,23 @@ from ndml_sonus.scripts.field_merger import FieldMerger
 # comment above the class definition
 
 
+def decoded_groupdict(match, text_group=None):
+    """
+    groupdict() of a match of a bytes regex with the values decoded, except
+    for text_group which is given as its (start, end) span, not copied.
+    """
+    if text_group is None:
+        return {name: value.decode('utf-8') if value is not None else None for name, value in match.groupdict().items()}
+    fields = {}
+    for name in match.re.groupindex:
+        if name == text_group:
+            fields[name] = match.span(name)
+        else:
+            value = match.group(name)
+            fields[name] = value.decode('utf-8') if value is not None else None
+    return fields
+
+
 # Start Separators
 class AbstractSeparator:
     def separate(self, text):
@@ -22,31 +40,137 @@ class AbstractSeparator:
     
     def matches(self, text):
         raise NotImplementedError()
+
+    def try_separate(self, text):
+        """
+        Returns separate(text), None if the separator does not match text.
+        Separators whose matches does the work of separate override it to
+        do that work once.
+        """
+        if self.matches(text):
+            return self.separate(text)
+        return None
     
 
 class RegexSeparator(AbstractSeparator):
+    """
+    The literal is a text in every match of the regex: the lines of a
+    report that do not contain it are rejected without running the regex.
+    """
     def __init__(self, regex):
         self.separator_regex = re.compile(regex)
+        self.literal = required_literal(self.separator_regex)
         
     def separate(self, text):
 
         return self.separator_regex.match(text).groupdict()
     
     def matches(self, text):
+        if self.literal not in text:
+            return None
         return self.separator_regex.match(text)
 
+    def try_separate(self, text):
+        if self.literal not in text:
+            return None
+        match = self.separator_regex.match(text)
+        return match.groupdict() if match is not None else None
+
 
 class FullTextRegexSeparator(AbstractSeparator):
-    def __init__(self, regex, mode=re.DOTALL):
-        self.separator_regex = re.compile(regex, mode)
+    """
+    block_terminator is an optional regex matching the end of a block, like
+    the Result: line of a command. No match of regex may contain a block
+    terminator except at its very end: the text can then be cut after any
+    block terminator without changing the matches, which is what
+    separate_stream does.
+    The regexes are prefiltered by their leading literal (literal_prefilter).
+    """
+
+    # Characters searched again before the new text for a block terminator
+    # cut by the end of the previous chunk
+    terminator_overlap = 4096
+
+    def __init__(self, regex, mode=re.DOTALL, block_terminator=None):
+        self.separator_regex = prefiltered(re.compile(regex, mode))
         self.regex_str = regex
+        self.mode = mode
+        self.block_terminator = re.compile(block_terminator) if block_terminator else None
+        self.bytes_regex = None
         
-    def separate(self, text):
+    def separate(self, text, offset_key=None, base=0):
+        """
+        When offset_key is given the dicts also have the offset of their match
+        in the text, plus base, under that key.
+        """
         for match in self.separator_regex.finditer(text):
-            yield match.groupdict()
+            fields = match.groupdict()
+            if offset_key is not None:
+                fields[offset_key] = base + match.start()
+            yield fields
+
+    def separate_buffer(self, buf, start=0, end=None, text_group=None, offset_key=None):
+        """
+        Yields the dicts of the matches in buf[start:end] without copying it:
+        buf is a bytes-like object (a mmap of the raw file) and the regex is
+        compiled again as a bytes pattern, where \\s, \\d and \\w only match
+        ASCII characters. The values are decoded, except text_group (see
+        decoded_groupdict).
+        """
+        if self.bytes_regex is None:
+            self.bytes_regex = prefiltered(re.compile(self.regex_str.encode('utf-8'), self.mode))
+        for match in self.bytes_regex.finditer(buf, start, len(buf) if end is None else end):
+            fields = decoded_groupdict(match, text_group)
+            if offset_key is not None:
+                fields[offset_key] = match.start()
+            yield fields
+
+    def separate_stream(self, fd, chunk_size=1024 * 1024, offset_key=None):
+        """
+        Yields the same dicts as separate(fd.read()) but reads fd in chunks and
+        only keeps the text after the last block terminator, so the memory
+        used depends on the largest block and not on the whole file.
+        Only on well formed files: a block whose header ends in a terminator
+        (a GSX block with an empty output and a missing line end) is matched
+        over the next terminator by separate, here it is lost when a chunk
+        ends between the two terminators.
+        """
+        if self.block_terminator is None:
+            for fields in self.separate(fd.read(), offset_key):
+                yield fields
+            return
+
+        buffer = ''
+        # Characters of the text before the buffer
+        consumed = 0
+        while True:
+            chunk = fd.read(chunk_size)
+            if not chunk:
+                break
+
+            start = max(len(buffer) - self.terminator_overlap, 0)
+            buffer += chunk
+            end = None
+            for match in self.block_terminator.finditer(buffer, start):
+                end = match.end()
+
+            if end is not None:
+                for fields in self.separate(buffer[:end], offset_key, consumed):
+                    yield fields
+                buffer = buffer[end:]
+                consumed += end
+
+        for fields in self.separate(buffer, offset_key, consumed):
+            yield fields
     
     def matches(self, text):
-        return len(self.separator_regex.findall(text)) > 0
+        return self.separator_regex.search(text) is not None
+
+    def try_separate(self, text):
+        """
+        Returns the list of the dicts of separate(text), None if there is none.
+        """
+        return list(self.separate(text)) or None
 
 
 class SingleColumnSeparator(AbstractSeparator):
@@ -122,6 +246,71 @@ class NestingSingleColumnSeparator(SingleColumnSeparator):
         return result
 
 
+class ColumnExtractor:
+    """
+    The columns of a fixed column layout separated in one pass: every column
+    is sliced, split at the first ':' and stripped in the same loop, giving
+    the same dicts as a SingleColumnSeparator (or a NestingSingleColumnSeparator
+    when nesting is set) per column. The nesting state of every column is
+    kept as its last non nested line and the leading whitespace of its
+    parent line.
+    """
+
+    def __init__(self, columns, nesting):
+        self.columns = [(column_start, column_end) for column_start, column_end in columns]
+        self.nesting = nesting
+        # [last_non_nested_line, whitespaces in the beginning of parent_line], per column
+        self.states = [[' '*50 + 'x', 50] for _ in self.columns]
+        self.extract = self.extract_nesting if nesting else self.extract_simple
+
+    @staticmethod
+    def add_field(name, value, result):
+        if name in result:
+            # logs the repeat or raises the clash
+            FieldMerger.merge({name: value}, result)
+        else:
+            result[name] = value
+
+    def extract_simple(self, line):
+        result = {}
+        for column_start, column_end in self.columns:
+            partial_line = line[column_start:column_end]
+            if partial_line.count(': ') == 1:
+                name, value = partial_line.split(':', 1)
+                self.add_field(name.strip(), value.strip(), result)
+        return result
+
+    def extract_nesting(self, line):
+        result = {}
+        for (column_start, column_end), state in zip(self.columns, self.states):
+            partial_line = line[column_start:column_end]
+            stripped_line = partial_line.strip()
+            whitespaces = len(partial_line.rstrip()) - len(stripped_line)
+            nested = whitespaces > state[1]
+            if not nested and stripped_line:
+                state[0] = stripped_line[:-1] if stripped_line[-1] == ':' else stripped_line
+                state[1] = whitespaces
+            if partial_line.count(': ') == 1:
+                name, value = partial_line.split(':', 1)
+                name = name.strip()
+                if nested:
+                    name = state[0] + ' ' + name
+                self.add_field(name, value.strip(), result)
+        return result
+
+    @staticmethod
+    def from_layout(columns, klass):
+        """
+        Extractor of the columns for the single-column separator klass, None
+        if klass is not one it knows.
+        """
+        if klass is NestingSingleColumnSeparator:
+            return ColumnExtractor(columns, True)
+        if klass is SingleColumnSeparator:
+            return ColumnExtractor(columns, False)
+        return None
+
+
 class FixedColumnSeparator(AbstractSeparator):
     """
     This is a separator that can separate lines with more than one parameter
@@ -134,16 +323,22 @@ class FixedColumnSeparator(AbstractSeparator):
     If you don't need nesting in your report, but need to parse many columns, you
     should use the SimpleFixedColumnSeparator, which is much simpler and easier to
     debug.
+    For the single-column separators of this module the columns are
+    separated by a ColumnExtractor, other klasses get a separator per column.
     """
     klass = NestingSingleColumnSeparator
     
     def __init__(self, columns):
         AbstractSeparator.__init__(self)
         self.columns = columns
-        self.separators = [self.klass() for _ in self.columns]
+        self.extractor = ColumnExtractor.from_layout(columns, self.klass)
+        self.separators = [self.klass() for _ in self.columns] if self.extractor is None else []
         self.field_merger = FieldMerger()
         
     def separate(self, line):
+        if self.extractor is not None:
+            return self.extractor.extract(line)
+
         result = {}
         
         for idx, column in enumerate(self.columns):
@@ -155,8 +350,8 @@ class FixedColumnSeparator(AbstractSeparator):
             partial_line = line[column_start: column_end]
             separator = self.separators[idx]
             
-            if separator.matches(partial_line):
-                new_field = separator.separate(partial_line)
+            new_field = separator.try_separate(partial_line)
+            if new_field is not None:
                 self.field_merger.merge(new_field, result)
                 
         return result
@@ -176,7 +371,11 @@ class SimpleFixedColumnSeparator(FixedColumnSeparator):
     klass = SingleColumnSeparator
     
     def matches(self, line):
-        return len(self.separate(line)) >= len(self.columns)
+        return self.try_separate(line) is not None
+
+    def try_separate(self, line):
+        result = self.separate(line)
+        return result if len(result) >= len(self.columns) else None
 
 
 class NoMatchException(Exception):
@@ -189,23 +388,22 @@ class SpacedValueSeparator(AbstractSeparator):
     FieldName              FieldValue
     """
     def separate(self, line):
+        result = self.try_separate(line)
+        if result is None:
+            raise NoMatchException()
+        return result
+        
+    def matches(self, line):
+        return self.try_separate(line) is not None
+
+    def try_separate(self, line):
         split_line = line.strip().split('  ')
         
         split_line = [x.strip() for x in split_line if len(x.strip()) != 0]
         
         if len(split_line) == 2:
             return {split_line[0]: split_line[1]}
-        else:
-            raise NoMatchException()
-        
-    def matches(self, line):
-        try:
-            self.separate(line)
-            result = True
-        except NoMatchException:
-            result = False
-            
-        return result
+        return None
 
 # I am not sure if this class is being used. Used to separate
 # FieldName              FieldValue
@@ -228,7 +426,12 @@ class NameValueInTwoColumnsSeparator(AbstractSeparator):
         return {name: value}
     
     def matches(self, line):
-        return len(self.separate(line).keys()[0]) > 0
+        return self.try_separate(line) is not None
+
+    def try_separate(self, line):
+        result = self.separate(line)
+        name, = result
+        return result if len(name) > 0 else None
 
 
 class CompositeSeparator(AbstractSeparator):
@@ -251,6 +454,11 @@ class CompositeSeparator(AbstractSeparator):
     FieldValue1, FieldValue4
     The parent separator is considered to be some "global" information, common to
     all child nodes.
+
+    The rows are yielded as they are separated, without lists of the parent
+    or child dicts. Every row is a new dict with the parent fields and the
+    fields of its child. A child separator can be a CompositeSeparator
+    itself, to separate more than two levels (see from_levels).
     """
     def __init__(self, parent_separator, field_to_pass, child_separator):
         self.parent_separator = parent_separator
@@ -259,19 +467,38 @@ class CompositeSeparator(AbstractSeparator):
         AbstractSeparator.__init__(self)
     
     def separate(self, text):
-        global_fields_list = list(self.parent_separator.separate(text))
-        
-        for global_fields in global_fields_list:
-        
+        for global_fields in self.parent_separator.separate(text):
             text_to_pass = global_fields.pop(self.field_to_pass)
-            child_fields_list = list(self.child_separator.separate(text_to_pass))
-            
-            for child_fields in child_fields_list:
-                global_fields_copy = global_fields.copy()
-                global_fields_copy.update(child_fields)
-                yield global_fields_copy
+
+            for child_fields in self.child_separator.separate(text_to_pass):
+                yield {**global_fields, **child_fields}
     
     def matches(self, text):
         return self.parent_separator.matches(text)
 
+    def try_separate(self, text):
+        """
+        Returns the list of the dicts of separate(text), None if the parent
+        separator does not match text.
+        """
+        if not self.matches(text):
+            return None
+        return list(self.separate(text))
+
+    @staticmethod
+    def from_levels(parent_separator, *levels):
+        """
+        Composite of any number of levels: levels are (field_to_pass,
+        separator) pairs, the text of field_to_pass of every level is
+        separated by the separator of the next one.
+        from_levels(a, ('b_text', b), ('c_text', c)) yields the rows of c
+        with the fields of their b and a rows.
+        """
+        if not levels:
+            return parent_separator
+        field_to_pass, child_separator = levels[0]
+        return CompositeSeparator(
+            parent_separator, field_to_pass, CompositeSeparator.from_levels(child_separator, *levels[1:])
+        )
+
 # End Separators
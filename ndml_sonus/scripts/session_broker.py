@@ -0,0 +1,353 @@
+#!/bin/env python
+"""
+Local daemon keeping authenticated ssh sessions open between getter processes.
+
+The getter processes started by the cron/VM scripts all log in to the same
+switches. The broker keeps the sessions (transport + interactive channel,
+already past the login and, for the Sonus getters, the nested port 8122 hop)
+open and leases them to the getters over a unix socket. A lease is a plain
+byte stream: the broker relays it to the channel until the getter closes its
+end, then the session goes back to the idle list for the next getter.
+"""
+
+import json
+import os
+import select
+import socket
+import threading
+import time
+
+from ndml_sonus.scripts.channel_reader import PromptReader
+
+
+class BrokerException(Exception):
+    pass
+
+
+def _read_line(sock):
+    """
+    Reads one newline terminated JSON message without reading past it.
+    """
+    data = b''
+    while not data.endswith(b'\n'):
+        byte = sock.recv(1)
+        if not byte:
+            raise BrokerException('connection closed by the broker')
+        data += byte
+    return json.loads(data.decode('utf-8'))
+
+
+def _write_line(sock, message):
+    sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+
+
+class BrokerSession:
+    # Seconds without output after the prompt for the channel to be considered drained
+    quiet_time = 0.2
+
+    def __init__(self, key, tn, chan, login_time, prompt):
+        self.key = key
+        self.tn = tn
+        self.chan = chan
+        self.login_time = login_time
+        self.prompt = prompt
+        self.last_used = time.time()
+        self.leases = 0
+
+    def healthy(self):
+        return self.tn.is_active() and not self.chan.closed and not self.chan.eof_received
+
+    def drain(self, timeout):
+        """
+        Discards output left on the channel by the previous lease: sends an
+        empty command and reads until the prompt comes back and the channel
+        stays quiet, so the output of a command still running does not go to
+        the next lease. Returns False if that did not happen before timeout.
+        """
+        reader = PromptReader(self.prompt)
+        deadline = time.time() + timeout
+        prompt_seen = False
+        try:
+            self.chan.send('\n')
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                readable, _, _ = select.select([self.chan], [], [], min(remaining, self.quiet_time))
+                if not readable and not self.chan.recv_ready():
+                    if prompt_seen:
+                        return True
+                    continue
+                data = self.chan.recv(32768)
+                if not data:
+                    return False
+                prompt_seen = reader.feed(data)
+        except (socket.error, EOFError):
+            return False
+
+    def close(self):
+        try:
+            self.chan.close()
+            self.tn.close()
+        except Exception:
+            pass
+
+
+class SessionBroker:
+    """
+    Serves leases of authenticated sessions on a unix socket.
+
+    * login: object with resolve(request) giving, for a lease request, the
+      session key, the prompt regex of the session and a function opening a
+      new (transport, channel)
+    * idle_timeout: seconds after which an unused session is closed
+    * health_interval: seconds between two checks of the idle sessions
+    * drain_timeout: seconds given to a released session to get back to its
+      prompt, it is closed instead of reused otherwise
+    """
+
+    def __init__(self, log, socket_path, login, idle_timeout=600, health_interval=60, drain_timeout=10):
+        self.log = log
+        self.socket_path = socket_path
+        self.login = login
+        self.idle_timeout = idle_timeout
+        self.health_interval = health_interval
+        self.drain_timeout = drain_timeout
+
+        self.idle = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.stats = {'leases': 0, 'hits': 0, 'logins': 0, 'login_time': 0.0, 'login_time_saved': 0.0, 'expired': 0}
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        server.listen(64)
+        server.settimeout(1.0)
+        self.log.info('session broker listening on %s' % self.socket_path)
+
+        janitor = threading.Thread(target=self._janitor, name='broker-janitor', daemon=True)
+        janitor.start()
+
+        try:
+            while not self.stopped.is_set():
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        finally:
+            server.close()
+            os.unlink(self.socket_path)
+            self.close_all()
+            self.log_stats()
+
+    def stop(self):
+        self.stopped.set()
+
+    def _handle(self, conn):
+        try:
+            conn.settimeout(None)
+            request = _read_line(conn)
+            if request.get('op') == 'stats':
+                _write_line(conn, self.get_stats())
+            elif request.get('op') == 'lease':
+                self._lease(conn, request)
+            else:
+                _write_line(conn, {'status': 'error', 'message': 'unknown op %s' % request.get('op')})
+        except Exception as e:
+            self.log.exception('session broker: error serving client: %s' % e)
+        finally:
+            conn.close()
+
+    def _lease(self, conn, request):
+        try:
+            key, prompt, open_session = self.login.resolve(request)
+            session = self._take(key)
+            reused = session is not None
+            if not reused:
+                session = self._login(key, prompt, open_session)
+        except Exception as e:
+            self.log.exception('session broker: could not open session for %s' % request)
+            _write_line(conn, {'status': 'error', 'message': str(e)})
+            return
+
+        session.leases += 1
+        with self.lock:
+            self.stats['leases'] += 1
+            if reused:
+                self.stats['hits'] += 1
+                self.stats['login_time_saved'] += session.login_time
+
+        self.log.info('session broker: lease %s (%s)' % (key, 'reused' if reused else 'new login'))
+        _write_line(conn, {'status': 'ok', 'reused': reused, 'login_time': session.login_time})
+
+        self._relay(conn, session)
+
+        if not session.healthy():
+            self.log.info('session broker: session %s closed during the lease' % key)
+            session.close()
+        elif not session.drain(self.drain_timeout):
+            self.log.warning('session broker: session %s did not get back to its prompt, closing it' % key)
+            session.close()
+        else:
+            session.last_used = time.time()
+            with self.lock:
+                self.idle.setdefault(key, []).append(session)
+
+    def _login(self, key, prompt, open_session):
+        started = time.time()
+        tn, chan = open_session()
+        login_time = time.time() - started
+        with self.lock:
+            self.stats['logins'] += 1
+            self.stats['login_time'] += login_time
+        self.log.info('session broker: logged in %s in %.1fs' % (key, login_time))
+        return BrokerSession(key, tn, chan, login_time, prompt)
+
+    def _take(self, key):
+        """
+        Returns an idle healthy session for key, None if there is none.
+        """
+        while True:
+            with self.lock:
+                sessions = self.idle.get(key)
+                if not sessions:
+                    return None
+                session = sessions.pop()
+            if session.healthy():
+                return session
+            self.log.info('session broker: dropping unhealthy session %s' % key)
+            session.close()
+
+    @staticmethod
+    def _relay(conn, session):
+        """
+        Copies bytes between the client socket and the channel until the
+        client closes its end or the channel is closed.
+        """
+        chan = session.chan
+        while True:
+            readable, _, _ = select.select([conn, chan], [], [], 1.0)
+            if conn in readable:
+                data = conn.recv(32768)
+                if not data:
+                    return
+                chan.sendall(data)
+            if chan in readable:
+                data = chan.recv(32768)
+                if not data:
+                    return
+                conn.sendall(data)
+
+    def _janitor(self):
+        logged_leases = 0
+        while not self.stopped.wait(self.health_interval):
+            now = time.time()
+            to_close = []
+            with self.lock:
+                for key, sessions in self.idle.items():
+                    for session in list(sessions):
+                        if now - session.last_used > self.idle_timeout or not session.healthy():
+                            sessions.remove(session)
+                            to_close.append(session)
+                self.stats['expired'] += len(to_close)
+
+            for session in to_close:
+                self.log.info('session broker: closing idle session %s' % session.key)
+                session.close()
+
+            if to_close or self.stats['leases'] != logged_leases:
+                logged_leases = self.stats['leases']
+                self.log_stats()
+
+    def close_all(self):
+        with self.lock:
+            sessions = [session for sessions in self.idle.values() for session in sessions]
+            self.idle.clear()
+        for session in sessions:
+            session.close()
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['idle_sessions'] = sum(len(sessions) for sessions in self.idle.values())
+        stats['hit_rate'] = float(stats['hits']) / stats['leases'] if stats['leases'] else 0.0
+        return stats
+
+    def log_stats(self):
+        stats = self.get_stats()
+        self.log.info(
+            'session broker: %(leases)d leases, hit rate %(hit_rate).0f%%, %(logins)d logins (%(login_time).1fs), '
+            '%(login_time_saved).1fs of login saved, %(idle_sessions)d idle sessions, %(expired)d expired' % dict(
+                stats, hit_rate=stats['hit_rate'] * 100
+            )
+        )
+
+
+class BrokerChannel:
+    """
+    Client side of a lease. Provides the part of the paramiko Channel API used
+    by the getters (send, recv, recv_ready, settimeout, close) on top of the
+    unix socket relayed by the broker, and stands for the transport as well.
+    """
+
+    def __init__(self, socket_path, request):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socket_path)
+        _write_line(self.sock, dict(request, op='lease'))
+
+        reply = _read_line(self.sock)
+        if reply.get('status') != 'ok':
+            self.sock.close()
+            raise BrokerException(reply.get('message', 'lease refused'))
+
+        self.reused = reply['reused']
+        self.login_time = reply['login_time']
+        self.closed = False
+        self.eof_received = False
+
+    @property
+    def active(self):
+        return not self.closed
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def send(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.sock.sendall(data)
+        return len(data)
+
+    def recv(self, size):
+        data = self.sock.recv(size)
+        if not data:
+            self.eof_received = True
+        return data
+
+    def recv_ready(self):
+        readable, _, _ = select.select([self.sock], [], [], 0)
+        return bool(readable)
+
+    def settimeout(self, timeout):
+        self.sock.settimeout(timeout)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.sock.close()
+
+
+def get_broker_stats(socket_path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(socket_path)
+    try:
+        _write_line(sock, {'op': 'stats'})
+        return _read_line(sock)
+    finally:
+        sock.close()
@@ -0,0 +1,163 @@
+#!/bin/env python
+"""
+Download engine of the sftp getters.
+
+The partial file and a manifest of the last download (remote path, size,
+mtime and md5) are kept in a work directory, outside of the directories
+scanned by the parsers:
+
+* a file whose local copy still matches the remote size and mtime of the
+  manifest, and the md5 of the manifest, is not transferred again
+* an interrupted transfer is resumed from the size of its partial file, as
+  long as the remote file did not change in between
+* the reads are prefetched and consumed in blocks of block_size bytes, with
+  at most max_requests requests in flight where paramiko can limit them
+* the size, and for zip archives the CRC of every member, is checked before
+  the partial file replaces the local one
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import time
+import zipfile
+
+
+class DownloadException(Exception):
+    pass
+
+
+class SftpDownloader:
+    def __init__(self, log, context, work_dir, block_size=1024 * 1024, max_requests=64):
+        self.log = log
+        self.context = context
+        self.work_dir = work_dir
+        self.block_size = block_size
+        self.max_requests = max_requests
+
+    def _work_path(self, local_path, suffix):
+        return os.path.join(self.work_dir, os.path.basename(local_path) + suffix)
+
+    @staticmethod
+    def _read_manifest(path):
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as fd:
+                return json.load(fd)
+        except ValueError:
+            return None
+
+    def _md5(self, path):
+        md5 = hashlib.md5()
+        with open(path, 'rb') as fd:
+            for block in iter(lambda: fd.read(self.block_size), b''):
+                md5.update(block)
+        return md5
+
+    @staticmethod
+    def _write_manifest(path, manifest):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as fd:
+            json.dump(manifest, fd)
+        os.replace(tmp_path, path)
+
+    def download(self, sftp, remote_path, local_path):
+        """
+        Brings local_path up to date with remote_path.
+        Returns the number of bytes transferred.
+        """
+        started = time.time()
+        attrs = sftp.stat(remote_path)
+        remote = {'remote': remote_path, 'size': attrs.st_size, 'mtime': attrs.st_mtime}
+
+        manifest_path = self._work_path(local_path, '.manifest')
+        manifest = self._read_manifest(manifest_path)
+        if (
+            manifest is not None and os.path.exists(local_path) and os.path.getsize(local_path) == remote['size']
+            and all(manifest.get(key) == value for key, value in remote.items())
+        ):
+            if self._md5(local_path).hexdigest() == manifest.get('md5'):
+                self.log.info('%s: %s unchanged since the last download, %d bytes saved' % (
+                    self.context, remote_path, remote['size']
+                ))
+                return 0
+            self.log.warning('%s: %s does not match the md5 of its last download, downloading it again' % (
+                self.context, local_path
+            ))
+
+        part_path = self._work_path(local_path, '.part')
+        part_manifest_path = self._work_path(local_path, '.part.manifest')
+        offset = 0
+        if os.path.exists(part_path) and self._read_manifest(part_manifest_path) == remote:
+            offset = min(os.path.getsize(part_path), remote['size'])
+        else:
+            self._write_manifest(part_manifest_path, remote)
+
+        if offset:
+            self.log.info('%s: resuming %s at byte %d' % (self.context, remote_path, offset))
+            with open(part_path, 'rb+') as fd:
+                fd.truncate(offset)
+            md5 = self._md5(part_path)
+        else:
+            md5 = hashlib.md5()
+
+        transferred = 0
+        with open(part_path, 'ab' if offset else 'wb') as out:
+            out.truncate(offset)
+            with sftp.open(remote_path, 'rb') as remote_file:
+                remote_file.seek(offset)
+                self._prefetch(remote_file, remote['size'])
+                while offset + transferred < remote['size']:
+                    block = remote_file.read(min(self.block_size, remote['size'] - offset - transferred))
+                    if not block:
+                        break
+                    out.write(block)
+                    md5.update(block)
+                    transferred += len(block)
+
+        self._verify(part_path, remote)
+        shutil.move(part_path, local_path)
+        os.unlink(part_manifest_path)
+        self._write_manifest(manifest_path, dict(remote, md5=md5.hexdigest()))
+
+        elapsed = time.time() - started
+        self.log.info(
+            '%s: %s downloaded to %s, %d bytes in %.1fs (%.2f MB/s), %d bytes saved by resuming' % (
+                self.context, remote_path, local_path, transferred, elapsed,
+                transferred / 1024.0 / 1024.0 / max(elapsed, 0.001), offset
+            )
+        )
+        return transferred
+
+    def _prefetch(self, remote_file, size):
+        """
+        The limit of requests in flight is only known by paramiko 3.3 and later.
+        """
+        if 'max_concurrent_requests' in inspect.signature(remote_file.prefetch).parameters:
+            remote_file.prefetch(size, max_concurrent_requests=self.max_requests)
+        else:
+            remote_file.prefetch(size)
+
+    def _verify(self, part_path, remote):
+        """
+        An incomplete partial file is kept to be resumed, a corrupted one is
+        removed so the next attempt starts from scratch.
+        """
+        size = os.path.getsize(part_path)
+        if size != remote['size']:
+            raise DownloadException(
+                '%s: %s incomplete, %d of %d bytes received' % (self.context, remote['remote'], size, remote['size'])
+            )
+
+        if remote['remote'].endswith('.zip'):
+            try:
+                with zipfile.ZipFile(part_path) as archive:
+                    bad_member = archive.testzip()
+            except zipfile.BadZipfile as e:
+                bad_member = str(e)
+            if bad_member is not None:
+                os.unlink(part_path)
+                raise DownloadException('%s: %s corrupted (%s)' % (self.context, remote['remote'], bad_member))
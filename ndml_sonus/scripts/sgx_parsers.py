@@ -1,24 +1,34 @@
 import re
 
 from ndml_sonus.scripts.common import CommandFullTextParser
-from ndml_sonus.scripts.separators import FullTextRegexSeparator, CompositeSeparator
+from ndml_sonus.scripts.literal_prefilter import prefiltered
+from ndml_sonus.scripts.separators import FullTextRegexSeparator, CompositeSeparator, decoded_groupdict
+from ndml_sonus.scripts.whitespace_table import table_regex
 
 
 class SgxCommandFullTextParser(CommandFullTextParser):
     separator = FullTextRegexSeparator(r'''
 swmml -n (?P<SgxNode>\S+) -e \S+
 (?P<CommandOutput>.*?)
-\$ '''[1:])
+\$ '''[1:], block_terminator=r'\n\$ ')
 
 
 # Refactor to use the FullTextRegexSeparator
 class SgxRegexFullTextParser(SgxCommandFullTextParser):
     regex = r''
     regex_mode = re.MULTILINE
+    # regex of the class as compiled, see whitespace_table
+    matching_regex = r''
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.matching_regex = table_regex(cls.regex, cls.regex_mode)
 
     def __init__(self, *args, **kwargs):
         SgxCommandFullTextParser.__init__(self, *args, **kwargs)
-        self.compiled_regex = re.compile(self.regex, self.regex_mode)
+        self.compiled_regex = prefiltered(re.compile(self.matching_regex, self.regex_mode))
+        if self.mmap_parse:
+            self.compiled_bytes_regex = prefiltered(re.compile(self.matching_regex.encode('utf-8'), self.regex_mode))
 
     def parse_command_output(self, text):
         matches = self.compiled_regex.finditer(text)
@@ -26,6 +36,10 @@ class SgxRegexFullTextParser(SgxCommandFullTextParser):
         for match in matches:
             yield match.groupdict()
 
+    def parse_command_output_mapped(self, buf, start, end):
+        for match in self.compiled_bytes_regex.finditer(buf, start, end):
+            yield decoded_groupdict(match)
+
 
 class SgxCommandSeparatorParser(SgxCommandFullTextParser):
     command_separator = None
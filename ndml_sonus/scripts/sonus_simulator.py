@@ -0,0 +1,350 @@
+#!/bin/env python
+"""
+Local ssh server emulating the Sonus CLI, to run and benchmark the getters
+without a switch.
+
+The simulated session follows what the getters wait for:
+
+* the login banner, then the shell prompt "$ " in a separate packet
+* swmml -n <instance> -e <command> run from the shell
+* ssh ndml@localhost -p 8122, answered with "Password: " then the ">" prompt
+  of the nested CLI, where "select target instance <instance>" changes the
+  prompt to "<instance>> " and the commands are run on the selected instance
+
+Outputs are replayed from the recordings of the getters (record_sessions
+setting) or synthesized: a find command lists find_count ids with the field
+names used by the PSX getters, any other command returns output_size bytes.
+
+    $ sonus_simulator.py serve --port 2222 --count 4 --latency 0.05
+    $ sonus_simulator.py serve --port 2222 --replay var/recordings/*.jsonl
+    $ sonus_simulator.py bench --hosts 1 4 16 --sizes 64 1024
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from types import SimpleNamespace
+
+import paramiko
+
+
+SWMML = re.compile(r'^swmml\s+-n\s+(?P<instance>\S+)\s+-e\s+(?P<command>.*)$')
+SELECT_INSTANCE = re.compile(r'^select target instance\s+(?P<instance>\S+)$')
+
+
+class Responder:
+    """
+    Gives the output of a command: the recorded output if there is one for
+    the (instance, command) pair, a synthesized one otherwise. Recorded
+    outputs are sent verbatim, they include the echo and the prompt.
+    """
+
+    def __init__(self, recordings=(), output_size=64 * 1024, find_count=100):
+        self.output_size = output_size
+        self.find_count = find_count
+        self.recorded = {}
+        for path in recordings:
+            with open(path) as fd:
+                for line in fd:
+                    record = json.loads(line)
+                    self.recorded[(record['instance'], record['command'])] = record['output']
+
+    def respond(self, instance, command, prompt):
+        recorded = self.recorded.get((instance, command))
+        if recorded is not None:
+            return recorded
+        return '%s\r\n%s\r\n%s' % (command, self.synthesize(command), prompt)
+
+    def synthesize(self, command):
+        words = command.split()
+        if len(words) >= 2 and words[0] == 'find':
+            field = '_'.join(word.capitalize() for word in words[1].split('_')) + '_Id'
+            keys = list(zip(words[2::2], words[3::2]))
+            lines = []
+            for i in range(self.find_count):
+                if keys:
+                    lines.extend('%s: %s' % key for key in keys)
+                    lines.append('   Sequence_Number : %d' % i)
+                else:
+                    lines.append('%s: ID%05d' % (field, i))
+            return '\r\n'.join(lines)
+
+        line = 'Field_%02d : value %s %s\r\n'
+        lines = []
+        size = 0
+        while size < self.output_size:
+            lines.append(line % (len(lines) % 100, command.replace(' ', '_'), 'x' * 40))
+            size += len(lines[-1])
+        return ''.join(lines)
+
+
+class SimulatorServer(paramiko.ServerInterface):
+    def __init__(self, options, responder):
+        self.options = options
+        self.responder = responder
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_auth_password(self, username, password):
+        if self.options.password is None or password == self.options.password:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        shell = SimulatedShell(channel, self.options, self.responder)
+        threading.Thread(target=shell.run, daemon=True).start()
+        return True
+
+
+class SimulatedShell:
+    def __init__(self, chan, options, responder):
+        self.chan = chan
+        self.options = options
+        self.responder = responder
+        self.instance = None
+
+    def send(self, text, latency=0.0):
+        """
+        Sends text after latency seconds, in chunks of chunk_size bytes
+        separated by chunk_delay seconds.
+        """
+        if latency > 0:
+            time.sleep(latency)
+        data = text.encode('utf-8')
+        size = self.options.chunk_size or len(data)
+        for i in range(0, len(data), size):
+            self.chan.sendall(data[i:i + size])
+            if self.options.chunk_delay > 0:
+                time.sleep(self.options.chunk_delay)
+
+    def lines(self):
+        buffer = b''
+        while True:
+            data = self.chan.recv(4096)
+            if not data:
+                return
+            buffer += data.replace(b'\r', b'\n')
+            while b'\n' in buffer:
+                line, buffer = buffer.split(b'\n', 1)
+                if line.strip():
+                    yield line.decode('utf-8', 'ignore').strip()
+
+    def run(self):
+        shell_prompt = '%s $ ' % self.options.hostname
+        try:
+            self.send('Last login: %s from 127.0.0.1\r\n' % time.ctime())
+            time.sleep(self.options.login_delay)
+            self.send(shell_prompt)
+
+            mode = 'shell'
+            for line in self.lines():
+                if mode == 'shell':
+                    match = SWMML.match(line)
+                    if match:
+                        self.send(
+                            self.responder.respond(match.group('instance'), match.group('command'), shell_prompt),
+                            self.options.latency
+                        )
+                    elif line.startswith('ssh ') and '8122' in line:
+                        self.send('%s\r\nPassword: ' % line)
+                        mode = 'password'
+                    elif line in ('exit', 'logout'):
+                        return
+                    else:
+                        self.send('%s\r\n%s' % (line, shell_prompt))
+
+                elif mode == 'password':
+                    self.send('\r\n\r\n> ', self.options.login_delay)
+                    mode = 'cli'
+
+                else:
+                    prompt = '%s> ' % self.instance if self.instance else '> '
+                    match = SELECT_INSTANCE.match(line)
+                    if match:
+                        self.instance = match.group('instance')
+                        self.send('%s\r\n\r\n%s> ' % (line, self.instance))
+                    elif line in ('exit', 'logout'):
+                        self.instance = None
+                        mode = 'shell'
+                        self.send('%s\r\n%s' % (line, shell_prompt))
+                    else:
+                        self.send(self.responder.respond(self.instance, line, prompt), self.options.latency)
+        except (EOFError, OSError, paramiko.SSHException):
+            pass
+        finally:
+            self.chan.close()
+
+
+def _serve_connection(sock, host_key, options, responder):
+    transport = paramiko.Transport(sock)
+    transport.add_server_key(host_key)
+    try:
+        transport.start_server(server=SimulatorServer(options, responder))
+        # A channel dropped by the server side is closed when it is garbage
+        # collected, keep the accepted ones until they are closed
+        channels = []
+        while transport.is_active():
+            chan = transport.accept(1)
+            channels = [channel for channel in channels if not channel.closed]
+            if chan is not None:
+                channels.append(chan)
+    except (EOFError, OSError, paramiko.SSHException):
+        pass
+    finally:
+        transport.close()
+
+
+def _listen(server, host_key, options, responder):
+    while True:
+        sock, _ = server.accept()
+        threading.Thread(target=_serve_connection, args=(sock, host_key, options, responder), daemon=True).start()
+
+
+def serve(options):
+    """
+    Listens on count consecutive ports, one per simulated host.
+    """
+    if options.host_key:
+        host_key = paramiko.RSAKey(filename=options.host_key)
+    else:
+        host_key = paramiko.RSAKey.generate(2048)
+    responder = Responder(options.replay, options.output_size, options.find_count)
+
+    threads = []
+    for port in range(options.port, options.port + options.count):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(('127.0.0.1', port))
+        server.listen(100)
+        thread = threading.Thread(target=_listen, args=(server, host_key, options, responder), daemon=True)
+        thread.start()
+        threads.append(thread)
+    print('simulating %d hosts on ports %d-%d' % (options.count, options.port, options.port + options.count - 1))
+    sys.stdout.flush()
+    for thread in threads:
+        thread.join()
+
+
+def _bench_run(options, hosts, size):
+    """
+    Collects the bench report from hosts simulated hosts of size KB per
+    command. Returns (wall seconds, cpu seconds, MB received).
+    """
+    from ndml_sonus.scripts.collection import CollectionEngine
+    from ndml_sonus.scripts.getdata_sonus_ssh_VM import GetException, SshGetter, make_get_task
+
+    server = subprocess.Popen(
+        [
+            sys.executable, '-m', 'ndml_sonus.scripts.sonus_simulator', 'serve', '--port', str(options.port),
+            '--count', str(hosts), '--output-size', str(size * 1024), '--latency', str(options.latency),
+            '--chunk-size', str(options.chunk_size), '--chunk-delay', str(options.chunk_delay),
+        ] + (['--replay'] + options.replay if options.replay else []),
+        stdout=subprocess.PIPE
+    )
+    work_dir = tempfile.mkdtemp(prefix='sonus-bench-')
+    raw_dir = os.path.join(work_dir, 'raw')
+    os.mkdir(raw_dir)
+    try:
+        # The server prints its ports once it listens
+        if not server.stdout.readline():
+            raise RuntimeError('the simulator did not start')
+
+        log = logging.getLogger('sonus_simulator.bench')
+        conf = SimpleNamespace(
+            log=log, tmp_dir=work_dir, read_until=r'\$', send_pass='ndml', devmode=True,
+            raw_file_name=lambda host, report: os.path.join(raw_dir, '%s_%s.raw' % (host.name, report.name)),
+        )
+        report = SimpleNamespace(
+            name='bench', getter=options.getter, instances=options.instances,
+            commands=['show bench_object %d' % i for i in range(options.commands)],
+        )
+        engine = CollectionEngine(log, max_workers=hosts, recoverable=(GetException,), devmode=True)
+        for i in range(hosts):
+            host = SimpleNamespace(
+                name='sim%d' % i, ip='127.0.0.1', port=options.port + i, ssh_usr='ndml', ssh_pwd='ndml'
+            )
+            engine.add((host.ip, host.port), host.name, make_get_task(conf, host, report, host.name, False))
+
+        started = time.time()
+        cpu_started = time.process_time()
+        engine.run()
+        wall = time.time() - started
+        cpu = time.process_time() - cpu_started
+
+        received = sum(os.path.getsize(os.path.join(raw_dir, name)) for name in os.listdir(raw_dir))
+        return wall, cpu, received / 1024.0 / 1024.0
+    finally:
+        SshGetter.clear_pool()
+        SshGetter.pool.clear()
+        server.terminate()
+        server.wait()
+        shutil.rmtree(work_dir)
+
+
+def bench(options):
+    logging.basicConfig(level=logging.WARNING)
+    print('%6s %8s %10s %10s %10s %12s %10s' % ('hosts', 'KB/cmd', 'MB', 'wall s', 'MB/s', 'cpu s/MB', 'max RSS MB'))
+    for hosts in options.hosts:
+        for size in options.sizes:
+            wall, cpu, mb = _bench_run(options, hosts, size)
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+            print('%6d %8d %10.1f %10.2f %10.2f %12.4f %10.1f' % (hosts, size, mb, wall, mb / wall, cpu / mb, rss))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_session_options(subparser):
+        subparser.add_argument('--port', type=int, default=2222, help='first port, one port per simulated host')
+        subparser.add_argument('--latency', type=float, default=0.0, help='seconds before the output of a command')
+        subparser.add_argument('--chunk-size', type=int, default=32768, help='bytes per packet, 0 for one packet')
+        subparser.add_argument('--chunk-delay', type=float, default=0.0, help='seconds between two packets')
+        subparser.add_argument('--replay', nargs='+', default=[], help='recordings of the getters (record_sessions)')
+
+    serve_parser = subparsers.add_parser('serve', help='run the simulated hosts')
+    add_session_options(serve_parser)
+    serve_parser.add_argument('--count', type=int, default=1, help='number of simulated hosts')
+    serve_parser.add_argument('--output-size', type=int, default=64 * 1024, help='bytes of a synthesized output')
+    serve_parser.add_argument('--find-count', type=int, default=100, help='ids listed by a synthesized find')
+    serve_parser.add_argument('--password', default=None, help='accepted password, any if not given')
+    serve_parser.add_argument('--hostname', default='sonus-sim', help='name shown in the shell prompt')
+    serve_parser.add_argument('--login-delay', type=float, default=0.2, help='seconds between banner and prompt')
+    serve_parser.add_argument('--host-key', default=None, help='RSA host key file, generated if not given')
+    serve_parser.set_defaults(func=serve)
+
+    bench_parser = subparsers.add_parser('bench', help='wall time and cpu per MB of the getters')
+    add_session_options(bench_parser)
+    bench_parser.add_argument('--hosts', type=int, nargs='+', default=[1, 4, 16], help='numbers of hosts')
+    bench_parser.add_argument('--sizes', type=int, nargs='+', default=[64, 1024], help='KB per command output')
+    bench_parser.add_argument('--commands', type=int, default=10, help='commands per report')
+    bench_parser.add_argument('--instances', nargs='+', default=['inst1'], help='instances of the report')
+    bench_parser.add_argument('--getter', default='SshSonusGetter', help='getter class of the report')
+    bench_parser.set_defaults(func=bench)
+
+    options = parser.parse_args()
+    options.func(options)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+#!/bin/env python
+import re
+
+from ndml_sonus.scripts.literal_prefilter import has_top_level_alternation
+
+# Many report regexes are whitespace separated columns of a table:
+#   \s*(?P<Name>\S+)\s+(?P<Code>\d+)\s+(?P<State>\S+)\s*\n
+# Their \s can cross lines, so a table is not a list of independent lines,
+# but the first column can only start a match at the start of a token: a
+# match starting inside a token has the same columns after the first one,
+# and the regex was already tried at the start of that token, where it
+# failed. finditer still tries it at every character of every token, which
+# is most of its time on the header lines of small tables. The table regex
+# is the regex with the first column only tried at the start of a token.
+
+# Optional leading whitespace, the first column and the separator after it
+FIRST_COLUMN = re.compile(r'(?P<leading>(?:\\s\*)?)(?P<column>\(\?P<\w+>\\S\+\))(?=\\s\+| \+)')
+
+
+def is_whitespace_table(regex, mode=0):
+    """
+    True if the regex starts with a \\S+ column followed by whitespace and
+    ends with a newline or $, so that its matches start and end outside of
+    tokens.
+    """
+    if mode & re.VERBOSE or has_top_level_alternation(regex):
+        return False
+    if not regex.endswith(('\\n', '\n', '$')) or regex.endswith('\\$'):
+        return False
+    return FIRST_COLUMN.match(regex) is not None
+
+
+def table_regex(regex, mode=0):
+    """
+    The regex with its first column only tried at the start of a token if
+    it is a whitespace table, the regex itself otherwise. Gives the same
+    matches on texts starting at a line.
+    """
+    if not is_whitespace_table(regex, mode):
+        return regex
+    match = FIRST_COLUMN.match(regex)
+    return regex[:match.end('leading')] + r'(?<!\S)' + regex[match.start('column'):]
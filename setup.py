@@ -46,7 +46,9 @@ setup(
         'console_scripts': [
             'getdata_sonus_ssh_VM.py=ndml_sonus.scripts.getdata_sonus_ssh_VM:main',
             'parser_sonus.py=ndml_sonus.scripts.parser_sonus:main',
-            'psx_archive_parser.py=ndml_sonus.scripts.psx_archive_parser:main'
+            'psx_archive_parser.py=ndml_sonus.scripts.psx_archive_parser:main',
+            'regex_guard.py=ndml_sonus.scripts.regex_guard:main',
+            'sonus_simulator.py=ndml_sonus.scripts.sonus_simulator:main'
         ],
 
     }
@@ -0,0 +1,55 @@
+import logging
+import os
+import shutil
+import tempfile
+from types import SimpleNamespace
+
+
+GSX_BLOCK = '\nNode: %(node)s  Date: 2023/07/01 10:11:12 GMT\nZone: %(zone)s\n\n%(output)s\n%%\n\nResult: %(result)s\n'
+
+
+def gsx_block(node, output, zone='Z1', result='Ok'):
+    return GSX_BLOCK % {'node': node, 'output': output, 'zone': zone, 'result': result}
+
+
+def make_report(fields_list, optional_fields=('Zone',), **attributes):
+    report = SimpleNamespace(
+        name='test_report', fields_list=list(fields_list), optional_fields=list(optional_fields),
+        known_unused_fields=[], commands=[], auto_add_date=0, auto_add_report_host=0, check_result=True,
+        second_step_parsers=[]
+    )
+    report.__dict__.update(attributes)
+    return report
+
+
+class RawFiles:
+    """
+    Raw files in a temporary directory and the conf of the parsers reading
+    them, with the parser settings given as keywords.
+    """
+
+    def __init__(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.raw_path = os.path.join(self.tmp_dir, 'host-report.raw')
+
+    def close(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def conf(self, **settings):
+        conf = SimpleNamespace(
+            log=logging.getLogger('tests'),
+            raw_file_name=lambda host, report: self.raw_path,
+            csv_file_name=lambda host, report: os.path.join(self.tmp_dir, 'report.csv'),
+            tmp_file_name=lambda host, report: os.path.join(self.tmp_dir, 'report.tmp'),
+        )
+        conf.__dict__.update(settings)
+        return conf
+
+    def parse(self, klass, text, report, **settings):
+        with open(self.raw_path, 'w') as fd:
+            fd.write(text)
+        parser = klass(self.conf(**settings), SimpleNamespace(name='host'), report)
+        try:
+            return list(parser.parse())
+        finally:
+            parser.report_fd.close()
@@ -0,0 +1,62 @@
+import re
+import unittest
+
+from ndml_sonus.scripts.channel_reader import PromptReader
+
+PROMPT = r'[\w-]+>'
+
+
+def feed_chunks(reader, data, size):
+    """
+    Feeds data in chunks of size bytes, returns the result of every feed.
+    """
+    return [reader.feed(data[start:start + size]) for start in range(0, len(data), size)]
+
+
+class PromptReaderTest(unittest.TestCase):
+    def test_prompt_split_across_chunks(self):
+        output = 'Node : N1\nState : up\nsbc-1> '
+        data = output.encode('utf-8')
+        for size in range(1, len(data) + 1):
+            with self.subTest(size=size):
+                reader = PromptReader(PROMPT, tail_size=16)
+                results = feed_chunks(reader, data, size)
+                # the prompt is only found with its last byte
+                self.assertEqual(results, [False] * (len(results) - 1) + [True])
+                self.assertEqual(reader.text(), output)
+
+    def test_multibyte_character_split_across_chunks(self):
+        output = 'Name : café à €中\nnœud-1> '
+        data = output.encode('utf-8')
+        for size in range(1, len(data) + 1):
+            with self.subTest(size=size):
+                chunks = []
+                reader = PromptReader(PROMPT, tail_size=8, listener=chunks.append)
+                self.assertTrue(feed_chunks(reader, data, size)[-1])
+                self.assertEqual(reader.text(), output)
+                self.assertEqual(''.join(chunks), output)
+
+    def test_prompt_like_text_inside_the_output(self):
+        # a prompt-like text followed by more output than the window
+        output = 'Description : gw> ' + 'x' * 100 + '\nTrailer : gw> ' + 'y' * 60 + '\nsbc-1> '
+        data = output.encode('utf-8')
+        for size in (1, 7, 50, len(data)):
+            with self.subTest(size=size):
+                reader = PromptReader(PROMPT, tail_size=32)
+                results = feed_chunks(reader, data, size)
+                self.assertEqual(results[-1], True)
+                # same answers as the prompt regex on the whole text received so far
+                regex = re.compile(r'%s\s+?$' % PROMPT)
+                expected = [
+                    regex.search(data[:start + size].decode('utf-8')) is not None
+                    for start in range(0, len(data), size)
+                ]
+                self.assertEqual(results, expected)
+                self.assertEqual(reader.text(), output)
+
+    def test_no_prompt(self):
+        reader = PromptReader(PROMPT, tail_size=8)
+        self.assertFalse(reader.feed(b''))
+        self.assertEqual(reader.text(), '')
+        self.assertFalse(reader.feed(b'sbc-1>x'))
+        self.assertEqual(reader.text(), 'sbc-1>x')
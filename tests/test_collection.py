@@ -0,0 +1,129 @@
+import logging
+import threading
+import time
+import unittest
+
+from ndml_sonus.scripts.collection import CollectionEngine
+
+
+class GetException(Exception):
+    pass
+
+
+class Recorder:
+    """
+    Stub tasks recording when they run.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.runs = []
+
+    def task(self, host, duration=0.05, error=None):
+        def run():
+            started = time.time()
+            time.sleep(duration)
+            with self.lock:
+                self.runs.append((host, started, time.time()))
+            if error is not None:
+                raise error
+        return run
+
+
+class CollectionEngineTest(unittest.TestCase):
+    def setUp(self):
+        self.log = logging.getLogger('test_collection')
+        self.recorder = Recorder()
+
+    def engine(self, **kwargs):
+        return CollectionEngine(self.log, recoverable=(GetException,), **kwargs)
+
+    def test_tasks_of_a_host_never_overlap(self):
+        engine = self.engine(max_workers=6)
+        for host in ('h1', 'h2', 'h3'):
+            for i in range(4):
+                engine.add(host, '%s/%d' % (host, i), self.recorder.task(host))
+        engine.run()
+
+        self.assertEqual(len(self.recorder.runs), 12)
+        for host in ('h1', 'h2', 'h3'):
+            runs = sorted((started, ended) for run_host, started, ended in self.recorder.runs if run_host == host)
+            for (_, previous_end), (next_start, _) in zip(runs, runs[1:]):
+                self.assertGreaterEqual(next_start, previous_end)
+        # the hosts ran in parallel
+        first_start = min(started for _, started, _ in self.recorder.runs)
+        self.assertLess(max(ended for _, _, ended in self.recorder.runs) - first_start, 12 * 0.05)
+
+    def test_max_workers_per_host(self):
+        engine = self.engine(max_workers=4, max_workers_per_host=2)
+        for i in range(4):
+            engine.add('h1', 'h1/%d' % i, self.recorder.task('h1', 0.1))
+        engine.run()
+
+        events = sorted([(started, 1) for _, started, _ in self.recorder.runs]
+                        + [(ended, -1) for _, _, ended in self.recorder.runs])
+        running = peak = 0
+        for _, change in events:
+            running += change
+            peak = max(peak, running)
+        self.assertEqual(peak, 2)
+
+    def test_connect_delay(self):
+        engine = self.engine(max_workers=2, connect_delay=0.2)
+        for i in range(3):
+            engine.add('h1', 'h1/%d' % i, self.recorder.task('h1', 0.01))
+        engine.add('h2', 'h2/0', self.recorder.task('h2', 0.01))
+        engine.run()
+
+        runs = sorted((started, ended) for host, started, ended in self.recorder.runs if host == 'h1')
+        for (_, previous_end), (next_start, _) in zip(runs, runs[1:]):
+            self.assertGreaterEqual(next_start - previous_end, 0.19)
+        # the delay is per host
+        h2_start = [started for host, started, _ in self.recorder.runs if host == 'h2'][0]
+        self.assertLess(h2_start - runs[0][0], 0.1)
+
+    def test_fatal_task_stops_the_run(self):
+        engine = self.engine(max_workers=1)
+        engine.add('h1', 'h1/0', self.recorder.task('h1'))
+        fatal = engine.add('h1', 'h1/1', self.recorder.task('h1', error=ValueError('boom')))
+        engine.add('h2', 'h2/0', self.recorder.task('h2'))
+        engine.add('h1', 'h1/2', self.recorder.task('h1'))
+        with self.assertLogs(self.log, 'INFO'):
+            self.assertRaisesRegex(ValueError, 'boom', engine.run)
+
+        self.assertEqual(fatal.status, 'error')
+        self.assertEqual([task.status for task in engine.tasks], ['ok', 'error', 'ok', 'pending'])
+
+    def test_recoverable_error(self):
+        engine = self.engine(max_workers=2)
+        failed = engine.add('h1', 'h1/0', self.recorder.task('h1', error=GetException('no route')))
+        engine.add('h1', 'h1/1', self.recorder.task('h1'))
+        with self.assertLogs(self.log, 'INFO'):
+            engine.run()
+        self.assertEqual([task.status for task in engine.tasks], ['failed', 'ok'])
+        self.assertIsInstance(failed.error, GetException)
+
+        # devmode re-raises it at the end of the run
+        engine = self.engine(max_workers=1, devmode=True)
+        engine.add('h1', 'h1/0', self.recorder.task('h1', error=GetException('no route')))
+        engine.add('h1', 'h1/1', self.recorder.task('h1'))
+        with self.assertLogs(self.log, 'INFO'):
+            self.assertRaises(GetException, engine.run)
+        self.assertEqual([task.status for task in engine.tasks], ['failed', 'pending'])
+
+    def test_log_summary(self):
+        engine = self.engine(max_workers=3)
+        for i in range(3):
+            engine.add('h%d' % i, 'ok/%d' % i, self.recorder.task('h%d' % i))
+        engine.add('h0', 'failed/0', self.recorder.task('h0', error=GetException('down')))
+        engine.add('h1', 'failed/1', self.recorder.task('h1', error=GetException('down')))
+        with self.assertLogs(self.log, 'INFO') as logs:
+            engine.run()
+
+        summary = [line for line in logs.output if 'Run summary' in line]
+        self.assertEqual(len(summary), 1)
+        self.assertIn('5 tasks', summary[0])
+        self.assertIn('(failed=2, ok=3)', summary[0])
+        task_lines = [line for line in logs.output if line.startswith('INFO:test_collection:  ')]
+        self.assertEqual(len(task_lines), 5)
+        self.assertEqual(sum(' down' in line for line in task_lines), 2)
@@ -0,0 +1,82 @@
+import logging
+import random
+import unittest
+
+from ndml_sonus.scripts import sonus_logging
+from ndml_sonus.scripts.benchmarks import legacy_fixed_column_separator, make_two_column_lines
+from ndml_sonus.scripts.field_merger import FieldClashException
+from ndml_sonus.scripts.separators import FixedColumnSeparator, SimpleFixedColumnSeparator
+
+
+def random_lines(rng, count):
+    """
+    Two column lines with nested sections, repeated and clashing fields,
+    values with ':' and lines shorter than the columns.
+    """
+    names = ['Name', 'State', 'Point Code', 'Section']
+    lines = []
+    for _ in range(count):
+        columns = []
+        for _ in range(2):
+            indent = ' ' * rng.choice([1, 2, 4, 6])
+            kind = rng.random()
+            if kind < 0.15:
+                columns.append(indent + rng.choice(names) + ':')
+            elif kind < 0.25:
+                columns.append(indent + 'Time : 10:11:12')
+            elif kind < 0.3:
+                columns.append('')
+            else:
+                columns.append('%s%s : %s' % (indent, rng.choice(names), rng.choice(['1', '2', 'up', 'a b'])))
+        lines.append(columns[0].ljust(rng.choice([30, 41, 45])) + columns[1])
+    return lines
+
+
+class ColumnExtractorTest(unittest.TestCase):
+    def setUp(self):
+        self.log = sonus_logging.log
+        sonus_logging.log = logging.getLogger('tests')
+
+    def tearDown(self):
+        sonus_logging.log = self.log
+
+    @staticmethod
+    def separate_all(separator, lines):
+        results = []
+        for line in lines:
+            try:
+                results.append(separator.try_separate(line))
+            except FieldClashException:
+                results.append(FieldClashException)
+        return results
+
+    def assertSameAsLegacy(self, klass, columns, lines):
+        legacy = legacy_fixed_column_separator(klass, columns)
+        separator = klass(columns)
+        self.assertIsNotNone(separator.extractor)
+        self.assertEqual(self.separate_all(separator, lines), self.separate_all(legacy, lines))
+
+    def test_two_column_layout(self):
+        lines = make_two_column_lines(200)
+        for klass in (FixedColumnSeparator, SimpleFixedColumnSeparator):
+            self.assertSameAsLegacy(klass, [(1, 41), (41, 100)], lines)
+
+        results = self.separate_all(FixedColumnSeparator([(1, 41), (41, 100)]), lines[:2])
+        self.assertEqual(results, [{}, {'Section 0 Nested Field 1': '1', 'Field 1': 'value 1'}])
+
+    def test_random_lines(self):
+        rng = random.Random(22)
+        for layout in ([(1, 41), (41, 100)], [(0, 30), (30, 80)], [(1, 45), (40, 100)], [(1, 20), (20, 41), (41, 60)]):
+            lines = random_lines(rng, 500)
+            for klass in (FixedColumnSeparator, SimpleFixedColumnSeparator):
+                with self.subTest(klass=klass.__name__, layout=layout):
+                    self.assertSameAsLegacy(klass, layout, lines)
+
+    def test_clash(self):
+        separator = SimpleFixedColumnSeparator([(1, 41), (41, 100)])
+        line = ' Name : a'.ljust(41) + 'Name : b'
+        self.assertRaises(FieldClashException, separator.try_separate, line)
+        # a repeat is a single field
+        line = ' Name : a'.ljust(41) + 'Name : a'
+        self.assertIsNone(separator.try_separate(line))
+        self.assertEqual(FixedColumnSeparator([(1, 41), (41, 100)]).try_separate(line), {'Name': 'a'})
@@ -0,0 +1,157 @@
+import logging
+import re
+import threading
+import time
+import unittest
+from io import StringIO
+from types import SimpleNamespace
+
+from ndml_sonus.scripts.channel_reader import IncrementalMatcher
+from ndml_sonus.scripts.command_tree import CommandTreeExpander
+
+PEER_REGEX = re.compile(r'Peer_Id\s*:\s*(?P<Peer>\S+)\s*\n\s*Zone\s*:\s*(?P<Zone>\d+)', re.MULTILINE | re.DOTALL)
+
+
+def peer_text(count):
+    return ''.join('Peer_Id : peer%d\n  Zone : %d\nOther : x\n' % (i, i % 7) for i in range(count))
+
+
+class IncrementalMatcherTest(unittest.TestCase):
+    def feed_chunks(self, text, size, holdback):
+        matches = []
+        matcher = IncrementalMatcher(PEER_REGEX, lambda match: matches.append(match.groupdict()), holdback)
+        for start in range(0, len(text), size):
+            matcher.feed(text[start:start + size])
+        return matches
+
+    def test_every_split_size(self):
+        text = peer_text(12)
+        for holdback in (40, 200):
+            # matches ending in the last holdback chars are left to the complete output
+            expected = [
+                match.groupdict() for match in PEER_REGEX.finditer(text) if match.end() <= len(text) - holdback
+            ]
+            self.assertTrue(expected)
+            for size in range(1, len(text) + 1):
+                with self.subTest(holdback=holdback, size=size):
+                    self.assertEqual(self.feed_chunks(text, size, holdback), expected)
+
+    def test_every_split_point(self):
+        # the first chunk ends anywhere inside or around a match
+        text = 'noise ' * 10 + peer_text(1) + 'noise ' * 10
+        for split in range(len(text) + 1):
+            matches = []
+            matcher = IncrementalMatcher(PEER_REGEX, lambda match: matches.append(match.group('Peer')), 30)
+            matcher.feed(text[:split])
+            matcher.feed(text[split:])
+            self.assertEqual(matches, ['peer0'], split)
+
+
+class FakeWorker:
+    """
+    Getter stub answering the commands from a dict, feeding the output to the
+    listener in small chunks.
+    """
+
+    def __init__(self, outputs, executed, chunk_size=7):
+        self.conf = SimpleNamespace(log=logging.getLogger('test_command_tree'))
+        self.context = 'host/report'
+        self.commands_and_regexps = [
+            ('find A', r'A_Id\s*:\s*(?P<A>\S+)\s*\n'),
+            ('find B %(A)s', r'B_Id\s*:\s*(?P<B>\S+)\s*\n'),
+            ('show %(B)s', 'Not used'),
+        ]
+        self.outputs = outputs
+        self.executed = executed
+        self.chunk_size = chunk_size
+        self.output_listener = None
+        self.incremental_state = None
+        self.command_stats = []
+        self.slept = 0.0
+        self.chan = SimpleNamespace(close=lambda: None)
+
+    def _clone_on_new_channel(self):
+        return FakeWorker(self.outputs, self.executed, self.chunk_size)
+
+    def _run_command(self, command):
+        self.executed.append(command)
+        output = self.outputs[command]
+        for start in range(0, len(output), self.chunk_size):
+            if self.output_listener is not None:
+                self.output_listener(output[start:start + self.chunk_size])
+            time.sleep(0.001)
+        self.command_stats.append((command, 0.0, 0.0, len(output)))
+        return output
+
+    def _cached_output(self, command):
+        return None
+
+
+def make_outputs():
+    outputs = {'find A': ''.join('A_Id : a%d\n' % i for i in (1, 2, 3, 2))}
+    for a in ('a1', 'a2', 'a3'):
+        # b0 is listed under every a
+        outputs['find B %s' % a] = ''.join('B_Id : %s\n' % b for b in ('b0', '%s_b1' % a, '%s_b2' % a))
+    for b in ['b0'] + ['a%d_b%d' % (a, b) for a in (1, 2, 3) for b in (1, 2)]:
+        outputs['show %s' % b] = 'Name : %s\nState : up\n' % b
+    return outputs
+
+
+class CommandTreeExpanderTest(unittest.TestCase):
+    def expand(self, channels, holdback=1024):
+        executed = []
+        getter = FakeWorker(make_outputs(), executed)
+        expander = CommandTreeExpander(getter, channels, holdback)
+        sink = StringIO()
+        with self.assertLogs('test_command_tree', 'INFO'):
+            received = expander.run(sink)
+        self.assertEqual(received, len(sink.getvalue()))
+        return expander, sink.getvalue(), executed, getter
+
+    def test_same_tree_on_any_number_of_channels(self):
+        expander, output, executed, getter = self.expand(1)
+        self.assertEqual(expander.children['find A'], ['find B a1', 'find B a2', 'find B a3', 'find B a2'])
+        self.assertEqual(len(executed), 11)
+        self.assertEqual(output.count('Name : b0\n'), 1)
+        self.assertTrue(output.startswith('A_Id : a1\n'))
+
+        for channels in (2, 3, 8):
+            for holdback in (1024, 12):
+                with self.subTest(channels=channels, holdback=holdback):
+                    parallel, parallel_output, parallel_executed, parallel_getter = self.expand(channels, holdback)
+                    self.assertEqual(parallel_output, output)
+                    self.assertEqual(parallel.children, expander.children)
+                    self.assertEqual(parallel.level_of, expander.level_of)
+                    # duplicate commands are executed once
+                    self.assertEqual(sorted(parallel_executed), sorted(executed))
+                    self.assertEqual(len(parallel_getter.command_stats), len(executed))
+
+    def test_channels_overlap(self):
+        executed = []
+        getter = FakeWorker(make_outputs(), executed)
+        running = []
+        peak = []
+        lock = threading.Lock()
+        run_command = FakeWorker._run_command
+
+        def tracked(worker, command):
+            with lock:
+                running.append(command)
+                peak.append(len(running))
+            try:
+                return run_command(worker, command)
+            finally:
+                with lock:
+                    running.remove(command)
+
+        FakeWorker._run_command = tracked
+        self.addCleanup(setattr, FakeWorker, '_run_command', run_command)
+        with self.assertLogs('test_command_tree', 'INFO'):
+            CommandTreeExpander(getter, 3).run(StringIO())
+        self.assertGreater(max(peak), 1)
+
+    def test_error_stops_the_expansion(self):
+        outputs = make_outputs()
+        del outputs['find B a2']
+        getter = FakeWorker(outputs, [])
+        self.assertRaises(KeyError, CommandTreeExpander(getter, 3).run, StringIO())
@@ -0,0 +1,38 @@
+import unittest
+
+from ndml_sonus.scripts.benchmarks import legacy_composite_separate, make_lset_output, make_sgx_rset_output
+from ndml_sonus.scripts.separators import CompositeSeparator, FullTextRegexSeparator
+from ndml_sonus.scripts.sgx_parsers import SgxLsetParser, SgxRsetParser
+
+
+class CompositeSeparatorTest(unittest.TestCase):
+    def test_same_rows_as_before(self):
+        for composite, text, rows in (
+            (SgxRsetParser.command_separator, make_sgx_rset_output(5, 3), 15),
+            (SgxLsetParser.command_separator, make_lset_output(4, 2), 8),
+        ):
+            expected = list(legacy_composite_separate(composite, text))
+            self.assertEqual(len(expected), rows)
+            self.assertEqual(list(composite.separate(text)), expected)
+            self.assertEqual(composite.try_separate(text), expected)
+
+    def test_rows_do_not_share_fields(self):
+        rows = list(SgxRsetParser.command_separator.separate(make_sgx_rset_output(1, 2)))
+        rows[0]['Extra'] = 'x'
+        self.assertNotIn('Extra', rows[1])
+
+    def test_from_levels(self):
+        text = 'A1 [B1 (c1 c2) B2 (c3)] A2 [B3 (c4)] A3 []'
+        composite = CompositeSeparator.from_levels(
+            FullTextRegexSeparator(r'(?P<A>A\d) \[(?P<b_text>[^\]]*)\]'),
+            ('b_text', FullTextRegexSeparator(r'(?P<B>B\d) \((?P<c_text>[^)]*)\)')),
+            ('c_text', FullTextRegexSeparator(r'(?P<C>c\d)')),
+        )
+        self.assertEqual(list(composite.separate(text)), [
+            {'A': 'A1', 'B': 'B1', 'C': 'c1'},
+            {'A': 'A1', 'B': 'B1', 'C': 'c2'},
+            {'A': 'A1', 'B': 'B2', 'C': 'c3'},
+            {'A': 'A2', 'B': 'B3', 'C': 'c4'},
+        ])
+        self.assertIsNone(composite.try_separate('nothing'))
+        self.assertIs(CompositeSeparator.from_levels(composite), composite)
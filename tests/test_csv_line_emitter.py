@@ -0,0 +1,98 @@
+import logging
+import unittest
+from collections import Counter
+
+from ndml_sonus.scripts.common import AutoFieldsAdder, CsvLineEmitter, NonOptionalParameterNotFoundException
+from ndml_sonus.scripts.record import RecordSchema
+from tests.helpers import make_report
+
+FIELDS = ['Node', 'Zone', 'Report Host', 'Name', 'State']
+
+ROWS = [
+    {'Node': 'N1', 'Zone': 'Z1', 'Name': 'a', 'State': 'up'},
+    # missing optional field
+    {'Node': 'N1', 'Name': 'b', 'State': 'up'},
+    # unused fields, new and known
+    {'Node': 'N2', 'Zone': 'Z2', 'Name': 'c', 'State': 'down', 'Extra': 'x', 'Known': 'k'},
+    {'Node': 'N2', 'Name': 'd', 'State': 'down', 'Known': 'k'},
+]
+
+EXPECTED = [
+    ['N1', 'Z1', 'host', 'a', 'up'],
+    ['N1', '', 'host', 'b', 'up'],
+    ['N2', 'Z2', 'host', 'c', 'down'],
+    ['N2', '', 'host', 'd', 'down'],
+]
+
+
+class CsvLineEmitterTest(unittest.TestCase):
+    def setUp(self):
+        self.log = logging.getLogger('tests')
+        self.report = make_report(FIELDS, auto_add_report_host=1, known_unused_fields=['Known'])
+        self.auto_fields_adder = AutoFieldsAdder(self.report, 'host', self.log)
+        self.emitter = CsvLineEmitter(self.report, self.log, self.auto_fields_adder)
+
+    def emit(self, rows, as_record=None):
+        lines = []
+        for row in rows:
+            row = dict(row)
+            self.auto_fields_adder.add_auto_fields(row)
+            if as_record is not None:
+                row = as_record.record(row)
+            lines.append(self.emitter.emit_line_from_dict(row))
+        return lines
+
+    def assertStatistics(self):
+        self.assertEqual(self.emitter.rows, 4)
+        self.assertEqual(self.emitter.missing_optional_fields, Counter({'Zone': 2}))
+        self.assertEqual(self.emitter.unused_fields, Counter({'Known': 2, 'Extra': 1}))
+
+    def test_dict_path(self):
+        self.assertEqual(self.emit(ROWS), EXPECTED)
+        self.assertStatistics()
+
+    def test_record_fast_path(self):
+        self.assertEqual(self.emit(ROWS, self.emitter.record_schema), EXPECTED)
+        self.assertStatistics()
+
+    def test_record_of_another_schema(self):
+        self.assertEqual(self.emit(ROWS, RecordSchema(['Name', 'Node', 'Extra'])), EXPECTED)
+        self.assertStatistics()
+
+    def test_rows_do_not_share_the_values(self):
+        row = dict(ROWS[0])
+        self.auto_fields_adder.add_auto_fields(row)
+        record = self.emitter.record_schema.record(row)
+        line = self.emitter.emit_line_from_dict(record)
+        line[0] = 'changed'
+        self.assertEqual(record['Node'], 'N1')
+
+    def test_missing_non_optional_fields(self):
+        for schema in (None, self.emitter.record_schema):
+            with self.subTest(record=schema is not None):
+                rows = [{'Node': 'N1', 'Zone': 'Z1'}]
+                self.assertRaisesRegex(
+                    NonOptionalParameterNotFoundException, r"test_report : Non-optional params \['Name', 'State'\]",
+                    self.emit, rows, schema
+                )
+
+    def test_missing_field_path(self):
+        line = self.emitter.emit_line_with_missing_fields({'Node': 'N1', 'Report Host': 'h', 'Name': 'a', 'State': 's'})
+        self.assertEqual(line, ['N1', '', 'h', 'a', 's'])
+        self.assertEqual(self.emitter.missing_optional_fields, Counter({'Zone': 1}))
+
+    def test_log_statistics(self):
+        self.emit(ROWS)
+        with self.assertLogs(self.log, 'DEBUG') as logs:
+            self.emitter.log_statistics('host/test_report')
+        self.assertEqual(logs.output, [
+            'DEBUG:tests:host/test_report: 4 rows, optional fields missing: Zone (2)',
+            'INFO:tests:host/test_report: 4 rows, fields not emitted, probably new in the report: Extra (1)',
+            'DEBUG:tests:host/test_report: known unused fields: Known (2)',
+        ])
+
+    def test_log_statistics_without_new_fields(self):
+        self.emit(ROWS[:2])
+        with self.assertLogs(self.log, 'DEBUG') as logs:
+            self.emitter.log_statistics('host/test_report')
+        self.assertEqual(logs.output, ['DEBUG:tests:host/test_report: 2 rows, optional fields missing: Zone (1)'])
@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from ndml_sonus.scripts.incremental_state import IncrementalState
+
+
+class IncrementalStateTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'psx1_test_report.state.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_collection(self, outputs, sample=0.5):
+        """
+        One run of the getter: executes the commands that are not cached and
+        returns the state and the keys that were executed.
+        """
+        state = IncrementalState(self.path, sample)
+        executed = []
+        for key, output in sorted(outputs.items()):
+            if state.cached_output(key) is None:
+                executed.append(key)
+                state.record(key, output)
+        state.save()
+        return state, executed
+
+    def test_save_and_reload(self):
+        outputs = {IncrementalState.key('psx', 'show %d' % i): 'output %d' % i for i in range(4)}
+        state, executed = self.run_collection(outputs)
+        self.assertEqual(executed, sorted(outputs))
+        self.assertEqual(state.stats['new'], 4)
+        self.assertEqual([f for f in os.listdir(self.directory) if f.startswith('.state-')], [])
+
+        reloaded = IncrementalState(self.path, 0.5)
+        self.assertEqual(set(reloaded.objects), set(outputs))
+        self.assertEqual(len(reloaded.resample), 2)
+        for key in sorted(set(outputs) - reloaded.resample):
+            self.assertEqual(reloaded.cached_output(key), outputs[key])
+        for key in reloaded.resample:
+            self.assertIsNone(reloaded.cached_output(key))
+
+    def test_sample_rotates_over_all_objects(self):
+        outputs = {IncrementalState.key('psx', 'show %d' % i): 'output %d' % i for i in range(4)}
+        self.run_collection(outputs)
+
+        reshown = set()
+        for _ in range(2):
+            state, executed = self.run_collection(outputs)
+            self.assertEqual(len(executed), 2)
+            self.assertEqual(state.stats['reshown'], 2)
+            self.assertEqual(state.stats['cached'], 2)
+            reshown.update(executed)
+        self.assertEqual(reshown, set(outputs))
+
+    def test_changed_and_removed_objects(self):
+        outputs = {IncrementalState.key('psx', 'show %d' % i): 'output %d' % i for i in range(2)}
+        self.run_collection(outputs)
+
+        del outputs[IncrementalState.key('psx', 'show 0')]
+        outputs[IncrementalState.key('psx', 'show 1')] = 'output 1 changed'
+        outputs[IncrementalState.key('psx', 'show 2')] = 'output 2'
+        state, executed = self.run_collection(outputs, sample=1.0)
+        self.assertEqual(executed, sorted(outputs))
+        self.assertEqual((state.stats['new'], state.stats['reshown'], state.stats['changed']), (1, 1, 1))
+        self.assertEqual(state.removed(), 1)
+        self.assertEqual(set(IncrementalState(self.path).objects), set(outputs))
+
+    def test_other_version_is_ignored(self):
+        with open(self.path, 'w') as fd:
+            fd.write('{"version": 0, "offset": 3, "objects": {"psx:show 1": {}}}')
+        state = IncrementalState(self.path)
+        self.assertEqual((state.objects, state.offset), ({}, 0))
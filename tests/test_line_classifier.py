@@ -0,0 +1,95 @@
+import unittest
+
+from ndml_sonus.scripts.benchmarks import NODE_REGEX, RESULT_REGEX, legacy_classify, make_line_report
+from ndml_sonus.scripts.line_classifier import LineClassifier
+from ndml_sonus.scripts.separators import RegexSeparator
+
+# upper cased and stripped like NodeAndResultParser does
+COMMANDS = [
+    'SHOW TRUNK GROUP ALL ADMIN',
+    'SHOW SS7 NODE (ALL) ADMIN',
+    'SHOW PEER.GROUP * STATUS',
+    'SHOW [A-Z]+ $X|Y',
+    'SHOW TRUNK GROUP ALL ADMIN EXTENDED',
+]
+
+RECORD, IGNORE, NODE, RESULT, OTHER = range(5)
+
+LINES = [
+    ('Local Trunk Name: TG1', RECORD),
+    ('Local Trunk Name: TG2 show trunk group all admin', RECORD),
+    ('  Local Trunk Name: TG3 show trunk group all admin', IGNORE),
+    ('  Local Trunk Name: TG4', OTHER),
+    ('', IGNORE),
+    ('   \t', IGNORE),
+    ('%', IGNORE),
+    ('  %  ', IGNORE),
+    ('%%', OTHER),
+    ('admin> show trunk group all admin', IGNORE),
+    ('admin> SHOW Trunk Group All Admin Extended', IGNORE),
+    ('admin> show ss7 node (all) admin', IGNORE),
+    ('admin> show ss7 node all admin', OTHER),
+    ('admin> show peer.group * status', IGNORE),
+    ('admin> show peerXgroup * status', OTHER),
+    ('admin> show peer.group status', OTHER),
+    ('x show [a-z]+ $x|y x', IGNORE),
+    ('show abc x', OTHER),
+    ('y', OTHER),
+    ('Node: GSX1  Date: 2023/07/03 10:11:12 GMT', NODE),
+    ('Node: GSX1  Date: 2023/07/03 10:11:12 GMT show peer.group * status', IGNORE),
+    ('Node: GSX1', OTHER),
+    ('Result: Ok', RESULT),
+    ('Result: Error 12', RESULT),
+    ('  Result: Ok', OTHER),
+    ('Result:', RESULT),
+    ('Result show trunk group all admin', IGNORE),
+    ('  Field 1 : value          Other Field 1 : value', OTHER),
+]
+
+
+class LineClassifierTest(unittest.TestCase):
+    def setUp(self):
+        self.record_separator = RegexSeparator(r'Local Trunk Name: (?P<Local_Trunk_Name>\S+)')
+        self.node_separator = RegexSeparator(NODE_REGEX)
+        self.result_separator = RegexSeparator(RESULT_REGEX)
+
+    def legacy(self, line, record_separator=True):
+        record_separator = self.record_separator if record_separator else RegexSeparator(r'(?!)')
+        return legacy_classify(line, COMMANDS, record_separator, self.node_separator, self.result_separator)
+
+    def test_same_kind_as_legacy(self):
+        classifier = LineClassifier(COMMANDS, self.node_separator, self.result_separator, self.record_separator)
+        for line, kind in LINES:
+            for end in ('', '\n'):
+                with self.subTest(line=line + end):
+                    self.assertEqual(self.legacy(line + end), kind)
+                    self.assertEqual(classifier.classify(line + end)[0], kind)
+
+    def test_without_record_separator(self):
+        classifier = LineClassifier(COMMANDS, self.node_separator, self.result_separator)
+        for line, _ in LINES:
+            with self.subTest(line=line):
+                self.assertEqual(classifier.classify(line)[0], self.legacy(line, record_separator=False))
+
+    def test_fields(self):
+        classifier = LineClassifier(COMMANDS, self.node_separator, self.result_separator, self.record_separator)
+        separators = {RECORD: self.record_separator, NODE: self.node_separator, RESULT: self.result_separator}
+        for line, kind in LINES:
+            with self.subTest(line=line):
+                fields = classifier.classify(line)[1]
+                if kind in separators:
+                    self.assertEqual(fields, separators[kind].separate(line))
+                else:
+                    self.assertIsNone(fields)
+
+    def test_report_lines(self):
+        classifier = LineClassifier(COMMANDS, self.node_separator, self.result_separator, self.record_separator)
+        lines = make_line_report(50)
+        kinds = [classifier.classify(line)[0] for line in lines]
+        self.assertEqual(kinds, [self.legacy(line) for line in lines])
+        self.assertEqual(set(kinds), {RECORD, IGNORE, NODE, RESULT, OTHER})
+
+    def test_no_commands(self):
+        classifier = LineClassifier([], self.node_separator, self.result_separator)
+        self.assertEqual(classifier.classify('admin> show trunk group all admin')[0], OTHER)
+        self.assertEqual(classifier.classify(' % ')[0], IGNORE)
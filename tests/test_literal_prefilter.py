@@ -0,0 +1,97 @@
+import re
+import unittest
+
+from ndml_sonus.scripts import gsx_parsers, psx_parsers, sgx_parsers
+from ndml_sonus.scripts.benchmarks import (
+    make_admin_output, make_e1_profile_output, make_lset_output, make_peer_group_output
+)
+from ndml_sonus.scripts.literal_prefilter import LiteralPrefilter, literal_anchor, prefiltered
+from ndml_sonus.scripts.separators import RegexSeparator
+from ndml_sonus.scripts.sgx_parsers import SgxLsetSeparator
+
+# Outputs of several reports one after the other, with the header of a block
+# cut short and a literal followed by something else than its fields
+TEXT = (
+    make_admin_output(5, 3) + make_e1_profile_output(2) + make_peer_group_output(5) + make_lset_output(2, 3)
+    + '  ISUP Signaling Group : \n  Ip_Signaling_Peer_Group_Id : PG\n  Sequence_Number : x\n'
+    + '--- LINK SET ---\n\nName   Nbr\n\n'
+    + '\n  SIP Service : SIP1\n  ISUP Service  : IS1   Point Code : 1-1-1\n'
+)
+
+
+def report_regexes():
+    """
+    (name, pattern, mode) of the regexes of the parser classes.
+    """
+    for module in (gsx_parsers, psx_parsers, sgx_parsers):
+        for name, klass in sorted(vars(module).items()):
+            if isinstance(klass, type) and klass.__module__ == module.__name__:
+                regex = getattr(klass, 'regex', None)
+                if isinstance(regex, str) and regex:
+                    yield name, regex, getattr(klass, 'regex_mode', 0)
+
+
+def matches(finditer, text, *args):
+    return [(match.span(), match.groupdict()) for match in finditer(text, *args)]
+
+
+class LiteralPrefilterTest(unittest.TestCase):
+    def assertSameMatches(self, regex, text):
+        prefilter = prefiltered(regex)
+        self.assertEqual(matches(prefilter.finditer, text), matches(regex.finditer, text))
+        for pos, endpos in ((1, len(text)), (len(text) // 3, 2 * len(text) // 3)):
+            self.assertEqual(matches(prefilter.finditer, text, pos, endpos), matches(regex.finditer, text, pos, endpos))
+            self.assertEqual(
+                prefilter.search(text, pos, endpos) and prefilter.search(text, pos, endpos).span(),
+                regex.search(text, pos, endpos) and regex.search(text, pos, endpos).span()
+            )
+
+    def test_report_regexes(self):
+        prefiltered_count = 0
+        for name, regex, mode in report_regexes():
+            with self.subTest(name):
+                compiled = re.compile(regex, mode)
+                prefiltered_count += isinstance(prefiltered(compiled), LiteralPrefilter)
+                self.assertSameMatches(compiled, TEXT)
+                self.assertSameMatches(re.compile(regex.encode('utf-8'), mode), TEXT.encode('utf-8'))
+        self.assertGreater(prefiltered_count, 10)
+
+    def test_samples_have_matches(self):
+        lset_separator = SgxLsetSeparator().parent_separator
+        peer_group_parser = psx_parsers.PsxIpSignalingPeerGroupDataParser
+        for regex, mode, count in (
+            (gsx_parsers.E1ProfileParser.regex, gsx_parsers.E1ProfileParser.regex_mode, 2),
+            (gsx_parsers.IsupSignalingGroupParser.regex, 0, 5),
+            (peer_group_parser.regex, peer_group_parser.regex_mode, 5),
+            (lset_separator.regex_str, lset_separator.mode, 2),
+        ):
+            compiled = re.compile(regex, mode)
+            self.assertIsInstance(prefiltered(compiled), LiteralPrefilter)
+            self.assertEqual(len(matches(prefiltered(compiled).finditer, TEXT)), count)
+
+    def test_literal_anchor(self):
+        self.assertEqual(literal_anchor(r'\s*ISUP Signaling Group : (?P<G>\S+)'), (['\\s*'], 'ISUP Signaling Group : '))
+        self.assertEqual(literal_anchor(r'\n\s+Version\.ID'), (['\n', '\\s+'], 'Version.ID'))
+        # the last character is repeated, it is not part of the literal
+        self.assertEqual(literal_anchor(r'---+ (?P<A>\S+)'), ([], '--'))
+        self.assertIsNone(literal_anchor(r'Zone: (?P<A>\S+)|Node: (?P<B>\S+)'))
+        self.assertIsNone(literal_anchor(r'\s*(?P<Name>\S+)\s+'))
+        self.assertIsNone(literal_anchor(r'\s{2}Name'))
+
+    def test_flags_left_alone(self):
+        compiled = re.compile(r'\s*Zone: (?P<Zone>\S+)', re.IGNORECASE)
+        self.assertIs(prefiltered(compiled), compiled)
+
+    def test_leading_whitespace_runs(self):
+        # the match can start anywhere in the whitespace before the literal
+        compiled = re.compile(r' \s Zone: (?P<Zone>\S+)')
+        self.assertSameMatches(compiled, 'a   Zone: Z1\n\n Zone: Z2\n  \t Zone: Z3\nZone: Z4')
+        compiled = re.compile(r'\n?\s+?Zone: (?P<Zone>\S+)')
+        self.assertSameMatches(compiled, 'a   Zone: Z1\n\n Zone: Z2\n  \t Zone: Z3\nZone: Z4')
+
+    def test_regex_separator(self):
+        separator = RegexSeparator(gsx_parsers.IsupSignalingGroupParser.regex)
+        compiled = re.compile(gsx_parsers.IsupSignalingGroupParser.regex)
+        for line in TEXT.split('\n'):
+            match = compiled.match(line)
+            self.assertEqual(separator.try_separate(line), match.groupdict() if match is not None else None)
@@ -0,0 +1,42 @@
+import re
+import unittest
+
+from ndml_sonus.scripts.common import RegexFullTextParser
+from tests.helpers import RawFiles, gsx_block, make_report
+
+
+class SpacedParser(RegexFullTextParser):
+    regex = r'^(?P<Name>\w+)\s+(?P<Value>\d+)$'
+    regex_mode = re.MULTILINE
+
+
+class MmapParseTest(unittest.TestCase):
+    def setUp(self):
+        self.raw_files = RawFiles()
+        self.addCleanup(self.raw_files.close)
+        self.report = make_report(['Node', 'Date', 'Zone', 'Name', 'Value'])
+
+    def assertSameAsText(self, text, rows):
+        self.assertEqual(self.raw_files.parse(SpacedParser, text, self.report), rows)
+        self.assertEqual(self.raw_files.parse(SpacedParser, text, self.report, mmap_parse=1), rows)
+
+    def test_ascii_file(self):
+        self.assertSameAsText(gsx_block('N1', 'a 1\nb\t2') + gsx_block('N2', 'c  3'), [
+            ['N1', '2023/07/01 10:11:12', 'Z1', 'a', '1'],
+            ['N1', '2023/07/01 10:11:12', 'Z1', 'b', '2'],
+            ['N2', '2023/07/01 10:11:12', 'Z1', 'c', '3'],
+        ])
+
+    def test_text_only_characters(self):
+        # \s of a str regex matches the separators \x1c-\x1f, the one of a
+        # bytes regex does not
+        for separator in '\x1c\x1d\x1e\x1f':
+            with self.subTest(separator=repr(separator)):
+                self.assertSameAsText(gsx_block('N1', 'a%s1\nb 2' % separator), [
+                    ['N1', '2023/07/01 10:11:12', 'Z1', 'a', '1'],
+                    ['N1', '2023/07/01 10:11:12', 'Z1', 'b', '2'],
+                ])
+        self.assertSameAsText(gsx_block('N1', 'caf\xe9 1\nb\xa02'), [
+            ['N1', '2023/07/01 10:11:12', 'Z1', 'caf\xe9', '1'],
+            ['N1', '2023/07/01 10:11:12', 'Z1', 'b', '2'],
+        ])
@@ -0,0 +1,137 @@
+import logging
+import random
+import re
+import unittest
+
+from ndml_sonus.scripts.common import (
+    AutoFieldsAdder, CsvLineEmitter, NonOptionalParameterNotFoundException, RegexFullTextParser
+)
+from ndml_sonus.scripts.record import RecordSchema
+from ndml_sonus.scripts.second_step import SecondStepParser
+from tests.helpers import RawFiles, gsx_block, make_report
+
+FIELDS = ['Node', 'Date', 'Zone', 'Report Host', 'Name', 'Point_Code']
+
+
+class PointCodeParser(RegexFullTextParser):
+    regex = r'^(?P<Name>\w+) +(?P<Point_Code>\d+-\d+-\d+)(?: +(?P<Extra>\S+))?$'
+    regex_mode = re.MULTILINE
+
+
+class RecordTest(unittest.TestCase):
+    def setUp(self):
+        self.schema = RecordSchema(['A', 'B', 'C', 'D'])
+        self.other_schema = RecordSchema(['B', 'x', 'E'])
+
+    def assertSameMapping(self, record, expected):
+        self.assertEqual(record.to_dict(), expected)
+        self.assertEqual(sorted(record.keys()), sorted(expected))
+        self.assertEqual(len(record), len(expected))
+        for key in ('A', 'B', 'C', 'D', 'x', 'y'):
+            self.assertEqual(key in record, key in expected)
+            self.assertEqual(record.get(key, 'default'), expected.get(key, 'default'))
+
+    def test_dict_operations(self):
+        rng = random.Random(16)
+        keys = ['A', 'B', 'C', 'D', 'x', 'y']
+        for _ in range(200):
+            parent_fields = {key: 'p' + key for key in rng.sample(keys, rng.randint(0, 6))}
+            parent = self.schema.record(parent_fields)
+            fields = {key: 'r' + key for key in rng.sample(keys, rng.randint(0, 6))}
+            record = self.schema.record(fields, parent)
+            expected = dict(parent_fields, **fields)
+            self.assertSameMapping(record, expected)
+
+            for _ in range(10):
+                operation = rng.choice(['set', 'pop', 'update', 'update_from_record', 'getitem'])
+                key = rng.choice(keys)
+                if operation == 'set':
+                    record[key] = expected[key] = rng.random()
+                elif operation == 'pop':
+                    self.assertEqual(record.pop(key, None), expected.pop(key, None))
+                elif operation == 'update':
+                    update = {key: rng.random() for key in rng.sample(keys, rng.randint(1, 6))}
+                    record.update(update)
+                    expected.update(update)
+                elif operation == 'update_from_record':
+                    update = {key: rng.random() for key in rng.sample(keys, rng.randint(1, 6))}
+                    record.update(rng.choice([self.schema, self.other_schema]).record(update))
+                    expected.update(update)
+                elif key in expected:
+                    self.assertEqual(record[key], expected[key])
+                else:
+                    self.assertRaises(KeyError, record.__getitem__, key)
+                self.assertSameMapping(record, expected)
+            # the parent is not changed by its rows
+            self.assertSameMapping(parent, parent_fields)
+
+    def test_record_as_source(self):
+        source = self.other_schema.record({'B': 1, 'x': 2, 'y': 3})
+        self.assertSameMapping(self.schema.record(source), {'B': 1, 'x': 2, 'y': 3})
+        parent = self.schema.record({'A': 0, 'B': 0})
+        self.assertSameMapping(self.schema.record(source, parent), {'A': 0, 'B': 1, 'x': 2, 'y': 3})
+
+        # both update paths, a few fields and most of them
+        for fields in ({'x': 2}, {'A': 1, 'B': 2, 'C': 3, 'x': 4}):
+            record = self.schema.record({'D': 0})
+            record.update(self.other_schema.record(fields))
+            self.assertSameMapping(record, dict(fields, D=0))
+
+    def test_pop_missing(self):
+        record = self.schema.record({'A': 1})
+        self.assertRaises(KeyError, record.pop, 'B')
+        self.assertRaises(KeyError, record.pop, 'x')
+        record.clear()
+        self.assertSameMapping(record, {})
+
+
+class RecordPipelineTest(unittest.TestCase):
+    """
+    The rows parsed as records against the rows built as dicts, the node
+    fields copied into every row.
+    """
+
+    def setUp(self):
+        self.raw_files = RawFiles()
+        self.log = logging.getLogger('tests')
+
+    def tearDown(self):
+        self.raw_files.close()
+
+    def dict_rows(self, report, text):
+        auto_fields_adder = AutoFieldsAdder(report, 'host', self.log)
+        emitter = CsvLineEmitter(report, self.log, auto_fields_adder)
+        second_step_parser = SecondStepParser.create_from_report(report)
+        compiled = re.compile(PointCodeParser.regex, PointCodeParser.regex_mode)
+        rows = []
+        for block in PointCodeParser.separator.separate(text):
+            output = block.pop('CommandOutput')
+            for match in compiled.finditer(output):
+                row = dict(block)
+                row.update({key: value for key, value in match.groupdict().items() if value is not None})
+                auto_fields_adder.add_auto_fields(row)
+                second_step_parser.parse_dict(report, row)
+                rows.append(emitter.emit_line_from_dict(row))
+        return rows
+
+    def test_same_rows_as_dicts(self):
+        text = (
+            gsx_block('N1', 'a 1-2-3\nb 4-5-6 x') + gsx_block('N2', 'c 7-8-9', zone='Z2')
+            + gsx_block('N3', 'd 0-0-1 y\ne 0-1-0')
+        )
+        for second_step_parsers in ([], ['Triple8PointCodeParser']):
+            report = make_report(FIELDS, auto_add_report_host=1, second_step_parsers=second_step_parsers)
+            rows = self.raw_files.parse(PointCodeParser, text, report)
+            self.assertEqual(rows, self.dict_rows(report, text))
+            self.assertEqual(len(rows), 5)
+            self.assertEqual(rows[2][:4], ['N2', '2023/07/01 10:11:12', 'Z2', 'host'])
+
+    def test_missing_fields(self):
+        # no Report Host without auto_add_report_host
+        report = make_report(FIELDS, optional_fields=('Zone', 'Report Host'))
+        text = gsx_block('N1', 'a 1-2-3')
+        rows = self.raw_files.parse(PointCodeParser, text, report)
+        self.assertEqual(rows, [['N1', '2023/07/01 10:11:12', 'Z1', '', 'a', '1-2-3']])
+
+        report = make_report(FIELDS, optional_fields=('Zone',))
+        self.assertRaises(NonOptionalParameterNotFoundException, self.raw_files.parse, PointCodeParser, text, report)
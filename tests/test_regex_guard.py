@@ -0,0 +1,86 @@
+import os
+import re
+import signal
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from ndml_sonus.scripts.common import RegexFullTextParser
+from ndml_sonus.scripts.gsx_parsers import CarrierAdminParser, IsupSignalingGroupParser
+from ndml_sonus.scripts.regex_guard import BlockTimeGuard, RegexTimeLimitExceeded, regex_findings, sample_text
+from tests.helpers import RawFiles, gsx_block, make_report
+
+
+class BacktrackingParser(RegexFullTextParser):
+    # (a+)+ splits a run of a in every possible way before failing
+    regex = r'^(?P<Name>(?:a+)+)!$'
+    regex_mode = re.MULTILINE
+
+
+class RegexAnalyzerTest(unittest.TestCase):
+    def test_ambiguous_repeats(self):
+        self.assertTrue(regex_findings(r'\s*(?P<NIF_Group>\S*)\s*(?P<Traceroute>\S*)\s*\n'))
+        self.assertTrue(regex_findings(r'(?:\d+)+x'))
+        self.assertEqual(regex_findings(r'\s*(?P<Name>\S+)\s+(?P<Code>\d+)\s*\n'), [])
+        self.assertEqual(regex_findings(CarrierAdminParser.regex), [])
+        self.assertEqual(regex_findings('(?P<A>'), ['does not compile: missing ), unterminated subpattern at position 0'])
+
+    def test_sample_text(self):
+        for pattern in (CarrierAdminParser.regex, IsupSignalingGroupParser.regex, BacktrackingParser.regex):
+            text = sample_text(pattern, re.MULTILINE)
+            self.assertIsNotNone(text)
+            self.assertIsNotNone(re.search(pattern, text, re.MULTILINE))
+
+
+class BlockTimeGuardTest(unittest.TestCase):
+    def test_interrupts_backtracking(self):
+        guard = BlockTimeGuard(0.2)
+        self.assertTrue(guard.enabled)
+        started = time.time()
+        self.assertRaises(RegexTimeLimitExceeded, guard.run, re.match, BacktrackingParser.regex, 'a' * 40 + 'b')
+        self.assertLess(time.time() - started, 5)
+        self.assertEqual(signal.getitimer(signal.ITIMER_REAL), (0.0, 0.0))
+        self.assertEqual(guard.run(re.match, BacktrackingParser.regex, 'aaa!').group('Name'), 'aaa')
+
+    def test_alarm_after_the_function_returned(self):
+        guard = BlockTimeGuard(5)
+        setitimer = signal.setitimer
+        self.addCleanup(signal.pthread_sigmask, signal.SIG_UNBLOCK, [signal.SIGALRM])
+
+        def function():
+            # the alarm is held until the guard disarms the timer
+            signal.pthread_sigmask(signal.SIG_BLOCK, [signal.SIGALRM])
+            os.kill(os.getpid(), signal.SIGALRM)
+            return 'result'
+
+        def disarm(which, seconds):
+            if seconds == 0:
+                signal.pthread_sigmask(signal.SIG_UNBLOCK, [signal.SIGALRM])
+            return setitimer(which, seconds)
+
+        with mock.patch('signal.setitimer', disarm):
+            self.assertEqual(guard.run(function), 'result')
+        self.assertEqual(signal.getitimer(signal.ITIMER_REAL), (0.0, 0.0))
+        self.assertEqual(signal.getsignal(signal.SIGALRM), signal.SIG_DFL)
+
+    def test_disabled_without_limit(self):
+        self.assertFalse(BlockTimeGuard(0).enabled)
+        self.assertEqual(BlockTimeGuard(0).run(len, 'abc'), 3)
+
+    def test_quarantined_block(self):
+        raw_files = RawFiles()
+        self.addCleanup(raw_files.close)
+        text = gsx_block('N1', 'aa!') + gsx_block('N2', 'a' * 40 + 'b') + gsx_block('N3', 'aaa!')
+        with open(raw_files.raw_path, 'w') as fd:
+            fd.write(text)
+
+        report = make_report(['Node', 'Date', 'Zone', 'Name'])
+        parser = BacktrackingParser(raw_files.conf(regex_time_limit=0.2), SimpleNamespace(name='host'), report)
+        try:
+            rows = list(parser.parse())
+        finally:
+            parser.report_fd.close()
+        self.assertEqual([row[0] for row in rows], ['N1', 'N3'])
+        self.assertEqual(len(parser.quarantined_blocks), 1)
+        self.assertEqual(text[parser.quarantined_blocks[0]:].lstrip('\n')[:8], 'Node: N2')
@@ -0,0 +1,96 @@
+import os
+import re
+import unittest
+from types import SimpleNamespace
+
+from ndml_sonus.scripts.common import RegexFullTextParser
+from ndml_sonus.scripts.common_exceptions import ParseException
+from ndml_sonus.scripts.report_pool import run_parallel, run_serial
+from tests.helpers import RawFiles, gsx_block, make_report
+
+
+class StateParser(RegexFullTextParser):
+    regex = r'^(?P<Name>\w+) (?P<State>\w+)$'
+    regex_mode = re.MULTILINE
+
+
+def export_report(report, host, conf):
+    """
+    Same steps as process_report: the csv is written to the tmp file and
+    moved in place, failures are logged unless in devmode.
+    """
+    try:
+        parser = StateParser(conf, host, report)
+        parser.export()
+        os.rename(parser.tmp_output_filename, parser.output_filename)
+    except ParseException as e:
+        if conf.devmode:
+            raise
+        conf.log.critical('%s/%s: got parsing exception, skipping: %s' % (host.name, report.name, e))
+
+
+class ReportPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.raw_files = RawFiles()
+        self.addCleanup(self.raw_files.close)
+        self.tasks = []
+        for i in range(6):
+            host = SimpleNamespace(name='host%d' % i)
+            self.tasks.append((make_report(['Node', 'Date', 'Zone', 'Name', 'State']), host))
+            text = ''.join(gsx_block('N%d' % n, 'name%d up\nother%d down' % (n, i)) for n in range(20 * (i + 1)))
+            with open(self.path(host, 'raw'), 'w') as fd:
+                fd.write(text)
+
+    def path(self, host, kind):
+        return os.path.join(self.raw_files.tmp_dir, '%s.%s' % (host.name, kind))
+
+    def conf(self, devmode=False):
+        return self.raw_files.conf(
+            devmode=devmode,
+            raw_file_name=lambda host, report: self.path(host, 'raw'),
+            csv_file_name=lambda host, report: self.path(host, 'csv'),
+            tmp_file_name=lambda host, report: self.path(host, 'tmp'),
+        )
+
+    def csv_files(self):
+        csv = {}
+        for _, host in self.tasks:
+            with open(self.path(host, 'csv')) as fd:
+                csv[host.name] = fd.read()
+            os.unlink(self.path(host, 'csv'))
+        return csv
+
+    def test_same_csv_as_serial(self):
+        conf = self.conf()
+        with self.assertLogs(conf.log, 'INFO'):
+            timings = run_serial(export_report, conf, self.tasks)
+        self.assertEqual([index for index, _ in timings], list(range(6)))
+        expected = self.csv_files()
+        self.assertEqual(expected['host5'].count('\n'), 1 + 2 * 120)
+
+        for jobs in (2, 4):
+            with self.subTest(jobs=jobs):
+                with self.assertLogs(conf.log, 'INFO') as logs:
+                    timings = run_parallel(export_report, conf, self.tasks, jobs)
+                self.assertEqual(sorted(index for index, _ in timings), list(range(6)))
+                self.assertEqual(self.csv_files(), expected)
+                # the records of the workers are written by the parent
+                self.assertEqual(sum('exported' in line for line in logs.output), 6)
+
+    def test_worker_exception_is_logged(self):
+        os.unlink(self.path(self.tasks[2][1], 'raw'))
+        conf = self.conf()
+        with self.assertLogs(conf.log, 'INFO') as logs:
+            timings = run_parallel(export_report, conf, self.tasks, 3)
+        self.assertEqual(len(timings), 6)
+        errors = [line for line in logs.output if line.startswith('CRITICAL:')]
+        self.assertEqual(len(errors), 1)
+        self.assertIn('host2/test_report: got parsing exception, skipping: host2/test_report: I/O error', errors[0])
+        self.assertFalse(os.path.exists(self.path(self.tasks[2][1], 'csv')))
+        self.assertTrue(os.path.exists(self.path(self.tasks[3][1], 'csv')))
+
+    def test_worker_exception_is_raised_in_devmode(self):
+        os.unlink(self.path(self.tasks[2][1], 'raw'))
+        conf = self.conf(devmode=True)
+        with self.assertLogs(conf.log, 'INFO'):
+            self.assertRaisesRegex(ParseException, 'host2.raw', run_parallel, export_report, conf, self.tasks, 3)
@@ -0,0 +1,129 @@
+import unittest
+from types import SimpleNamespace
+
+from ndml_sonus.scripts.benchmarks import legacy_parse_dict, make_ip_signaling_profile_rows
+from ndml_sonus.scripts.record import RecordSchema
+from ndml_sonus.scripts.second_step import SecondStepParser
+
+REPORT = SimpleNamespace(
+    name='psx_ip_signaling_profile',
+    second_step_parsers=['HexadecimalParser', 'LeftPointCodeParser', 'Triple8PointCodeParser', 'DateParser'],
+)
+
+TIME_REPORT = SimpleNamespace(name=REPORT.name, second_step_parsers=REPORT.second_step_parsers + ['TimeParser'])
+
+
+def outcome(function, *args):
+    """
+    None or the type and message of the exception raised by function.
+    """
+    try:
+        function(*args)
+    except Exception as e:
+        return type(e), str(e)
+    return None
+
+
+class SecondStepParserTest(unittest.TestCase):
+    def setUp(self):
+        self.rows = make_ip_signaling_profile_rows(200, distinct=20)
+        # a row without one of the converted fields
+        del self.rows[3]['Point_Code']
+        self.expected = [dict(row) for row in self.rows]
+        field_parsers = SecondStepParser.create_from_report(REPORT).field_parsers
+        for row in self.expected:
+            legacy_parse_dict(field_parsers, REPORT, row)
+
+    def test_parse_dict(self):
+        for memo_size in (0, 8, 4096):
+            parser = SecondStepParser.create_from_report(REPORT, memo_size)
+            rows = [dict(row) for row in self.rows]
+            for row in rows:
+                parser.parse_dict(REPORT, row)
+            self.assertEqual(rows, self.expected)
+
+    def test_parse_batch(self):
+        schema = RecordSchema(self.rows[0])
+        for memo_size in (0, 4096):
+            parser = SecondStepParser.create_from_report(REPORT, memo_size)
+            records = [schema.record(row) for row in self.rows]
+            for start in range(0, len(records), 64):
+                parser.parse_batch(REPORT, records[start:start + 64])
+            self.assertEqual([record.to_dict() for record in records], self.expected)
+
+    def test_memo(self):
+        parser = SecondStepParser.create_from_report(REPORT, 4096)
+        for row in [dict(row) for row in self.rows]:
+            parser.parse_dict(REPORT, row)
+        info = parser.parse_functions[0].cache_info()
+        self.assertEqual(info.currsize, 20)
+        self.assertGreater(info.hits, info.misses)
+
+    def test_errors_are_not_memoized(self):
+        parser = SecondStepParser.create_from_report(REPORT, 4096)
+        for _ in range(2):
+            self.assertRaises(ValueError, parser.parse_dict, REPORT, {'Ip_Sig_Attributes1': 'not hex'})
+
+
+class ParseBatchTest(unittest.TestCase):
+    """
+    parse_batch on records against parse_dict on every row as a dict.
+    """
+
+    def setUp(self):
+        self.rows = make_ip_signaling_profile_rows(100, distinct=10)
+        for i, row in enumerate(self.rows):
+            row['T29'] = '%d Secs' % (i % 4) if i % 3 else '%d minutes' % i
+            row['Unknown'] = 'u%d' % i
+            if i % 5 == 0:
+                del row['Ip_Sig_Attributes2']
+            if i % 7 == 0:
+                del row['Ip_Sig_Attributes8']
+        # Point_Code, Ip_Sig_Attributes8, T29 and Unknown are extras of the records
+        self.schema = RecordSchema(
+            field for field in self.rows[0] if field not in ('Point_Code', 'Ip_Sig_Attributes8', 'T29', 'Unknown')
+        )
+
+    def parse_dicts(self, rows, memo_size):
+        parser = SecondStepParser.create_from_report(TIME_REPORT, memo_size)
+        rows = [dict(row) for row in rows]
+        error = outcome(lambda: [parser.parse_dict(TIME_REPORT, row) for row in rows])
+        return rows, error
+
+    def parse_batches(self, rows, memo_size, batch_size):
+        parser = SecondStepParser.create_from_report(TIME_REPORT, memo_size)
+        records = [self.schema.record(row) for row in rows]
+        error = outcome(lambda: [
+            parser.parse_batch(TIME_REPORT, records[start:start + batch_size])
+            for start in range(0, len(records), batch_size)
+        ])
+        return [record.to_dict() for record in records], error
+
+    def test_same_rows_as_parse_dict(self):
+        for memo_size in (0, 4096):
+            expected, error = self.parse_dicts(self.rows, memo_size)
+            self.assertIsNone(error)
+            self.assertEqual(expected[1]['T29'], 1)
+            self.assertEqual(expected[1]['Unknown'], 'u1')
+            for batch_size in (1, 7, 100):
+                with self.subTest(memo_size=memo_size, batch_size=batch_size):
+                    self.assertEqual(self.parse_batches(self.rows, memo_size, batch_size), (expected, None))
+
+    def test_conversion_errors(self):
+        for field, value in (
+            ('Ip_Sig_Attributes1', 'not hex'),
+            ('Ip_Sig_Attributes8', 'zz'),
+            ('T29', '12 hours'),
+            ('TIMESTAMP', 'yesterday'),
+            ('Point_Code', 'not a point code'),
+        ):
+            rows = [dict(row) for row in self.rows]
+            rows[42][field] = value
+            expected, error = self.parse_dicts(rows, 0)
+            for memo_size in (0, 4096):
+                with self.subTest(field=field, memo_size=memo_size):
+                    self.assertEqual(self.parse_dicts(rows, memo_size)[1], error)
+                    batch_rows, batch_error = self.parse_batches(rows, memo_size, 64)
+                    self.assertEqual(batch_error, error)
+                    if error is None:
+                        self.assertEqual(batch_rows, expected)
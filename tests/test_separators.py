@@ -0,0 +1,94 @@
+import logging
+import re
+import unittest
+
+from ndml_sonus.scripts import sonus_logging
+from ndml_sonus.scripts.benchmarks import make_two_column_lines
+from ndml_sonus.scripts.separators import (
+    AbstractSeparator, FullTextRegexSeparator, NameValueInTwoColumnsSeparator, NoMatchException,
+    SimpleFixedColumnSeparator, SpacedValueSeparator
+)
+
+LINES = [
+    '',
+    '   ',
+    ' Name : a'.ljust(41) + 'State : up',
+    ' Name : a'.ljust(41),
+    ' Name : a'.ljust(41) + 'State: up',
+    ' Name : a'.ljust(41) + 'State : a : b',
+    ' Name'.ljust(41) + 'State : up',
+    ' Time : 10:11:12'.ljust(41) + 'Zone : Z1',
+    ' Point Code          1-2-3',
+    'Point Code  1-2-3  extra',
+    'Point Code 1-2-3',
+    ' Name                    Value',
+    '                         Value only',
+    'Name only',
+    'x',
+]
+
+
+class TrySeparateTest(unittest.TestCase):
+    """
+    try_separate is separate(line) when the separator matches, None when it
+    does not.
+    """
+
+    def setUp(self):
+        self.log = sonus_logging.log
+        sonus_logging.log = logging.getLogger('tests')
+
+    def tearDown(self):
+        sonus_logging.log = self.log
+
+    def assertSameAsSeparate(self, separator, line):
+        result = separator.try_separate(line)
+        self.assertEqual(result, AbstractSeparator.try_separate(separator, line))
+        if separator.matches(line):
+            self.assertIsNotNone(result)
+            self.assertEqual(result, separator.separate(line))
+        else:
+            self.assertIsNone(result)
+        return result
+
+    def test_simple_fixed_column_separator(self):
+        separator = SimpleFixedColumnSeparator([(1, 41), (41, 100)])
+        results = {}
+        for line in LINES + make_two_column_lines(50):
+            with self.subTest(line=line):
+                results[line] = self.assertSameAsSeparate(separator, line)
+        self.assertEqual(results[LINES[2]], {'Name': 'a', 'State': 'up'})
+        # one field for two columns
+        self.assertIsNone(results[LINES[3]])
+        self.assertEqual(separator.separate(LINES[3]), {'Name': 'a'})
+
+    def test_spaced_value_separator(self):
+        separator = SpacedValueSeparator()
+        for line in LINES:
+            with self.subTest(line=line):
+                if self.assertSameAsSeparate(separator, line) is None:
+                    self.assertRaises(NoMatchException, separator.separate, line)
+        self.assertEqual(separator.try_separate(' Point Code          1-2-3'), {'Point Code': '1-2-3'})
+        self.assertIsNone(separator.try_separate('Point Code  1-2-3  extra'))
+
+    def test_name_value_in_two_columns_separator(self):
+        separator = NameValueInTwoColumnsSeparator((1, 25), (25, 100))
+        for line in LINES:
+            with self.subTest(line=line):
+                self.assertSameAsSeparate(separator, line)
+        self.assertEqual(separator.try_separate(' Name                    Value'), {'Name': 'Value'})
+        self.assertIsNone(separator.try_separate('                         Value only'))
+        # without a name separate still returns the value
+        self.assertEqual(separator.separate('                         Value only'), {'': 'Value only'})
+
+    def test_full_text_regex_separator(self):
+        separator = FullTextRegexSeparator(r'^(?P<Name>\w+) : (?P<Value>\S+)$', re.MULTILINE)
+        for text in LINES + ['\n'.join(LINES), 'a : 1\nb : 2\nc : x y']:
+            with self.subTest(text=text):
+                result = separator.try_separate(text)
+                separated = list(separator.separate(text))
+                self.assertEqual(result, separated or None)
+                self.assertEqual(result is not None, separator.matches(text))
+        self.assertEqual(separator.try_separate('a : 1\nb : 2\nc : x y'), [
+            {'Name': 'a', 'Value': '1'}, {'Name': 'b', 'Value': '2'}
+        ])
@@ -0,0 +1,203 @@
+import logging
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+from ndml_sonus.scripts.channel_reader import PromptReader
+from ndml_sonus.scripts.session_broker import BrokerChannel, SessionBroker, get_broker_stats
+
+
+class FakeShell(threading.Thread):
+    """
+    Switch side of a session: answers every command line with its output and
+    the prompt. 'slow' answers late, 'hang' never answers again and 'exit'
+    closes the session.
+    """
+
+    def __init__(self, sock):
+        super(FakeShell, self).__init__(daemon=True)
+        self.sock = sock
+        self.hung = False
+
+    def run(self):
+        data = b''
+        while True:
+            try:
+                chunk = self.sock.recv(4096)
+            except OSError:
+                return
+            if not chunk:
+                return
+            data += chunk
+            while b'\n' in data:
+                line, data = data.split(b'\n', 1)
+                command = line.decode()
+                if command == 'exit':
+                    self.sock.close()
+                    return
+                if command == 'hang' or self.hung:
+                    self.hung = True
+                elif command == 'slow':
+                    time.sleep(0.5)
+                    self.sock.sendall(b'late output\r\nswitch> ')
+                elif command:
+                    self.sock.sendall(('%s output\r\nswitch> ' % command).encode())
+                else:
+                    self.sock.sendall(b'\r\nswitch> ')
+
+
+class FakeChannel:
+    def __init__(self, sock):
+        self.sock = sock
+        self.closed = False
+        self.eof_received = False
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def recv_ready(self):
+        return False
+
+    def recv(self, size):
+        data = self.sock.recv(size)
+        if not data:
+            self.eof_received = True
+        return data
+
+    def send(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        self.sock.sendall(data)
+        return len(data)
+
+    sendall = send
+
+    def close(self):
+        self.closed = True
+        self.sock.close()
+
+
+class FakeTransport:
+    def __init__(self):
+        self.closed = False
+
+    def is_active(self):
+        return not self.closed
+
+    def close(self):
+        self.closed = True
+
+
+class FakeLogin:
+    def __init__(self):
+        self.resolved = 0
+        self.logins = 0
+        self.channels = []
+        self.shells = []
+
+    def resolve(self, request):
+        self.resolved += 1
+        return request['host'], r'switch>', self.login
+
+    def login(self):
+        self.logins += 1
+        broker_end, shell_end = socket.socketpair()
+        self.shells.append(FakeShell(shell_end))
+        self.shells[-1].start()
+        self.channels.append(FakeChannel(broker_end))
+        return FakeTransport(), self.channels[-1]
+
+
+def run_command(chan, command):
+    chan.send(command + '\n')
+    reader = PromptReader('switch>')
+    chan.settimeout(5)
+    while not reader.feed(chan.recv(4096)):
+        pass
+    return reader.text()
+
+
+class SessionBrokerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.directory, 'broker.sock')
+        self.login = FakeLogin()
+        self.broker = SessionBroker(logging.getLogger('test_session_broker'), self.socket_path, self.login,
+                                    health_interval=60, drain_timeout=2)
+        self.thread = threading.Thread(target=self.broker.serve_forever, daemon=True)
+        self.thread.start()
+        while not os.path.exists(self.socket_path):
+            time.sleep(0.01)
+
+    def tearDown(self):
+        self.broker.stop()
+        self.thread.join()
+        shutil.rmtree(self.directory)
+
+    def lease(self):
+        return BrokerChannel(self.socket_path, {'host': 'gsx1', 'report': 'test_report'})
+
+    def wait_idle(self, count):
+        deadline = time.time() + 5
+        while self.broker.get_stats()['idle_sessions'] != count and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.broker.get_stats()['idle_sessions'], count)
+
+    def assertReleasedSessionClosed(self, command):
+        chan = self.lease()
+        chan.send(command + '\n')
+        chan.close()
+        deadline = time.time() + 5
+        while not self.login.channels[0].closed and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(self.login.channels[0].closed)
+        self.assertEqual(self.broker.get_stats()['idle_sessions'], 0)
+
+        chan = self.lease()
+        self.assertFalse(chan.reused)
+        self.assertIn('show output', run_command(chan, 'show'))
+        chan.close()
+        self.assertEqual(self.login.logins, 2)
+
+    def test_lease_and_release(self):
+        chan = self.lease()
+        self.assertFalse(chan.reused)
+        self.assertIn('first output', run_command(chan, 'first'))
+        chan.close()
+        self.wait_idle(1)
+
+        chan = self.lease()
+        self.assertTrue(chan.reused)
+        self.assertIn('second output', run_command(chan, 'second'))
+        chan.close()
+        self.wait_idle(1)
+
+        self.assertEqual(self.login.logins, 1)
+        # one resolve per lease
+        self.assertEqual(self.login.resolved, 2)
+        stats = get_broker_stats(self.socket_path)
+        self.assertEqual((stats['leases'], stats['hits'], stats['logins']), (2, 1, 1))
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+    def test_late_output_does_not_leak(self):
+        chan = self.lease()
+        chan.send('slow\n')
+        chan.close()
+        self.wait_idle(1)
+
+        chan = self.lease()
+        self.assertTrue(chan.reused)
+        output = run_command(chan, 'show')
+        chan.close()
+        self.assertNotIn('late output', output)
+        self.assertIn('show output', output)
+
+    def test_session_without_prompt_is_closed(self):
+        self.assertReleasedSessionClosed('hang')
+
+    def test_session_closed_by_the_switch(self):
+        self.assertReleasedSessionClosed('exit')
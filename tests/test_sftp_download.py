@@ -0,0 +1,121 @@
+import hashlib
+import io
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from ndml_sonus.scripts.sftp_download import DownloadException, SftpDownloader
+
+
+class FakeRemoteFile(io.BytesIO):
+    def __init__(self, data, client):
+        io.BytesIO.__init__(self, data)
+        self.client = client
+
+    def prefetch(self, file_size=None):
+        # Signature of paramiko 2.11, the version of setup.py
+        self.client.prefetched.append((self.tell(), file_size))
+
+
+class FakeRemoteFileWithLimit(FakeRemoteFile):
+    def prefetch(self, file_size=None, max_concurrent_requests=None):
+        self.client.prefetched.append((self.tell(), file_size, max_concurrent_requests))
+
+
+class FakeSFTPClient:
+    """
+    The stat and open calls of paramiko.SFTPClient used by SftpDownloader.
+    """
+
+    def __init__(self, data, mtime=1000, file_class=FakeRemoteFile, fail_after=None):
+        self.data = data
+        self.mtime = mtime
+        self.file_class = file_class
+        self.fail_after = fail_after
+        self.prefetched = []
+        self.reads = 0
+
+    def stat(self, path):
+        return SimpleNamespace(st_size=len(self.data), st_mtime=self.mtime)
+
+    def open(self, path, mode):
+        data = self.data if self.fail_after is None else self.data[:self.fail_after]
+        return self.file_class(data, self)
+
+
+class SftpDownloaderTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.work_dir = os.path.join(self.tmp_dir, 'work')
+        os.mkdir(self.work_dir)
+        self.local_path = os.path.join(self.tmp_dir, 'export.csv')
+        self.downloader = SftpDownloader(logging.getLogger(__name__), 'test', self.work_dir, block_size=7, max_requests=3)
+        self.data = bytes(range(256)) * 40
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def read_local(self):
+        with open(self.local_path, 'rb') as fd:
+            return fd.read()
+
+    def manifest_md5(self):
+        return self.downloader._read_manifest(self.downloader._work_path(self.local_path, '.manifest'))['md5']
+
+    def test_download(self):
+        sftp = FakeSFTPClient(self.data)
+        self.assertEqual(self.downloader.download(sftp, '/remote/export.csv', self.local_path), len(self.data))
+        self.assertEqual(self.read_local(), self.data)
+        self.assertEqual(self.manifest_md5(), hashlib.md5(self.data).hexdigest())
+        self.assertEqual(sftp.prefetched, [(0, len(self.data))])
+
+    def test_prefetch_limit(self):
+        sftp = FakeSFTPClient(self.data, file_class=FakeRemoteFileWithLimit)
+        self.downloader.download(sftp, '/remote/export.csv', self.local_path)
+        self.assertEqual(sftp.prefetched, [(0, len(self.data), 3)])
+
+    def test_unchanged(self):
+        sftp = FakeSFTPClient(self.data)
+        self.downloader.download(sftp, '/remote/export.csv', self.local_path)
+        self.assertEqual(self.downloader.download(sftp, '/remote/export.csv', self.local_path), 0)
+        self.assertEqual(len(sftp.prefetched), 1)
+
+    def test_changed_remote(self):
+        self.downloader.download(FakeSFTPClient(self.data), '/remote/export.csv', self.local_path)
+        changed = self.data[::-1]
+        self.downloader.download(FakeSFTPClient(changed, mtime=2000), '/remote/export.csv', self.local_path)
+        self.assertEqual(self.read_local(), changed)
+
+    def test_corrupted_local_copy(self):
+        sftp = FakeSFTPClient(self.data)
+        self.downloader.download(sftp, '/remote/export.csv', self.local_path)
+        with open(self.local_path, 'r+b') as fd:
+            fd.write(b'garbage')
+        self.assertEqual(self.downloader.download(sftp, '/remote/export.csv', self.local_path), len(self.data))
+        self.assertEqual(self.read_local(), self.data)
+
+    def test_resume(self):
+        with self.assertRaises(DownloadException):
+            self.downloader.download(FakeSFTPClient(self.data, fail_after=1000), '/remote/export.csv', self.local_path)
+        self.assertFalse(os.path.exists(self.local_path))
+
+        sftp = FakeSFTPClient(self.data)
+        self.assertEqual(self.downloader.download(sftp, '/remote/export.csv', self.local_path), len(self.data) - 1000)
+        self.assertEqual(sftp.prefetched, [(1000, len(self.data))])
+        self.assertEqual(self.read_local(), self.data)
+        self.assertEqual(self.manifest_md5(), hashlib.md5(self.data).hexdigest())
+
+    def test_no_resume_when_remote_changed(self):
+        with self.assertRaises(DownloadException):
+            self.downloader.download(FakeSFTPClient(self.data, fail_after=1000), '/remote/export.csv', self.local_path)
+        changed = self.data[::-1]
+        sftp = FakeSFTPClient(changed, mtime=2000)
+        self.assertEqual(self.downloader.download(sftp, '/remote/export.csv', self.local_path), len(changed))
+        self.assertEqual(self.read_local(), changed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import io
+import re
+import unittest
+from types import SimpleNamespace
+
+from ndml_sonus.scripts.common import CommandFullTextParser, RegexFullTextParser
+from tests.helpers import RawFiles, gsx_block, make_report
+
+
+class LineParser(RegexFullTextParser):
+    regex = r'^(?P<Name>\w+) +(?P<Value>\d+)$'
+    regex_mode = re.MULTILINE
+
+
+# An empty output glued to its terminator: the end of the header is a block terminator
+MALFORMED = (
+    gsx_block('N1', 'a 1\nb 2')
+    + '\nNode: N2  Date: 2023/07/01 10:11:12 GMT\nZone: Z1\n\n%\n\nResult: Ok\n'
+    + gsx_block('N3', 'c 3')
+)
+
+
+class StreamingParseTest(unittest.TestCase):
+    def setUp(self):
+        self.raw_files = RawFiles()
+        self.report = make_report(['Node', 'Date', 'Zone', 'Name', 'Value'])
+
+    def tearDown(self):
+        self.raw_files.close()
+
+    def test_off_by_default(self):
+        self.raw_files.parse(LineParser, '', self.report)
+        parser = LineParser(self.raw_files.conf(), SimpleNamespace(name='host'), self.report)
+        parser.report_fd.close()
+        self.assertFalse(parser.streaming_parse)
+
+    def test_well_formed_file(self):
+        text = ''.join(gsx_block('N%d' % i, 'a %d\nb %d' % (i, i)) for i in range(50))
+        whole = self.raw_files.parse(LineParser, text, self.report)
+        self.assertEqual(len(whole), 100)
+        self.assertEqual(self.raw_files.parse(LineParser, text, self.report, streaming_parse=1), whole)
+
+        separator = CommandFullTextParser.separator
+        for chunk_size in (7, 100, 4096):
+            self.assertEqual(list(separator.separate_stream(io.StringIO(text), chunk_size)), list(separator.separate(text)))
+
+    def test_malformed_block(self):
+        # The default parse keeps the output of the whole file split: the
+        # match of N2 goes over its own terminator and swallows N3
+        rows = self.raw_files.parse(LineParser, MALFORMED, self.report)
+        self.assertEqual(rows, [
+            ['N1', '2023/07/01 10:11:12', 'Z1', 'a', '1'],
+            ['N1', '2023/07/01 10:11:12', 'Z1', 'b', '2'],
+            ['N2', '2023/07/01 10:11:12', 'Z1', 'c', '3'],
+        ])
+        blocks = list(CommandFullTextParser.separator.separate(MALFORMED))
+        self.assertEqual([block['Node'] for block in blocks], ['N1', 'N2'])
+        self.assertTrue(blocks[1]['CommandOutput'].startswith('%\n\nResult: Ok\n\nNode: N3'))
+
+        # The stream gives the same blocks when the whole file is in one
+        # chunk, but loses N2 when a chunk ends between the terminator of its
+        # header and the next one
+        separator = CommandFullTextParser.separator
+        self.assertEqual(list(separator.separate_stream(io.StringIO(MALFORMED))), blocks)
+        chunk_size = MALFORMED.index('\nNode: N3')
+        streamed = list(separator.separate_stream(io.StringIO(MALFORMED), chunk_size))
+        self.assertEqual([block['Node'] for block in streamed], ['N1', 'N3'])
+
+if __name__ == '__main__':
+    unittest.main()
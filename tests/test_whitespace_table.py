@@ -0,0 +1,80 @@
+import random
+import re
+import unittest
+
+from ndml_sonus.scripts import gsx_parsers, sgx_parsers
+from ndml_sonus.scripts.benchmarks import fill_regex, make_table_output
+from ndml_sonus.scripts.whitespace_table import is_whitespace_table, table_regex
+
+
+def table_parsers():
+    for module in (gsx_parsers, sgx_parsers):
+        for name, klass in sorted(vars(module).items()):
+            if isinstance(klass, type) and klass.__module__ == module.__name__:
+                if getattr(klass, 'matching_regex', None):
+                    yield klass
+
+
+def fuzzed_tables(seed, count):
+    """
+    Texts of tokens (words, numbers, dashes) separated by spaces, tabs and
+    newlines, with and without a header.
+    """
+    rng = random.Random(seed)
+    tokens = ['a', 'TG1', '12', '0', '-', '----------', 'IN-SERVICE', 'x1.2', '1-1-1', 'Name']
+    for _ in range(count):
+        lines = []
+        for _ in range(rng.randint(1, 8)):
+            separators = [rng.choice([' ', '  ', '\t', '   ']) for _ in range(8)]
+            line = ''.join(rng.choice(tokens) + separator for separator in separators[:rng.randint(1, 8)])
+            lines.append(rng.choice(['', ' ', '  ']) + line.rstrip(rng.choice([' \t', ''])))
+        yield '\n'.join(lines) + rng.choice(['', '\n', '\n\n'])
+
+
+def matches(regex, text):
+    return [(match.span(), match.groupdict()) for match in regex.finditer(text)]
+
+
+class WhitespaceTableTest(unittest.TestCase):
+    def test_parsers_use_the_table_regex(self):
+        names = [klass.__name__ for klass in table_parsers() if klass.matching_regex != klass.regex]
+        for name in ('CarrierAdminParser', 'TrunkGroupDirectionParser', 'SoftswitchStatusParser'):
+            self.assertIn(name, names)
+
+    def test_same_matches_as_the_class_regex(self):
+        for klass in table_parsers():
+            if klass.matching_regex == klass.regex:
+                continue
+            with self.subTest(klass.__name__):
+                regex = re.compile(klass.regex, klass.regex_mode)
+                table = re.compile(klass.matching_regex, klass.regex_mode)
+                bytes_regex = re.compile(klass.regex.encode('utf-8'), klass.regex_mode)
+                bytes_table = re.compile(klass.matching_regex.encode('utf-8'), klass.regex_mode)
+                columns = len(regex.groupindex)
+                texts = [make_table_output(columns, 5, trailing) for trailing in ('', '  ', ' x')]
+                # rows written over several lines
+                texts.append('Name  Alloc\n----  -----\n' + ''.join(fill_regex(klass.regex, row) for row in range(5)))
+                texts += list(fuzzed_tables(columns, 200))
+                found = 0
+                for text in texts:
+                    expected = matches(regex, text)
+                    found += len(expected)
+                    self.assertEqual(matches(table, text), expected, text)
+                    self.assertEqual(matches(bytes_table, text.encode()), matches(bytes_regex, text.encode()), text)
+                self.assertGreater(found, 0)
+
+    def test_regexes_left_alone(self):
+        for regex in (
+            r'\s*(?P<A>\S+)\s+(?P<B>\S+)|(?P<C>\d+)\n',
+            r'\s*(?P<A>\S+)\s+(?P<B>\S+)\s*\$',
+            r'\s*(?P<A>\d+)\s+(?P<B>\S+)\n',
+            r'^(?P<A>\S+)\s+(?P<B>\S+)$',
+            r'(?P<A>\S+)-(?P<B>\S+)\n',
+        ):
+            self.assertFalse(is_whitespace_table(regex))
+            self.assertEqual(table_regex(regex), regex)
+        self.assertFalse(is_whitespace_table(r'\s*(?P<A>\S+)\s+(?P<B>\S+)\n', re.VERBOSE))
+
+    def test_table_regex(self):
+        self.assertEqual(table_regex(r'\s*(?P<A>\S+) +(?P<B>\S+)\n'), r'\s*(?<!\S)(?P<A>\S+) +(?P<B>\S+)\n')
+        self.assertEqual(table_regex(r'(?P<A>\S+)\s+(?P<B>\d+)$'), r'(?<!\S)(?P<A>\S+)\s+(?P<B>\d+)$')